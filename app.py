@@ -1,19 +1,41 @@
 import os
-from flask import Flask, render_template, redirect, url_for,make_response, flash, request ,jsonify
+from flask import Flask, render_template, redirect, url_for,make_response, flash, request ,jsonify, g, has_request_context
+from flask import Response, stream_template, stream_with_context, send_file, get_template_attribute, abort
+from flask import before_render_template, template_rendered
+from functools import wraps
 from config import Config
+import search_index
+import image_store
+import static_files
+import pdf_export
+import fragment_cache
+import request_metrics
+import similar_recipes
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
 from flask_bcrypt import Bcrypt
 from flask_wtf import FlaskForm
 from flask_wtf import CSRFProtect
-from flask import send_from_directory
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, IntegerField
 from wtforms.validators import DataRequired, Length, EqualTo, NumberRange, ValidationError , URL ,Optional
-from werkzeug.utils import secure_filename
-from uuid import uuid4
+from werkzeug.datastructures import FileStorage
+from nutrition_calculator.service import NutritionService
 from urllib.parse import urlencode
-import shutil
+import asyncio
+import csv
+import json
+import math
+import sqlite3
+import sys
+import time
+import click
+from concurrent.futures import as_completed
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.schema import CreateColumn
 # Make csrf_token() available in all templates
 from flask_wtf.csrf import generate_csrf
  
@@ -28,23 +50,319 @@ csrf=CSRFProtect(app)
 def inject_csrf_token():
     return dict(csrf_token=generate_csrf)
 
+# --- SQLite connection settings ---
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    if app.config["SQLITE_WAL"]:
+        # journal_mode is stored in the file; synchronous is per connection
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+
+# --- Query budget ---
+# Listing views declare how many SQL statements they may issue. Going over
+# (an N+1 creeping back in) raises under TESTING and logs otherwise.
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get("query_count", 0) + 1
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is not None and has_request_context():
+        g.db_time = g.get("db_time", 0.0) + time.perf_counter() - started
+
+
+def query_budget(limit):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            g.query_budget = limit
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def _enforce_query_budget(endpoint, count, budget):
+    if count > budget:
+        message = f"{endpoint} issued {count} SQL queries (budget {budget})"
+        if app.config.get("QUERY_BUDGET_ENFORCE", app.testing):
+            raise AssertionError(message)
+        app.logger.warning(message)
+
+
+@app.after_request
+def check_query_budget(response):
+    budget = g.get("query_budget")
+    if budget is None:
+        return response
+    if response.is_streamed:
+        # a streamed template runs its queries while the body is sent, so
+        # count them once it has been (the same g collects them)
+        state, endpoint = g._get_current_object(), request.endpoint
+        response.call_on_close(lambda: _enforce_query_budget(endpoint, state.get("query_count", 0), budget))
+    else:
+        _enforce_query_budget(request.endpoint, g.get("query_count", 0), budget)
+    return response
+
+
+# --- Request metrics & profiling (opt-in, see request_metrics.py) ---
+metrics = request_metrics.Registry()
+REQUEST_SECONDS = metrics.histogram("recipe_app_request_seconds", "Wall time per request.")
+DB_SECONDS = metrics.histogram("recipe_app_request_db_seconds", "Time spent in SQL per request.")
+QUERIES = metrics.histogram("recipe_app_request_queries", "SQL statements per request.",
+                            buckets=request_metrics.COUNT_BUCKETS)
+TEMPLATE_SECONDS = metrics.histogram("recipe_app_request_template_seconds",
+                                     "Time spent rendering templates per request.")
+NUTRITION_SECONDS = metrics.histogram("recipe_app_request_nutrition_seconds",
+                                      "Time spent in nutrition matching per request.")
+RESPONSES = metrics.counter("recipe_app_responses_total", "Responses by endpoint and status.",
+                            labels=("endpoint", "status"))
+
+
+def _observe_nutrition(seconds):
+    # lookups on the /api/nutrition thread pool have no request to charge
+    if has_request_context():
+        g.nutrition_time = g.get("nutrition_time", 0.0) + seconds
+
+
+@before_render_template.connect_via(app)
+def _template_started(sender, template, context, **extra):
+    g.template_depth = g.get("template_depth", 0) + 1
+    if g.template_depth == 1:
+        g.template_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _template_finished(sender, template, context, **extra):
+    g.template_depth = g.get("template_depth", 1) - 1
+    if g.template_depth == 0 and "template_started" in g:
+        g.template_time = g.get("template_time", 0.0) + time.perf_counter() - g.pop("template_started")
+
+
+@app.before_request
+def start_request_metrics():
+    if not app.config["METRICS_ENABLED"]:
+        return
+    g.request_started = time.perf_counter()
+    token = app.config["PROFILE_TOKEN"]
+    g.profile_requested = bool(token) and request.headers.get("X-Profile") == token
+    if g.profile_requested or app.config["PROFILE_SLOW_MS"]:
+        profiler = request_metrics.Profiler()
+        if profiler.start():
+            g.profiler = profiler
+
+
+@app.after_request
+def finish_request_metrics(response):
+    if "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        slow_ms = app.config["PROFILE_SLOW_MS"]
+        if g.profile_requested or (slow_ms and elapsed * 1000 >= slow_ms):
+            path = profiler.save(app.config["PROFILE_DIR"], request.endpoint or "unmatched", elapsed)
+            app.logger.info("profiled %s %s (%.0f ms) -> %s", request.method, request.path, elapsed * 1000, path)
+            if g.profile_requested:
+                response.headers["X-Profile-File"] = os.path.basename(path)
+    parts = {"db": g.get("db_time", 0.0), "tpl": g.get("template_time", 0.0),
+             "nutrition": g.get("nutrition_time", 0.0), "total": elapsed}
+    response.headers["Server-Timing"] = ", ".join(f"{k};dur={v * 1000:.1f}" for k, v in parts.items())
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def record_request_metrics(exc):
+    if "request_started" not in g:
+        return
+    endpoint = (request.endpoint or "unmatched",)
+    REQUEST_SECONDS.observe(endpoint, time.perf_counter() - g.request_started)
+    DB_SECONDS.observe(endpoint, g.get("db_time", 0.0))
+    QUERIES.observe(endpoint, g.get("query_count", 0))
+    TEMPLATE_SECONDS.observe(endpoint, g.get("template_time", 0.0))
+    NUTRITION_SECONDS.observe(endpoint, g.get("nutrition_time", 0.0))
+    RESPONSES.inc(endpoint + (str(500 if exc else g.get("response_status", 500)),))
+
+
+def favorite_recipe_ids():
+    """Recipe ids the current user has favorited, in one query."""
+    return set(db.session.execute(
+        db.select(Favorite.recipe_id).where(Favorite.user_id == current_user.id)
+    ).scalars())
+
+# --- Keyset pagination ---
+class KeysetPage:
+    """One page of a listing ordered by an increasing id column."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def url(self, rel):
+        """URL of the next/prev page of the current listing, or None."""
+        args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+        if rel == "next" and self.next_cursor is not None:
+            args["after"] = self.next_cursor
+        elif rel == "prev" and self.prev_cursor is not None:
+            args["before"] = self.prev_cursor
+        else:
+            return None
+        return url_for(request.endpoint, **request.view_args, **args)
+
+
+def keyset_paginate(query, column):
+    """
+    Page `query` by `column` using ?after=<id> / ?before=<id> cursors
+    instead of OFFSET, so every page costs the same regardless of depth.
+    """
+    per_page = min(request.args.get("per_page", app.config["LISTING_PAGE_SIZE"], type=int), 100)
+    per_page = max(per_page, 1)
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+
+    if before is not None:
+        rows = query.filter(column < before).order_by(column.desc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(column > after)
+        rows = query.order_by(column.asc()).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after is not None
+
+    if not rows:
+        return KeysetPage(rows)
+    first, last = getattr(rows[0], column.key), getattr(rows[-1], column.key)
+    return KeysetPage(rows, last if has_next else None, first if has_prev else None)
+
+
+def render_listing(template, page, **context):
+    """Render a paginated listing, streamed if STREAM_LISTINGS is on, with Link headers."""
+    if app.config["STREAM_LISTINGS"]:
+        response = Response(stream_with_context(stream_template(template, page=page, **context)))
+    else:
+        response = make_response(render_template(template, page=page, **context))
+    links = [f'<{page.url(rel)}>; rel="{rel}"' for rel in ("prev", "next") if page.url(rel)]
+    if links:
+        response.headers["Link"] = ", ".join(links)
+    return response
+
 # Serve images folder (project-level) at /images/
 @app.route('/images/<path:filename>')
 def project_image(filename):
-    return send_from_directory(os.path.join(basedir, 'images'), filename)
+    return static_files.send_file_cached(os.path.join(basedir, 'images'), filename, '/images/', app.config)
+
+
+# /static goes through the same ETag / immutable handling
+def static_file(filename):
+    return static_files.send_file_cached(app.static_folder, filename, app.static_url_path + '/', app.config)
+
+app.view_functions['static'] = static_file
+
+
+@app.url_defaults
+def version_static_urls(endpoint, values):
+    # url_for('static', ...) -> /static/css/style.css?v=<hash>, cacheable forever
+    if endpoint in ('static', 'project_image') and 'filename' in values and 'v' not in values:
+        directory = app.static_folder if endpoint == 'static' else os.path.join(basedir, 'images')
+        version = static_files.version_for(directory, values['filename'])
+        if version:
+            values['v'] = version
 
 # Upload configuration: store uploaded images under static/uploads
 basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'static', 'uploads')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# URL prefix of stored uploads, for the CLI commands: outside a request
+# url_for('static') can't build it
+UPLOAD_URL_PREFIX = app.static_url_path + '/uploads/'
+
+
+def make_dirs():
+    # again in create_app(), for locations it was given
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['PDF_CACHE_DIR'], exist_ok=True)
+
+
+make_dirs()
+
+
+def save_uploaded_image(file_storage):
+    """Store an upload content-addressed (duplicates collapse) and return its URL."""
+    filename = image_store.store_upload(file_storage, app.config['UPLOAD_FOLDER'],
+                                        workers=app.config['IMAGE_WORKERS'])
+    return url_for('static', filename=f'uploads/{filename}')
+
+
+@app.context_processor
+def inject_image_helpers():
+    def image_attrs(url, variant="card"):
+        # src/srcset/sizes for an <img>, using resized variants when available
+        prefix = url_for('static', filename='uploads/')
+        attrs = image_store.image_attrs(url, variant, app.config['UPLOAD_FOLDER'], prefix)
+        if "srcset" not in attrs and image_store.is_stored_upload(url, prefix):
+            # variants still being made: don't cache HTML that lacks them
+            g.fragment_uncacheable = True
+        return attrs
+    return dict(image_attrs=image_attrs)
+
+
+# --- Fragment cache ---
+# Shared page parts are cached per Recipe.cache_version; see fragment_cache.py
+fragments = fragment_cache.FragmentCache(
+    fragment_cache.backend_from_config(app.config["FRAGMENT_CACHE_URL"], app.config["FRAGMENT_CACHE_SIZE"]),
+    ttl=app.config["FRAGMENT_CACHE_TTL"],
+)
+app.jinja_env.globals["hole"] = fragment_cache.hole
+RECIPE_FRAGMENTS = ("recipe_detail", "recipe_card")
+
+
+def render_fragment(key, template, **context):
+    """Render a shared fragment and cache it unless it isn't final yet."""
+    g.fragment_uncacheable = False
+    html = render_template(template, **context)
+    if not g.fragment_uncacheable:
+        fragments.set(key, html)
+    return html
+
+
+def invalidate_recipe(recipe_id, version=None):
+    """
+    Bump the recipe's cache_version in the caller's transaction, so every
+    cached fragment of it goes stale, and drop the `version` fragments now.
+    """
+    db.session.execute(
+        db.update(Recipe).where(Recipe.id == recipe_id).values(cache_version=Recipe.cache_version + 1)
+    )
+    if version is not None:
+        for name in RECIPE_FRAGMENTS:
+            fragments.delete(fragments.key(name, recipe_id, version))
 
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
-csrf = CSRFProtect(app)
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
 
 # --- Models ---
+# SQLite can only add VIRTUAL generated columns to an existing table, and
+# Postgres before 18 only has STORED ones
+PER_SERVING_STORED = None if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite") else True
+
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
@@ -72,6 +390,22 @@ class Recipe(db.Model):
     fats = db.Column(db.Float)
     carbs = db.Column(db.Float)
     fibers = db.Column(db.Float)
+    servings = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Per-serving macros for range filters and sorting, computed by the
+    # database so bulk updates can't leave them stale
+    calories_per_serving = db.Column(db.Float, db.Computed("calories / servings", persisted=PER_SERVING_STORED))
+    proteins_per_serving = db.Column(db.Float, db.Computed("proteins / servings", persisted=PER_SERVING_STORED))
+    fats_per_serving = db.Column(db.Float, db.Computed("fats / servings", persisted=PER_SERVING_STORED))
+    carbs_per_serving = db.Column(db.Float, db.Computed("carbs / servings", persisted=PER_SERVING_STORED))
+    fibers_per_serving = db.Column(db.Float, db.Computed("fibers / servings", persisted=PER_SERVING_STORED))
+    # True when the owner typed calories in by hand (kept by bulk recomputes)
+    calories_manual = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Rating aggregates, maintained by rate_recipe()
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_avg = db.Column(db.Float)
+    # Bumped whenever anything shown on the recipe's cached fragments changes
+    cache_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     instructions = db.Column(db.Text, nullable=False)
     youtube_url = db.Column(db.String(300))
@@ -79,28 +413,95 @@ class Recipe(db.Model):
     #Relatioship wit cascade delete
     ratings = db.relationship("Rating", backref="recipe", lazy=True ,cascade="all, delete-orphan")
     comments = db.relationship("Comment", backref="recipe", lazy=True , cascade="all, delete-orphan")
+    ingredient_rows = db.relationship("RecipeIngredient", backref="recipe", lazy=True,
+                                      cascade="all, delete-orphan", order_by="RecipeIngredient.position")
+
+    __table_args__ = (
+        db.Index("ix_recipe_top_rated", "rating_avg", "rating_count"),
+        # "my recipes": one user's rows, already in keyset order
+        db.Index("ix_recipe_user_id", "user_id", "id"),
+        # macro range filters, sorted and keyset-paginated by (value, id)
+        db.Index("ix_recipe_calories_per_serving", "calories_per_serving", "id"),
+        db.Index("ix_recipe_proteins_per_serving", "proteins_per_serving", "id"),
+        db.Index("ix_recipe_fats_per_serving", "fats_per_serving", "id"),
+        db.Index("ix_recipe_carbs_per_serving", "carbs_per_serving", "id"),
+        db.Index("ix_recipe_fibers_per_serving", "fibers_per_serving", "id"),
+    )
 
 class Rating(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     score = db.Column(db.Integer, nullable=False)  # 1-5
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False, index=True)
+
+    # one rating per user per recipe
+    __table_args__ = (
+        db.Index("uq_rating_user_recipe", "user_id", "recipe_id", unique=True),
+    )
 
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False, index=True)
 
 class Favorite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False, index=True)
 
     user = db.relationship("User", backref="favorites")
     recipe = db.relationship("Recipe", backref="favorited_by")
 
+    # a recipe is favorited once per user; also serves "this user's favorites"
+    __table_args__ = (
+        db.Index("uq_favorite_user_recipe", "user_id", "recipe_id", unique=True),
+    )
+
+
+class RecipeIngredient(db.Model):
+    """One parsed ingredient of a recipe, for indexed ingredient search."""
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    raw = db.Column(db.String(300), nullable=False)
+    # lower-cased, single-spaced ingredient text
+    name = db.Column(db.String(300), nullable=False)
+    # last word of `name`, so "rice" finds "basmati rice"
+    head = db.Column(db.String(100), nullable=False, default="")
+    # matched INDB food_name (None if nothing matched)
+    food_name = db.Column(db.String(300))
+    # similarity of `name` to `food_name`, 0..1 (1 = exact)
+    match_score = db.Column(db.Float)
+    portion_g = db.Column(db.Float)
+    # this ingredient's contribution to the recipe at portion_g, so edits
+    # only re-resolve changed ingredients (None on rows from before these existed)
+    calories = db.Column(db.Float)
+    proteins = db.Column(db.Float)
+    fats = db.Column(db.Float)
+    carbs = db.Column(db.Float)
+    fibers = db.Column(db.Float)
+
+    __table_args__ = (
+        db.Index("ix_recipe_ingredient_name_recipe", "name", "recipe_id"),
+        db.Index("ix_recipe_ingredient_head_recipe", "head", "recipe_id"),
+        db.Index("ix_recipe_ingredient_food_recipe", "food_name", "recipe_id"),
+    )
+
+
+class RecipeSimilarity(db.Model):
+    """A precomputed "similar recipes" neighbour; see similar_recipes.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False)
+    similar_id = db.Column(db.Integer, db.ForeignKey("recipe.id"), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        # the panel: one recipe's neighbours, best first
+        db.Index("ix_recipe_similarity_recipe_score", "recipe_id", "score"),
+    )
+
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -131,6 +532,8 @@ class RecipeForm(FlaskForm):
     instructions = TextAreaField("Instructions", validators=[DataRequired()])
     # allow decimal calories input (we store floats rounded to 2 decimals)
     calories = StringField("Calories (optional)")
+    # nutrition is stored for the whole recipe; servings give the per-serving values
+    servings = IntegerField("Servings", default=1, validators=[Optional(), NumberRange(min=1, max=100)])
     # Allow either an uploaded image or an image URL
     image_file = FileField("Upload image", validators=[FileAllowed(['jpg','png','jpeg'], 'Images only!')])
     image_url = StringField("Image URL", validators=[Optional(), URL()])
@@ -201,70 +604,136 @@ def dashboard():
 
 @app.route("/recipes")
 @login_required
+@query_budget(4)
 def recipes():
-    all_recipes = Recipe.query.all()
+    page = keyset_paginate(Recipe.query, Recipe.id)
     # provide small forms for rating and commenting so they can be used inline
     rating_form = RatingForm()
     comment_form = CommentForm()
-    return render_template("recipes.html", recipes=all_recipes, rating_form=rating_form, comment_form=comment_form)
+    return render_listing("recipes.html", page, cards=recipe_cards(page.items, favorite_recipe_ids()),
+                          rating_form=rating_form, comment_form=comment_form)
+
+
+def recipe_cards(recipes, favorite_ids):
+    """
+    Listing cards for `recipes`: shared HTML from the fragment cache (owners
+    are loaded only for the misses) plus each viewer's favorite button.
+    """
+    keys = {r.id: fragments.key("recipe_card", r.id, r.cache_version) for r in recipes}
+    html = fragments.get_many(keys.values())
+    missing = [r for r in recipes if keys[r.id] not in html]
+    if missing:
+        owners = {u.id: u for u in User.query.filter(User.id.in_({r.user_id for r in missing}))}
+        for r in missing:
+            html[keys[r.id]] = render_fragment(keys[r.id], "_recipe_card.html", recipe=r, owner=owners.get(r.user_id))
+    fav_button = get_template_attribute("_recipe_card_fav.html", "fav_button")
+    csrf = generate_csrf() if current_user.is_authenticated else None
+    return [
+        fragment_cache.fill(html[keys[r.id]], {"fav": fav_button(r.id, r.id in favorite_ids, csrf) if csrf else ""})
+        for r in recipes
+    ]
 
 
 @app.route("/recipe/<int:recipe_id>")
 @login_required
+@query_budget(7)
 def recipe_detail(recipe_id):
-    recipe = Recipe.query.get_or_404(recipe_id)
+    # cheap row first: the version picks the cached body, the rest is per-user
+    is_favorite = db.select(Favorite.id).where(
+        Favorite.user_id == current_user.id, Favorite.recipe_id == Recipe.id
+    ).exists()
+    row = db.session.execute(
+        db.select(Recipe.id, Recipe.user_id, Recipe.cache_version, is_favorite.label("is_favorite"))
+        .where(Recipe.id == recipe_id)
+    ).first()
+    if row is None:
+        abort(404)
+
+    body = fragments.get(fragments.key("recipe_detail", row.id, row.cache_version))
+    if body is None:
+        recipe = (
+            Recipe.query.options(
+                joinedload(Recipe.user),
+                selectinload(Recipe.ratings).joinedload(Rating.user),
+                selectinload(Recipe.comments).joinedload(Comment.user),
+                selectinload(Recipe.ingredient_rows),
+            )
+            .filter_by(id=recipe_id)
+            .first_or_404()
+        )
+        body = render_fragment(fragments.key("recipe_detail", recipe.id, recipe.cache_version),
+                               "_recipe_detail_body.html", recipe=recipe)
+
     rating_form = RatingForm()
     comment_form = CommentForm()
-    is_favorite=any(f.user_id == current_user.id for f in recipe.favorited_by)
-    return render_template(
-        "recipe_detail.html",
-        recipe=recipe,
-        rating_form=rating_form,
-        comment_form=comment_form,
-        is_favorite=is_favorite
-    ) 
-os.environ['WKHTMLTOPDF_PATH'] = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+    body = fragment_cache.fill(body, {
+        "forms": render_template("_recipe_detail_forms.html", recipe_id=row.id,
+                                 rating_form=rating_form, comment_form=comment_form),
+        "actions": render_template("_recipe_detail_actions.html", recipe_id=row.id,
+                                   owner_id=row.user_id, is_favorite=row.is_favorite),
+        "similar": render_template("_similar_recipes.html", similar=similar_recipe_links(row.id)),
+    })
+    return render_template("recipe_detail.html", body=body)
+
+
+def similar_recipe_links(recipe_id):
+    """(id, title) of the precomputed neighbours, best first: one indexed lookup."""
+    limit = app.config["SIMILAR_RECIPES"]
+    if not limit:
+        return []
+    return db.session.execute(
+        db.select(Recipe.id, Recipe.title)
+        .join(RecipeSimilarity, RecipeSimilarity.similar_id == Recipe.id)
+        .where(RecipeSimilarity.recipe_id == recipe_id)
+        .order_by(RecipeSimilarity.score.desc())
+        .limit(limit)
+    ).all()
+
+
 @app.route('/recipe/<int:recipe_id>/export')
 @login_required
 def export_recipe(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
-    static_dir = os.path.join(os.path.dirname(__file__), 'static')
-    static_dir_url = static_dir.replace("\\", "/")  # convert \ → /
-    html = render_template('recipe_print.html', recipe=recipe)
-    # Replace relative /static/ paths with file:// absolute paths
-    html = html.replace(
-        '/static/',
-        f'file:///{static_dir_url}/'
-    )
-    # --- Try WeasyPrint ---
-    try:
-        from weasyprint import HTML
-        pdf = HTML(string=html).write_pdf()
-    except Exception as e:
-        app.logger.warning(f"WeasyPrint failed: {e}")
-        pdf = None
+    _, path, jid = _pdf_job(recipe)
+    if os.path.exists(path):
+        # a job for an older version may have finished after this one
+        pdf_export.prune(app.config['PDF_CACHE_DIR'], recipe.id, path)
+        return send_file(path, mimetype='application/pdf', as_attachment=True,
+                         download_name=f'recipe_{recipe.id}.pdf')
+
+    state = pdf_export.status(jid, path)
+    if state == 'failed':
+        # --- Fallback ---
+        pdf_export.forget(jid)
+        flash("PDF export not available. Use Print → Save as PDF.", "warning")
+        return render_template("recipe_print.html", recipe=recipe)
+    if state == 'missing':
+        html = render_template('recipe_print.html', recipe=recipe)
+        html = pdf_export.localize_static(html, app.static_folder)
+        pdf_export.submit(jid, html, path, workers=app.config['PDF_WORKERS'],
+                          wkhtmltopdf_path=app.config['WKHTMLTOPDF_PATH'])
+
+    # still rendering: the page polls the status endpoint until it's done
+    return render_template("export_pending.html", recipe=recipe), 202
+
+
+@app.route('/recipe/<int:recipe_id>/export/status')
+@login_required
+def export_status(recipe_id):
+    recipe = Recipe.query.get_or_404(recipe_id)
+    version, path, jid = _pdf_job(recipe)
+    return jsonify({
+        "state": pdf_export.status(jid, path),
+        "version": version,
+        "download_url": url_for('export_recipe', recipe_id=recipe.id),
+    })
 
-    # --- Try pdfkit if WeasyPrint fails ---
-    if pdf is None:
-        try:
-            import pdfkit
-            wk_path = os.getenv('WKHTMLTOPDF_PATH') or shutil.which('wkhtmltopdf')
-            config = pdfkit.configuration(wkhtmltopdf=wk_path) if wk_path else None
-            pdf = pdfkit.from_string(html, False, configuration=config)
-        except Exception as e:
-            app.logger.warning(f"pdfkit failed: {e}")
-            pdf = None
-
-    # --- Return PDF if generated ---
-    if pdf:
-        response = make_response(pdf)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=recipe_{recipe.id}.pdf'
-        return response
 
-    # --- Fallback ---
-    flash("PDF export not available. Use Print → Save as PDF.", "warning")
-    return render_template("recipe_print.html", recipe=recipe)
+def _pdf_job(recipe):
+    template = os.path.join(app.root_path, app.template_folder, 'recipe_print.html')
+    version = pdf_export.content_version(recipe, template)
+    path = pdf_export.cache_path(app.config['PDF_CACHE_DIR'], recipe.id, version)
+    return version, path, pdf_export.job_id(recipe.id, version)
 
 
 
@@ -274,31 +743,19 @@ def export_recipe(recipe_id):
 def add_recipe():
     form = RecipeForm()
     if form.validate_on_submit():
-        ingredients_list = [i.strip() for i in form.ingredients.data.split(',')]
-        # import nutrition utils lazily to avoid heavy startup imports (pandas)
-        from nutrition_calculator.nutrition_utils import calculate_recipe_nutrition
-        nutrition_totals = calculate_recipe_nutrition(ingredients_list)
+        ingredients_list = split_ingredients(form.ingredients.data)
+        # per-ingredient matches are stored; the totals are their sum
+        ingredient_rows = build_ingredient_rows(ingredients_list)
+        nutrition_totals = ingredient_totals(ingredient_rows)
         # decide image path: prefer uploaded file, fall back to provided URL
         image_path = None
         if form.image_file.data:
-            f = form.image_file.data
-            # generate secure unique filename
-            filename = secure_filename(f.filename)
-            unique = f"{uuid4().hex}_{filename}"
-            dest = os.path.join(app.config['UPLOAD_FOLDER'], unique)
-            f.save(dest)
-            # save relative URL for templates
-            image_path = url_for('static', filename=f'uploads/{unique}')
+            image_path = save_uploaded_image(form.image_file.data)
         elif form.image_url.data:
             image_path = form.image_url.data
 
         # If user manually entered calories, prefer that (parse to float)
-        manual_cal = None
-        if form.calories.data and str(form.calories.data).strip():
-            try:
-                manual_cal = float(str(form.calories.data).strip())
-            except Exception:
-                manual_cal = None
+        manual_cal = parse_calories(form.calories.data)
 
         recipe = Recipe(
             title=form.title.data,
@@ -308,31 +765,117 @@ def add_recipe():
             youtube_url=form.youtube_url.data,
             user_id=current_user.id,
             calories=round(manual_cal, 2) if manual_cal is not None else round(nutrition_totals.get("calories", 0), 2),
+            calories_manual=manual_cal is not None,
+            servings=form.servings.data or 1,
             proteins=round(nutrition_totals.get("proteins", 0), 2),
             fats=round(nutrition_totals.get("fats", 0), 2),
             carbs=round(nutrition_totals.get("carbs", 0), 2),
             fibers=round(nutrition_totals.get("fibers", 0), 2)
         )
+        recipe.ingredient_rows = ingredient_rows
         db.session.add(recipe)
         db.session.commit()
+        similar_recipes.submit(update_similar_recipes, recipe.id)
         flash("Recipe added successfully with nutrition info!", "success")
         return redirect(url_for("recipes"))
     return render_template("add_recipe.html", form=form)
 
 @app.route('/calculate_nutrition', methods=['POST'])
 def calculate_nutrition():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('ingredients', ''), str):
+        return jsonify({'error': 'Expected a JSON body like {"ingredients": "a, b, c"}.'}), 400
     try:
-        data = request.get_json()
-        ingredients = [i.strip() for i in data.get('ingredients', '').split(',') if i.strip()]
+        ingredients = [i for i in split_ingredients(data.get('ingredients', '')) if i]
         from nutrition_calculator.nutrition_utils import calculate_recipe_nutrition
         result = calculate_recipe_nutrition(ingredients)
         return jsonify(result)
-    except Exception as e:
-        # Return the error message for debugging (temporary)
-        import traceback
-        tb = traceback.format_exc()
-        app.logger.error('calculate_nutrition error:\n' + tb)
-        return jsonify({'error': str(e), 'trace': tb}), 500
+    except Exception:
+        app.logger.exception('calculate_nutrition error')
+        return jsonify({'error': 'Could not calculate nutrition.'}), 500
+
+
+# Shared by every request in this process so identical lookups coalesce
+nutrition_service = NutritionService(workers=app.config['NUTRITION_WORKERS'])
+NUTRITION_API_MAX_INGREDIENTS = 100
+
+
+@app.route('/api/nutrition', methods=['POST'])
+async def nutrition_api():
+    """
+    Nutrition for {"ingredients": "a, b, c"} (or a list). Matching runs on
+    a thread pool; concurrent requests for the same ingredient share one
+    lookup. Answers {"items": [...], "totals": {...}}; with ?stream=1 it
+    sends NDJSON instead, one {"index", ...item} line per ingredient as soon
+    as it is resolved, then a final {"totals": ...} line.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON body like {"ingredients": "a, b, c"}.'}), 400
+    raw = data.get('ingredients', '')
+    if isinstance(raw, str):
+        raw = split_ingredients(raw)
+    if not isinstance(raw, list):
+        return jsonify({'error': '"ingredients" must be a string or a list.'}), 400
+    ingredients = [i.strip() for i in raw if isinstance(i, str) and i.strip()]
+    if len(ingredients) > NUTRITION_API_MAX_INGREDIENTS:
+        return jsonify({'error': f'At most {NUTRITION_API_MAX_INGREDIENTS} ingredients per request.'}), 400
+
+    futures = [nutrition_service.submit(i) for i in ingredients]
+
+    if request.args.get('stream') == '1':
+        positions = {}
+        for index, future in enumerate(futures):
+            positions.setdefault(future, []).append(index)
+
+        def generate():
+            for future in as_completed(positions):
+                for index in positions[future]:
+                    item = {"index": index, **_nutrition_item(ingredients[index], future)}
+                    yield json.dumps(item, separators=(",", ":")) + "\n"
+            yield json.dumps({"totals": _nutrition_totals(futures)}, separators=(",", ":")) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    # coalesced ingredients share a future; wait on each one once
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in set(futures)), return_exceptions=True)
+    return jsonify({
+        "items": [_nutrition_item(i, f) for i, f in zip(ingredients, futures)],
+        "totals": _nutrition_totals(futures),
+    })
+
+
+def _lookup_result(future, ingredient=None):
+    # a failed lookup counts as unmatched rather than failing the request
+    try:
+        return future.result()
+    except Exception:
+        app.logger.exception('nutrition lookup failed for %r', ingredient)
+        return None
+
+
+def _nutrition_item(ingredient, future):
+    """Compact, rounded JSON for one resolved ingredient."""
+    result = _lookup_result(future, ingredient)
+    return {
+        "ingredient": ingredient,
+        "food_name": result["food_name"] if result else None,
+        "score": round(result["score"], 3) if result else 0.0,
+        "portion_g": result["portion_g"] if result else 0.0,
+        "nutrients": {k: round(v, 2) for k, v in result["nutrients"].items()} if result else {},
+    }
+
+
+def _nutrition_totals(futures):
+    # summed unrounded, so they match calculate_recipe_nutrition()
+    from nutrition_calculator.nutrition_utils import major_nutrients
+    totals = dict.fromkeys(major_nutrients, 0.0)
+    for future in futures:
+        result = _lookup_result(future)
+        if result:
+            for k, v in result["nutrients"].items():
+                totals[k] += v
+    return {k: round(v, 2) for k, v in totals.items()}
 
 @app.route("/recipe/<int:recipe_id>/edit", methods=["GET", "POST"])
 @login_required
@@ -343,38 +886,44 @@ def edit_recipe(recipe_id):
         return redirect(url_for("recipes"))
     form = RecipeForm(obj=recipe)
     if form.validate_on_submit():
-
-        from nutrition_calculator.nutrition_utils import calculate_recipe_nutrition
+        # only new or changed ingredients are matched again; a title-only
+        # edit doesn't touch the matcher at all
+        rows = recipe.ingredient_rows
+        ingredients_changed = form.ingredients.data != recipe.ingredients
+        if ingredients_changed or any(r.calories is None for r in rows):
+            rows = update_ingredient_rows(rows, split_ingredients(form.ingredients.data))
+            recipe.ingredient_rows = rows
+        nutrition_totals = ingredient_totals(rows)
 
         recipe.title = form.title.data
         recipe.ingredients = form.ingredients.data
         recipe.instructions = form.instructions.data
         # handle uploaded file or URL
         if form.image_file.data:
-            f = form.image_file.data
-            filename = secure_filename(f.filename)
-            unique = f"{uuid4().hex}_{filename}"
-            dest = os.path.join(app.config['UPLOAD_FOLDER'], unique)
-            f.save(dest)
-            recipe.image_url = url_for('static', filename=f'uploads/{unique}')
+            recipe.image_url = save_uploaded_image(form.image_file.data)
         elif form.image_url.data:
             recipe.image_url = form.image_url.data
         recipe.youtube_url = form.youtube_url.data
-        ingredients_list = [i.strip() for i in form.ingredients.data.split(',')]
-        nutrition_totals = calculate_recipe_nutrition(ingredients_list)
-        # If user provided a manual calories override, use it
-        if form.calories.data and str(form.calories.data).strip():
-            try:
-                recipe.calories = round(float(str(form.calories.data).strip()), 2)
-            except Exception:
-                recipe.calories = round(nutrition_totals.get("calories", 0), 2)
+        recipe.servings = form.servings.data or 1
+        # The form is pre-filled with the stored calories, so only treat the
+        # value as an override if it was already one or the user changed it
+        manual_cal = parse_calories(form.calories.data)
+        if manual_cal is not None and (recipe.calories_manual or round(manual_cal, 2) != recipe.calories):
+            recipe.calories = round(manual_cal, 2)
+            recipe.calories_manual = True
         else:
             recipe.calories = round(nutrition_totals.get("calories", 0), 2)
-            recipe.proteins = round(nutrition_totals.get("proteins", 0), 2)
-            recipe.fats = round(nutrition_totals.get("fats", 0), 2)
-            recipe.carbs = round(nutrition_totals.get("carbs", 0), 2)
-            recipe.fibers = round(nutrition_totals.get("fibers", 0), 2)
+            recipe.calories_manual = False
+        recipe.proteins = round(nutrition_totals.get("proteins", 0), 2)
+        recipe.fats = round(nutrition_totals.get("fats", 0), 2)
+        recipe.carbs = round(nutrition_totals.get("carbs", 0), 2)
+        recipe.fibers = round(nutrition_totals.get("fibers", 0), 2)
+        invalidate_recipe(recipe.id, recipe.cache_version)
         db.session.commit()
+        pdf_export.invalidate(app.config['PDF_CACHE_DIR'], recipe.id)
+        if ingredients_changed:
+            # neighbours depend on ingredients and macros, which follow them
+            similar_recipes.submit(update_similar_recipes, recipe.id)
         flash("Recipe updated with new nutrition info!", "success")
         return redirect(url_for("recipe_detail", recipe_id=recipe.id))
     else :
@@ -387,8 +936,14 @@ def delete_recipe(recipe_id):
     if recipe.user_id != current_user.id:
         flash("You cannot delete this recipe!", "danger")
         return redirect(url_for("recipes"))
+    version = recipe.cache_version
+    db.session.execute(db.delete(RecipeSimilarity).where(
+        (RecipeSimilarity.recipe_id == recipe_id) | (RecipeSimilarity.similar_id == recipe_id)))
     db.session.delete(recipe)
     db.session.commit()
+    for name in RECIPE_FRAGMENTS:
+        fragments.delete(fragments.key(name, recipe_id, version))
+    pdf_export.invalidate(app.config['PDF_CACHE_DIR'], recipe_id)
     flash("Recipe deleted successfully!.", "info")
     return redirect(url_for("recipes"))
 
@@ -398,41 +953,157 @@ def delete_recipe(recipe_id):
 def rate_recipe(recipe_id):
     form = RatingForm()
     if form.validate_on_submit():
-        existing = Rating.query.filter_by(user_id=current_user.id, recipe_id=recipe_id).first()
-        if existing:
-            existing.score = form.score.data
-        else:
-            new_rating = Rating(score=form.score.data, user_id=current_user.id, recipe_id=recipe_id)
-            db.session.add(new_rating)
+        aggregates = save_rating(current_user.id, recipe_id, form.score.data)
+        if aggregates is None:
+            abort(404)
         db.session.commit()
+        if wants_json():
+            average = aggregates.rating_avg
+            return jsonify({"score": form.score.data, "rating_count": aggregates.rating_count,
+                            "rating_avg": float(average) if average is not None else None})
         flash("Rating submitted!", "success")
+    elif wants_json():
+        return jsonify({"errors": form.errors}), 400
     return redirect(url_for("recipe_detail", recipe_id=recipe_id))
 
 
+def wants_json():
+    """
+    True when the caller (the fetch() in static/js/recipe_actions.js) asks
+    for JSON: the action answers with the changed state instead of a
+    flash and a redirect to the re-rendered page.
+    """
+    return request.accept_mimetypes.best == "application/json"
+
+
+def save_rating(user_id, recipe_id, score):
+    """
+    Insert or update a user's rating and move the recipe's aggregates by
+    the difference, in the caller's transaction. Returns the new
+    (rating_count, rating_avg), or None if there is no such recipe.
+    """
+    if insert_or_ignore(Rating, ("user_id", "recipe_id"), score=score, user_id=user_id, recipe_id=recipe_id):
+        count_delta, sum_delta = 1, score
+    else:
+        # the pair exists (possibly just committed by a concurrent request);
+        # lock it so the delta is computed against the score being replaced
+        existing = Rating.query.filter_by(user_id=user_id, recipe_id=recipe_id).with_for_update().one()
+        count_delta, sum_delta = 0, score - existing.score
+        existing.score = score
+    return apply_rating_delta(recipe_id, count_delta, sum_delta)
+
+
+def insert_or_ignore(model, conflict_columns, **values):
+    """
+    INSERT unless a row with the same `conflict_columns` (a unique index)
+    exists, in one statement: ON CONFLICT DO NOTHING on SQLite and
+    Postgres, a savepoint elsewhere. True if the row was inserted.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = (insert(model).values(**values)
+                .on_conflict_do_nothing(index_elements=list(conflict_columns))
+                .returning(model.id))
+        return db.session.execute(stmt).first() is not None
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def apply_rating_delta(recipe_id, count_delta, sum_delta):
+    # single UPDATE so concurrent raters never overwrite each other's totals
+    new_count = Recipe.rating_count + count_delta
+    new_sum = Recipe.rating_sum + sum_delta
+    stmt = db.update(Recipe).where(Recipe.id == recipe_id).values(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=db.case((new_count > 0, new_sum * 1.0 / new_count), else_=None),
+        # the average and the list of ratings are part of the cached fragments
+        cache_version=Recipe.cache_version + 1,
+    )
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(stmt.returning(Recipe.rating_count, Recipe.rating_avg)).first()
+    if not db.session.execute(stmt).rowcount:
+        return None
+    return db.session.execute(
+        db.select(Recipe.rating_count, Recipe.rating_avg).where(Recipe.id == recipe_id)
+    ).first()
+
+
+def backfill_rating_aggregates():
+    """Recompute every recipe's rating aggregates from the rating table."""
+    count = db.select(db.func.count(Rating.id)).where(Rating.recipe_id == Recipe.id).scalar_subquery()
+    total = db.select(db.func.coalesce(db.func.sum(Rating.score), 0)).where(Rating.recipe_id == Recipe.id).scalar_subquery()
+    average = db.select(db.func.avg(Rating.score * 1.0)).where(Rating.recipe_id == Recipe.id).scalar_subquery()
+    db.session.execute(
+        db.update(Recipe).values(rating_count=count, rating_sum=total, rating_avg=average,
+                                 cache_version=Recipe.cache_version + 1),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+
+
+@app.route("/recipes/top")
+@login_required
+@query_budget(4)
+def top_rated():
+    """Best rated recipes, straight off ix_recipe_top_rated."""
+    top = (
+        Recipe.query
+        .filter(Recipe.rating_count >= app.config["TOP_RATED_MIN_RATINGS"])
+        .order_by(Recipe.rating_avg.desc(), Recipe.rating_count.desc())
+        .limit(app.config["LISTING_PAGE_SIZE"])
+        .all()
+    )
+    return render_listing("recipes.html", KeysetPage(top), cards=recipe_cards(top, favorite_recipe_ids()),
+                          heading="Top Rated")
+
+
 @app.route("/recipe/<int:recipe_id>/comment", methods=["POST"])
 @login_required
 def comment_recipe(recipe_id):
+    recipe = Recipe.query.get_or_404(recipe_id)
     form = CommentForm()
     if form.validate_on_submit():
-        comment = Comment(content=form.content.data, user_id=current_user.id, recipe_id=recipe_id)
+        comment = Comment(content=form.content.data, user_id=current_user.id, recipe_id=recipe.id)
         db.session.add(comment)
+        invalidate_recipe(recipe.id, recipe.cache_version)
         db.session.commit()
+        if wants_json():
+            # the same markup the cached page uses, for the script to append
+            comment_item = get_template_attribute("_comment.html", "comment_item")
+            return jsonify({"html": str(comment_item(current_user.username, form.content.data))})
         flash("Comment added!", "success")
+    elif wants_json():
+        return jsonify({"errors": form.errors}), 400
     return redirect(url_for("recipe_detail", recipe_id=recipe_id))
 
 @app.route("/recipe/<int:recipe_id>/favorite", methods=["POST"])
 @login_required
 def favorite_recipe(recipe_id):
-    recipe = Recipe.query.get_or_404(recipe_id)
-    existing = Favorite.query.filter_by(user_id=current_user.id, recipe_id=recipe_id).first()
-    if existing:
-        db.session.delete(existing)  # unfavorite
+    if db.session.execute(db.select(Recipe.id).where(Recipe.id == recipe_id)).first() is None:
+        abort(404)
+    # toggle without a read: delete if present, else insert (a double click
+    # racing itself can't create a second row, the unique index ignores it)
+    removed = db.session.execute(
+        db.delete(Favorite).where(Favorite.user_id == current_user.id, Favorite.recipe_id == recipe_id)
+    ).rowcount
+    if not removed:
+        insert_or_ignore(Favorite, ("user_id", "recipe_id"), user_id=current_user.id, recipe_id=recipe_id)
+    db.session.commit()
+    if wants_json():
+        return jsonify({"favorite": not removed})
+    if removed:
         flash("Removed from favorites.", "info")
     else:
-        fav = Favorite(user_id=current_user.id, recipe_id=recipe_id)
-        db.session.add(fav)
         flash("Added to favorites!", "success")
-    db.session.commit()
     return redirect(url_for("recipe_detail", recipe_id=recipe_id))
 
 @app.route("/nutrition_lookup", methods=["GET", "POST"])
@@ -440,7 +1111,7 @@ def nutrition_lookup():
     totals = None
     matched = None
     if request.method == "POST":
-        ingredients_list = [i.strip() for i in request.form['ingredients'].split(',')]
+        ingredients_list = split_ingredients(request.form['ingredients'])
         from nutrition_calculator.nutrition_utils import calculate_recipe_nutrition
         totals = calculate_recipe_nutrition(ingredients_list)
         matched = ingredients_list
@@ -453,7 +1124,7 @@ def debug_calc():
     q = request.args.get('ingredients', '')
     try:
         from nutrition_calculator.nutrition_utils import calculate_recipe_nutrition
-        ing = [i.strip() for i in q.split(',') if i.strip()]
+        ing = [i for i in split_ingredients(q) if i]
         res = calculate_recipe_nutrition(ing)
         return jsonify(res)
     except Exception as e:
@@ -463,69 +1134,1091 @@ def debug_calc():
         return jsonify({'error': str(e), 'trace': tb}), 500
 
 
+def _nutrition_cache_lookups():
+    # only once the nutrient table is loaded; a scrape shouldn't trigger that
+    nutrition_utils = sys.modules.get("nutrition_calculator.nutrition_utils")
+    if nutrition_utils is None:
+        return {}
+    stats = nutrition_utils.cache_stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+
+
+def _fragment_cache_lookups():
+    stats = fragments.stats()
+    return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+
+
+metrics.collector("recipe_app_fragment_cache_lookups_total", "Fragment cache lookups by result.",
+                  _fragment_cache_lookups, labels=("result",), kind="counter")
+metrics.collector("recipe_app_nutrition_cache_lookups_total", "Resolved-ingredient cache lookups by result.",
+                  _nutrition_cache_lookups,
+                  labels=("result",), kind="counter")
+metrics.collector("recipe_app_nutrition_lookups_in_flight", "Nutrition lookups running on the thread pool.",
+                  lambda: nutrition_service.stats()["in_flight"])
+metrics.collector("recipe_app_nutrition_lookups_coalesced_total",
+                  "Nutrition lookups that joined an identical one already in flight.",
+                  lambda: nutrition_service.stats()["coalesced"], kind="counter")
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus text format; only with METRICS_ENABLED, and behind
+    # METRICS_TOKEN (Authorization: Bearer ...) when that is set
+    if not app.config["METRICS_ENABLED"]:
+        abort(404)
+    token = app.config["METRICS_TOKEN"]
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/nutrition/cache_stats')
+def nutrition_cache_stats():
+    # hit/miss/eviction counters of the resolved-ingredient LRU cache
+    from nutrition_calculator.nutrition_utils import cache_stats
+    return jsonify({**cache_stats(), "lookups": nutrition_service.stats()})
+
+
 def normalize_text(s):
     return (s or '').strip().lower()
 
 
+def split_ingredients(text):
+    """
+    Comma-separated ingredients. Commas inside brackets don't split
+    ("Rajma (kidney beans, boiled) 1 cup"), and a bare quantity is folded
+    into the ingredient before it ("Rice, 1 cup" -> "Rice 1 cup").
+    """
+    from nutrition_calculator.portions import join_quantities
+
+    items, depth, start = [], 0, 0
+    text = text or ''
+    for i, char in enumerate(text):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth = max(0, depth - 1)
+        elif char == ',' and depth == 0:
+            items.append(text[start:i].strip())
+            start = i + 1
+    items.append(text[start:].strip())
+    return join_quantities(items)
+
+
+NUTRIENTS = ("calories", "proteins", "fats", "carbs", "fibers")
+
+
+def ingredient_row_values(position, m):
+    """Column values of a RecipeIngredient for one match_ingredients() entry."""
+    return {"position": position, "raw": m["raw"][:300], "name": m["name"][:300],
+            "head": m["head"][:100], "food_name": m["food_name"], "match_score": m["score"],
+            "portion_g": m["portion_g"], **{k: m["nutrients"][k] for k in NUTRIENTS}}
+
+
+def build_ingredient_rows(ingredients_list):
+    """RecipeIngredient rows (not yet attached) for a parsed ingredient list."""
+    from nutrition_calculator.nutrition_utils import match_ingredients
+    return [RecipeIngredient(**ingredient_row_values(i, m))
+            for i, m in enumerate(match_ingredients(ingredients_list))]
+
+
+def update_ingredient_rows(rows, ingredients_list):
+    """
+    Rows for an edited ingredient list, reusing `rows` whose normalised
+    text (quantity included) is unchanged and already carry their
+    contribution; only new or changed ingredients go through the matcher.
+    """
+    from nutrition_calculator.cache import normalize_query
+    from nutrition_calculator.nutrition_utils import match_ingredients
+
+    reusable = {}
+    for row in sorted(rows, key=lambda r: r.position):
+        if row.calories is not None:
+            reusable.setdefault(normalize_query(row.raw), []).append(row)
+
+    updated, changed = [], []
+    for ingredient in ingredients_list:
+        text = normalize_query(ingredient)
+        if not text:
+            continue
+        position = len(updated)
+        if reusable.get(text):
+            row = reusable[text].pop(0)
+            row.position = position
+            row.raw = ingredient.strip()[:300]
+            updated.append(row)
+        else:
+            updated.append(None)
+            changed.append((position, ingredient))
+
+    for (position, _), m in zip(changed, match_ingredients([i for _, i in changed])):
+        updated[position] = RecipeIngredient(**ingredient_row_values(position, m))
+    return updated
+
+
+def ingredient_totals(rows):
+    """Recipe nutrition totals summed from stored per-ingredient contributions."""
+    return {k: round(sum(getattr(r, k) or 0.0 for r in rows), 2) for k in NUTRIENTS}
+
+
+def ingredient_search(needed, match_all=True, extra_filter=None):
+    """
+    Select (recipe_id, have, total) for recipes using the wanted ingredients,
+    best coverage first. A wanted ingredient matches a recipe ingredient with
+    the same normalised name, the same head word when the wanted ingredient
+    is a single word, or the same INDB food match. `have` / `total` is the
+    fraction of the recipe's ingredients found in `needed`.
+    """
+    from nutrition_calculator.nutrition_utils import match_ingredients
+
+    wanted = match_ingredients(needed)
+    conds = []
+    for m in wanted:
+        alternatives = [RecipeIngredient.name == m["name"]]
+        if m["head"] == m["name"]:
+            alternatives.append(RecipeIngredient.head == m["head"])
+        if m["food_name"]:
+            alternatives.append(RecipeIngredient.food_name == m["food_name"])
+        conds.append(db.or_(*alternatives))
+    if not conds:
+        return None
+
+    any_cond = db.or_(*conds)
+    # candidate recipes come straight off the (name|food_name, recipe_id) indexes
+    candidates = db.select(RecipeIngredient.recipe_id).where(any_cond)
+    have = db.func.sum(db.case((any_cond, 1), else_=0))
+    total = db.func.count(RecipeIngredient.id)
+    query = (
+        db.select(RecipeIngredient.recipe_id, have.label("have"), total.label("total"))
+        .where(RecipeIngredient.recipe_id.in_(candidates))
+        .group_by(RecipeIngredient.recipe_id)
+    )
+    if match_all:
+        covered = sum(db.func.max(db.case((c, 1), else_=0)) for c in conds)
+        query = query.having(covered == len(conds))
+    if extra_filter is not None:
+        query = query.where(extra_filter)
+    return query.order_by((have * 1.0 / total).desc(), RecipeIngredient.recipe_id.desc())
+
+
+def parse_calories(value):
+    """Manual calories from the form as a float, or None if blank/invalid."""
+    if value is None or not str(value).strip():
+        return None
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+
+MACRO_PARAMS = tuple(f"{bound}_{name}" for name in NUTRIENTS for bound in ("min", "max")) + ("sort",)
+
+
+def macro_filters(args):
+    """
+    Per-serving range conditions from ?min_<macro>= / ?max_<macro>= and
+    the order from ?sort=<macro> (lowest first) or ?sort=-<macro>, for
+    macros in NUTRIENTS. Without a sort, results follow the first bounded
+    macro (lowest first under a max, highest first for a min alone), so
+    the range scan on its (value, id) index yields the order as well.
+    Returns (conditions, (column or None, descending)); raises ValueError
+    for a bad number or sort.
+    """
+    conds, order = [], (None, True)
+    for name in NUTRIENTS:
+        column = getattr(Recipe, f"{name}_per_serving")
+        bounds = {}
+        for bound in ("min", "max"):
+            value = args.get(f"{bound}_{name}", "").strip()
+            if not value:
+                continue
+            try:
+                bounds[bound] = float(value)
+            except ValueError:
+                bounds[bound] = math.nan
+            if not math.isfinite(bounds[bound]):
+                raise ValueError(f"{bound}_{name} must be a number.")
+        if "min" in bounds:
+            conds.append(column >= bounds["min"])
+        if "max" in bounds:
+            conds.append(column <= bounds["max"])
+        if bounds and order[0] is None:
+            order = (column, "max" not in bounds)
+
+    sort = args.get("sort", "").strip()
+    if sort:
+        name = sort.lstrip("-")
+        if name not in NUTRIENTS:
+            raise ValueError(f"sort must be one of {', '.join(NUTRIENTS)}, optionally prefixed with '-'.")
+        order = (getattr(Recipe, f"{name}_per_serving"), sort.startswith("-"))
+    if order[0] is not None:
+        # recipes without nutrition can't be ranked by it
+        conds.append(order[0].isnot(None))
+    return conds, order
+
+
+def macro_order_by(column, descending):
+    if column is None:
+        return [Recipe.id.desc()]
+    return [column.desc(), Recipe.id.desc()] if descending else [column.asc(), Recipe.id.asc()]
+
+
 @app.route('/search')
+@query_budget(5)
 def search():
     q = request.args.get('q', '').strip()
     ingredients = request.args.get('ingredients', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config['SEARCH_PAGE_SIZE']
 
     local_results = []
     external_results = []
-
-    if q and not ingredients:
-        # search by recipe title or ingredients in local DB
-        q_like = f"%{q}%"
-        local_results = Recipe.query.filter(Recipe.title.ilike(q_like)).all()
-
-    elif ingredients and not q:
-        # search local DB for any recipe that contains all provided ingredients (comma-separated)
-        needed = [i.strip().lower() for i in ingredients.split(',') if i.strip()]
+    has_next = False
+    coverage = {}
+    needed = [i.strip().lower() for i in ingredients.split(',') if i.strip()]
+    # match=any: "cook with what I have", recipes using any of the ingredients
+    match_all = request.args.get('match', 'all') != 'any'
+    try:
+        macro_conds, (sort_column, sort_desc) = macro_filters(request.args)
+    except ValueError as e:
+        flash(str(e), "warning")
+        macro_conds, sort_column, sort_desc = [], None, True
+    by_macros = bool(macro_conds)
+
+    if q or needed or by_macros:
+        # fetch one extra row to know whether there is a next page
+        limit, offset = per_page + 1, (page - 1) * per_page
+        ids = []
         if needed:
-            # naive approach: filter by ingredients text containing each ingredient
-            query = Recipe.query
-            for ing in needed:
-                query = query.filter(Recipe.ingredients.ilike(f"%{ing}%"))
-            local_results = query.all()
-            
-    # --- CASE 3: Both fields filled (optional behavior) ---
-    elif q and ingredients:
-        q_like = f"%{q}%"
-        query = Recipe.query.filter(Recipe.title.ilike(q_like))
-        needed = [i.strip().lower() for i in ingredients.split(',') if i.strip()]
-        for ing in needed:
-            query = query.filter(Recipe.ingredients.ilike(f"%{ing}%"))
-        local_results = query.all()
+            extra = []
+            if q and search_index.available(db.engine):
+                text_filter = search_index.match_clause(db.session, q, "recipe_ingredient.recipe_id")
+                if text_filter is not None:
+                    extra.append(text_filter)
+            if q and not extra:
+                # no full-text index on this database: title ILIKE
+                extra.append(RecipeIngredient.recipe_id.in_(
+                    db.select(Recipe.id).where(Recipe.title.ilike(f"%{q}%"))))
+            if macro_conds:
+                # ingredient coverage still decides the order
+                extra.append(RecipeIngredient.recipe_id.in_(db.select(Recipe.id).where(*macro_conds)))
+            query = ingredient_search(needed, match_all=match_all,
+                                      extra_filter=db.and_(*extra) if extra else None)
+            rows = db.session.execute(query.limit(limit).offset(offset)).all() if query is not None else []
+            ids = [r.recipe_id for r in rows]
+            coverage = {r.recipe_id: (r.have, r.total) for r in rows}
+        elif by_macros:
+            query = db.select(Recipe.id).where(*macro_conds)
+            if q:
+                text_filter = search_index.match_clause(db.session, q) if search_index.available(db.engine) else None
+                query = query.where(text_filter if text_filter is not None else Recipe.title.ilike(f"%{q}%"))
+            ids = db.session.execute(
+                query.order_by(*macro_order_by(sort_column, sort_desc)).limit(limit).offset(offset)
+            ).scalars().all()
+        elif search_index.available(db.engine):
+            ids = search_index.search_ids(db.session, q, limit, offset)
+        else:
+            ids = db.session.execute(
+                db.select(Recipe.id).where(Recipe.title.ilike(f"%{q}%"))
+                .order_by(Recipe.id.desc()).limit(limit).offset(offset)
+            ).scalars().all()
+        by_id = {r.id: r for r in Recipe.query.options(selectinload(Recipe.user)).filter(Recipe.id.in_(ids))}
+        local_results = [by_id[i] for i in ids if i in by_id]
+        has_next = len(local_results) > per_page
+        local_results = local_results[:per_page]
 
     return render_template(
         'search_results.html',
         q=q,
         ingredients=ingredients,
         local_results=local_results,
-        external_results=external_results
+        external_results=external_results,
+        page=page,
+        has_next=has_next,
+        coverage=coverage,
+        match_all=match_all,
+        by_macros=by_macros,
+        macro_args={k: v for k, v in request.args.items() if k in MACRO_PARAMS and v},
     )
+
+
+@app.route('/api/recipes')
+@query_budget(2)
+def recipes_api():
+    """
+    Recipes by per-serving macros, e.g. ?max_calories=400&min_proteins=20
+    &sort=-proteins (see macro_filters) and optionally ?q=. Keyset-paginated
+    on the sort key: follow "next" until it is null.
+    """
+    try:
+        conds, (column, descending) = macro_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    per_page = max(1, min(request.args.get('per_page', app.config['LISTING_PAGE_SIZE'], type=int), 100))
+
+    query = db.select(Recipe.id, Recipe.title, Recipe.servings,
+                      *(getattr(Recipe, f"{n}_per_serving") for n in NUTRIENTS)).where(*conds)
+    q = request.args.get('q', '').strip()
+    if q:
+        text_filter = search_index.match_clause(db.session, q) if search_index.available(db.engine) else None
+        query = query.where(text_filter if text_filter is not None else Recipe.title.ilike(f"%{q}%"))
+    after = request.args.get('after', '')
+    if after:
+        # "<id>", or "<value>,<id>" when sorted by a macro
+        try:
+            *value, last_id = after.split(',')
+            last_id = int(last_id)
+            value = float(value[0]) if column is not None else None
+        except (ValueError, IndexError):
+            return jsonify({'error': 'Invalid "after" cursor.'}), 400
+        if column is None:
+            query = query.where(Recipe.id < last_id)
+        else:
+            key = db.tuple_(column, Recipe.id)
+            query = query.where(key < (value, last_id) if descending else key > (value, last_id))
+    rows = db.session.execute(query.order_by(*macro_order_by(column, descending)).limit(per_page + 1)).all()
+
+    next_url = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        cursor = str(last.id) if column is None else f"{getattr(last, column.key)!r},{last.id}"
+        next_url = url_for('recipes_api', **{**request.args.to_dict(), 'after': cursor})
+    return jsonify({
+        "recipes": [{
+            "id": r.id,
+            "title": r.title,
+            "url": url_for('recipe_detail', recipe_id=r.id),
+            "servings": r.servings,
+            "per_serving": {n: round(getattr(r, f"{n}_per_serving") or 0, 2) for n in NUTRIENTS},
+        } for r in rows],
+        "next": next_url,
+    })
     
 @app.route("/favorites")
 @login_required
+@query_budget(2)
 def favorites():
-    favs = Favorite.query.filter_by(user_id=current_user.id).all()
-    return render_template("favorites.html", favorites=favs)
+    page = keyset_paginate(
+        Favorite.query.options(joinedload(Favorite.recipe)).filter_by(user_id=current_user.id), Favorite.id
+    )
+    return render_listing("favorites.html", page, favorites=page.items)
 
 
 @app.route("/my_recipes")
 @login_required
+@query_budget(2)
 def my_recipes():
-    user_recipes = Recipe.query.filter_by(user_id=current_user.id).all()
-    return render_template("my_recipes.html", recipes=user_recipes)
+    page = keyset_paginate(Recipe.query.filter_by(user_id=current_user.id), Recipe.id)
+    return render_listing("my_recipes.html", page, recipes=page.items)
+
+# --- Schema ---
+def upgrade_schema():
+    """
+    Add columns and indexes that were introduced after a table was first
+    created. Before a new unique index is built, duplicate rows are removed
+    keeping the newest (highest id) per key. Returns the added
+    (table, column) pairs.
+    """
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = set()
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+                added.add((table.name, column.name))
+
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in indexes:
+                    continue
+                if index.unique:
+                    keep = db.select(db.func.max(table.c.id)).group_by(*index.columns)
+                    conn.execute(table.delete().where(table.c.id.not_in(keep)))
+                index.create(conn)
+    return added
+
+
+# --- CLI ---
+@app.cli.group("nutrition")
+def nutrition_cli():
+    """Nutrition maintenance commands."""
+
+
+def _recompute_worker_init():
+    # forked workers must not reuse the parent's pooled connections
+    with app.app_context():
+        db.engine.dispose(close=False)
 
-# Create tables if they don't exist
-with app.app_context():
-    db.create_all()
 
-if __name__ == "__main__":
-    os.makedirs(os.path.join(os.path.dirname(__file__), "instance"), exist_ok=True)
+def recompute_nutrition_chunk(ids):
+    """Recompute stored nutrition and ingredient rows for recipe `ids`; returns (scanned, changed)."""
+    from nutrition_calculator.nutrition_utils import calculate_recipes_nutrition_batch
+
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(Recipe.id, Recipe.ingredients, Recipe.calories, Recipe.calories_manual,
+                      Recipe.proteins, Recipe.fats, Recipe.carbs, Recipe.fibers)
+            .where(Recipe.id.in_(ids))
+        ).all()
+        totals = calculate_recipes_nutrition_batch([split_ingredients(r.ingredients) for r in rows])
+
+        updates = []
+        for row, t in zip(rows, totals):
+            values = {
+                "id": row.id,
+                # manually entered calories are left alone
+                "calories": row.calories if row.calories_manual else t["calories"],
+                "proteins": t["proteins"],
+                "fats": t["fats"],
+                "carbs": t["carbs"],
+                "fibers": t["fibers"],
+            }
+            current = {"id": row.id, "calories": row.calories, "proteins": row.proteins,
+                       "fats": row.fats, "carbs": row.carbs, "fibers": row.fibers}
+            if values != current:
+                updates.append(values)
+
+        if updates:
+            db.session.execute(db.update(Recipe), updates)
+        # INDB matches may have moved with the dataset too, changing the
+        # per-ingredient breakdown even where the totals came out the same
+        changed = {u["id"] for u in updates}
+        changed.update(replace_ingredient_rows([(r.id, r.ingredients) for r in rows]))
+        if changed:
+            db.session.execute(
+                db.update(Recipe).where(Recipe.id.in_(changed)).values(cache_version=Recipe.cache_version + 1)
+            )
+        db.session.commit()
+        return len(rows), len(changed)
+
+
+def replace_ingredient_rows(recipes):
+    """
+    Bulk re-derive RecipeIngredient rows for (recipe_id, ingredients)
+    pairs. Only recipes whose rows come out different are rewritten;
+    returns their ids.
+    """
+    from nutrition_calculator.nutrition_utils import match_ingredients
+
+    columns = ("position", "raw", "name", "head", "food_name", "match_score", "portion_g") + NUTRIENTS
+    ids = [rid for rid, _ in recipes]
+    current = {rid: [] for rid in ids}
+    for row in db.session.execute(
+        db.select(RecipeIngredient.recipe_id, *(getattr(RecipeIngredient, c) for c in columns))
+        .where(RecipeIngredient.recipe_id.in_(ids)).order_by(RecipeIngredient.recipe_id, RecipeIngredient.position)
+    ):
+        current[row.recipe_id].append(tuple(row)[1:])
+
+    changed, values = [], []
+    for rid, text in recipes:
+        rows = [ingredient_row_values(i, m) for i, m in enumerate(match_ingredients(split_ingredients(text)))]
+        if [tuple(r[c] for c in columns) for r in rows] != current[rid]:
+            changed.append(rid)
+            values += [{"recipe_id": rid, **r} for r in rows]
+    if changed:
+        db.session.execute(db.delete(RecipeIngredient).where(RecipeIngredient.recipe_id.in_(changed)))
+    if values:
+        db.session.execute(db.insert(RecipeIngredient), values)
+    return changed
+
+
+def backfill_ingredient_rows(chunk_size=500):
+    """Populate RecipeIngredient for recipes saved before the table existed."""
+    for ids in _iter_id_chunks(chunk_size):
+        rows = db.session.execute(
+            db.select(Recipe.id, Recipe.ingredients).where(Recipe.id.in_(ids))
+        ).all()
+        changed = replace_ingredient_rows([(r.id, r.ingredients) for r in rows])
+        if changed:
+            # cached pages were rendered without the breakdown
+            db.session.execute(
+                db.update(Recipe).where(Recipe.id.in_(changed)).values(cache_version=Recipe.cache_version + 1)
+            )
+        db.session.commit()
+
+
+def _iter_id_chunks(chunk_size):
+    """Keyset-paginate recipe ids so the full table is never loaded."""
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Recipe.id).where(Recipe.id > last_id).order_by(Recipe.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+@nutrition_cli.command("recompute")
+@click.option("--chunk-size", default=500, show_default=True, help="Recipes per batch/transaction.")
+@click.option("--workers", default=1, show_default=True, help="Worker processes.")
+def recompute_nutrition_command(chunk_size, workers):
+    """Recompute stored nutrition for every recipe from the current dataset."""
+    start = time.perf_counter()
+    scanned = updated = 0
+
+    def report(result):
+        nonlocal scanned, updated
+        scanned += result[0]
+        updated += result[1]
+        rate = scanned / max(time.perf_counter() - start, 1e-9)
+        click.echo(f"  {scanned} recipes scanned, {updated} updated ({rate:.0f}/s)")
+
+    if workers <= 1:
+        for ids in _iter_id_chunks(chunk_size):
+            report(recompute_nutrition_chunk(ids))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_recompute_worker_init) as pool:
+            pending = set()
+            for ids in _iter_id_chunks(chunk_size):
+                pending.add(pool.submit(recompute_nutrition_chunk, ids))
+                # keep a bounded number of chunks in flight
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        report(f.result())
+            for f in pending:
+                report(f.result())
+
+    elapsed = time.perf_counter() - start
+    click.echo(f"Recomputed {scanned} recipes ({updated} changed) in {elapsed:.2f}s "
+               f"— {scanned / max(elapsed, 1e-9):.0f} recipes/s")
+
+
+@app.cli.group("search")
+def search_cli():
+    """Full-text search index commands."""
+
+
+@search_cli.command("rebuild")
+def search_rebuild_command():
+    """Backfill / rebuild the full-text index for every recipe."""
+    if not search_index.install(db.engine):
+        raise click.ClickException(f"No full-text index support for {db.engine.dialect.name}.")
+    start = time.perf_counter()
+    search_index.rebuild(db.engine)
+    click.echo(f"Rebuilt search index for {Recipe.query.count()} recipes "
+               f"in {time.perf_counter() - start:.2f}s")
+
+
+@app.cli.group("ratings")
+def ratings_cli():
+    """Rating maintenance commands."""
+
+
+@ratings_cli.command("backfill")
+def ratings_backfill_command():
+    """Recompute rating_count / rating_sum / rating_avg for every recipe."""
+    backfill_rating_aggregates()
+    click.echo(f"Rating aggregates rebuilt for {Recipe.query.count()} recipes.")
+
+
+@app.cli.group("images")
+def images_cli():
+    """Uploaded image maintenance commands."""
+
+
+@images_cli.command("migrate")
+def images_migrate_command():
+    """
+    Move legacy uuid-named uploads to content-addressed names, point
+    recipes at them, build resized variants and delete files no recipe
+    references any more.
+    """
+    upload_dir = app.config['UPLOAD_FOLDER']
+    moved = {}
+    for recipe in Recipe.query.filter(Recipe.image_url.startswith(UPLOAD_URL_PREFIX)):
+        name = recipe.image_url[len(UPLOAD_URL_PREFIX):]
+        if name not in moved:
+            path = os.path.join(upload_dir, name)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                stored = image_store.store_upload(FileStorage(f, filename=name), upload_dir, background=False)
+            image_store.make_variants(upload_dir, stored)
+            moved[name] = stored
+        recipe.image_url = UPLOAD_URL_PREFIX + moved[name]
+    db.session.commit()
+
+    referenced = {r.image_url[len(UPLOAD_URL_PREFIX):]
+                  for r in Recipe.query.filter(Recipe.image_url.startswith(UPLOAD_URL_PREFIX))}
+    removed = 0
+    for name in os.listdir(upload_dir):
+        digest = name.split("_")[0].split(".")[0]
+        keep = name in referenced or any(ref.startswith(digest + ".") for ref in referenced)
+        if not keep and os.path.isfile(os.path.join(upload_dir, name)):
+            os.remove(os.path.join(upload_dir, name))
+            removed += 1
+    click.echo(f"Re-stored {len(moved)} uploads as {len(set(moved.values()))} files; removed {removed} unreferenced files.")
+
+
+@app.cli.group("similar")
+def similar_cli():
+    """Similar-recipe recommendation commands."""
+
+
+def _similar_documents(ids):
+    """(ingredient terms, (proteins, fats, carbs, fibers)) lists for recipe `ids`, in order."""
+    docs = {rid: [] for rid in ids}
+    for rid, food_name, name in db.session.execute(
+        db.select(RecipeIngredient.recipe_id, RecipeIngredient.food_name, RecipeIngredient.name)
+        .where(RecipeIngredient.recipe_id.in_(ids))
+    ):
+        docs[rid].append(similar_recipes.term(food_name, name))
+    profiles = {
+        r.id: (r.proteins, r.fats, r.carbs, r.fibers)
+        for r in db.session.execute(
+            db.select(Recipe.id, Recipe.proteins, Recipe.fats, Recipe.carbs, Recipe.fibers)
+            .where(Recipe.id.in_(ids))
+        )
+    }
+    return [docs[i] for i in ids], [profiles.get(i, (0, 0, 0, 0)) for i in ids]
+
+
+def _replace_similar(lists):
+    """Store {recipe_id: [(similar_id, score), ...]} in place of those recipes' lists."""
+    db.session.execute(db.delete(RecipeSimilarity).where(RecipeSimilarity.recipe_id.in_(list(lists))))
+    rows = [{"recipe_id": rid, "similar_id": sid, "score": score}
+            for rid, pairs in lists.items() for sid, score in pairs]
+    if rows:
+        db.session.execute(db.insert(RecipeSimilarity), rows)
+
+
+def update_similar_recipes(recipe_id):
+    """
+    Re-score one added or edited recipe against the recipes sharing an
+    ingredient with it: its own list is replaced, and it is slotted into
+    theirs where it now ranks. Ingredients first seen after the last
+    `flask similar rebuild` don't count until the next one. Runs on the
+    similar_recipes update thread.
+    """
+    model = similar_recipes.load(app.config["SIMILAR_MODEL_PATH"])
+    if model is None:
+        return  # never built; the rebuild covers this recipe too
+    k = app.config["SIMILAR_RECIPES"] or similar_recipes.DEFAULT_K
+    with app.app_context():
+        try:
+            if db.session.get(Recipe, recipe_id) is None:
+                return  # deleted before we got to it
+            (doc,), (profile,) = _similar_documents([recipe_id])
+            terms = sorted({t for t in doc if t in model.vocabulary})
+            # lists it was on are decided again below
+            db.session.execute(db.delete(RecipeSimilarity).where(RecipeSimilarity.similar_id == recipe_id))
+            candidates = []
+            if terms:
+                candidates = db.session.execute(
+                    db.select(RecipeIngredient.recipe_id).distinct()
+                    .where(RecipeIngredient.recipe_id != recipe_id,
+                           RecipeIngredient.food_name.in_(terms)
+                           | (RecipeIngredient.food_name.is_(None) & RecipeIngredient.name.in_(terms)))
+                    .limit(app.config["SIMILAR_MAX_CANDIDATES"])
+                ).scalars().all()
+            docs, profiles = _similar_documents(candidates)
+            scores = model.scores(doc, profile, docs, profiles)
+            lists = {recipe_id: similar_recipes.top(candidates, scores, k)}
+
+            current = {}
+            for row in db.session.execute(
+                db.select(RecipeSimilarity.recipe_id, RecipeSimilarity.similar_id, RecipeSimilarity.score)
+                .where(RecipeSimilarity.recipe_id.in_(candidates))
+            ):
+                current.setdefault(row.recipe_id, []).append((row.similar_id, row.score))
+            for other, score in zip(candidates, scores):
+                pairs = current.get(other, [])
+                if score >= similar_recipes.MIN_SCORE and (len(pairs) < k or score > min(s for _, s in pairs)):
+                    pairs = pairs + [(recipe_id, round(float(score), 4))]
+                    lists[other] = sorted(pairs, key=lambda p: -p[1])[:k]
+            _replace_similar(lists)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("similar recipes update failed for recipe %s", recipe_id)
+
+
+@similar_cli.command("rebuild")
+@click.option("--k", "k", type=int, help="Neighbours per recipe (default SIMILAR_RECIPES).")
+@click.option("--chunk-size", default=1000, show_default=True, help="Recipes per block/transaction.")
+def similar_rebuild_command(k, chunk_size):
+    """Fit the ingredient/macro model and precompute every recipe's neighbours."""
+    start = time.perf_counter()
+    k = k or app.config["SIMILAR_RECIPES"] or similar_recipes.DEFAULT_K
+    ids, docs, profiles = [], [], []
+    for chunk in _iter_id_chunks(chunk_size):
+        chunk_docs, chunk_profiles = _similar_documents(chunk)
+        ids += chunk
+        docs += chunk_docs
+        profiles += chunk_profiles
+    model = similar_recipes.fit(docs, profiles)
+    if model is None:
+        raise click.ClickException("No recipe has ingredient rows; nothing to compare.")
+    similar_recipes.save(model, app.config["SIMILAR_MODEL_PATH"])
+    click.echo(f"  fitted {len(model.vocabulary)} ingredient terms over {len(ids)} recipes "
+               f"in {time.perf_counter() - start:.2f}s")
+
+    done = pairs = 0
+    lists = {}
+
+    def flush():
+        nonlocal done, pairs
+        _replace_similar(lists)
+        db.session.commit()
+        done += len(lists)
+        pairs += sum(len(v) for v in lists.values())
+        lists.clear()
+        rate = done / max(time.perf_counter() - start, 1e-9)
+        click.echo(f"  {done} recipes ({rate:.0f}/s)")
+
+    for recipe_id, neighbours in similar_recipes.neighbours(model, ids, docs, profiles, k, block=chunk_size):
+        lists[recipe_id] = neighbours
+        if len(lists) >= chunk_size:
+            flush()
+    if lists:
+        flush()
+    elapsed = time.perf_counter() - start
+    click.echo(f"Stored {pairs} neighbours for {done} recipes in {elapsed:.2f}s "
+               f"— {done / max(elapsed, 1e-9):.0f} recipes/s")
+
+
+@app.cli.group("recipes")
+def recipes_cli():
+    """Bulk recipe import/export."""
+
+
+EXPORT_FIELDS = ("title", "ingredients", "instructions", "image_url", "youtube_url", "author", "servings",
+                 "calories", "calories_manual", "proteins", "fats", "carbs", "fibers")
+
+
+def _file_format(file, fmt):
+    if fmt:
+        return fmt
+    return "csv" if getattr(file, "name", "").lower().endswith(".csv") else "jsonl"
+
+
+def _read_records(file, fmt):
+    """(line number, dict) per record, streamed."""
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for number, line in enumerate(file, 1):
+            if line.strip():
+                yield number, json.loads(line)
+
+
+def _truthy(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "t")
+
+
+IMPORT_TEXT_FIELDS = ("title", "ingredients", "instructions", "author", "image", "image_url", "youtube_url")
+
+
+def _import_number(record, key):
+    """record[key] as a finite float, None if absent or blank; ValueError otherwise."""
+    value = record.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = math.nan
+    if isinstance(value, bool) or not math.isfinite(number):
+        raise ValueError(f"{key} must be a number")
+    return number
+
+
+def _import_fields(record):
+    """
+    The checked values of one import record: text fields stripped (""
+    when absent), calories (None unless a manual value), servings clamped
+    to 1-100. Raises ValueError saying why the record can't be imported.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+    fields = {}
+    for key in IMPORT_TEXT_FIELDS:
+        value = record.get(key)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{key} must be text")
+        fields[key] = (value or "").strip()
+    missing = [k for k in ("title", "ingredients", "instructions") if not fields[k]]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    calories = _import_number(record, "calories")
+    if calories is not None and "calories_manual" in record and not _truthy(record["calories_manual"]):
+        calories = None  # an exported computed value: recompute it here
+    servings = _import_number(record, "servings")
+    # ingredients and instructions keep their line breaks and spacing
+    fields.update(ingredients=record["ingredients"], instructions=record["instructions"], calories=calories,
+                  servings=min(max(int(servings or 1), 1), 100))
+    return fields
+
+
+def _import_image(value, images_dir, stored):
+    """
+    image_url for an imported record's `image` / `image_url`: http(s) and
+    /static/uploads/ URLs are kept, a file under `images_dir` is stored
+    content-addressed (once per file). None if it can't be resolved.
+    """
+    if not value or value.startswith(("http://", "https://", UPLOAD_URL_PREFIX)):
+        return value or None
+    if not images_dir:
+        return None
+    path = os.path.join(images_dir, value)
+    if path not in stored:
+        if not os.path.isfile(path):
+            stored[path] = None
+        else:
+            upload_dir = app.config['UPLOAD_FOLDER']
+            with open(path, "rb") as f:
+                filename = image_store.store_upload(FileStorage(f, filename=value), upload_dir, background=False)
+            image_store.make_variants(upload_dir, filename)
+            stored[path] = UPLOAD_URL_PREFIX + filename
+    return stored[path]
+
+
+def import_recipe_chunk(records, owners, default_owner_id, images_dir, stored_images):
+    """
+    Insert one chunk of (line, record) pairs in a single transaction:
+    every distinct ingredient line in the chunk is matched once, then
+    recipes and their ingredient rows go in as two executemany inserts.
+    Returns (imported, [(line, reason) skipped]).
+    """
+    from nutrition_calculator.cache import normalize_query
+    from nutrition_calculator.nutrition_utils import match_ingredients
+
+    valid, skipped = [], []
+    for line, record in records:
+        try:
+            fields = _import_fields(record)
+        except ValueError as e:
+            skipped.append((line, str(e)))
+            continue
+        author = fields["author"]
+        if author and author not in owners:
+            owners[author] = db.session.execute(
+                db.select(User.id).where(User.username == author)).scalar()
+        valid.append((fields, split_ingredients(fields["ingredients"]), owners.get(author) or default_owner_id))
+
+    unique = {}
+    for _, items, _ in valid:
+        for item in items:
+            key = normalize_query(item)
+            if key and key not in unique:
+                unique[key] = item
+    matched = dict(zip(unique, match_ingredients(list(unique.values()))))
+
+    recipes, ingredient_lists = [], []
+    for fields, items, owner_id in valid:
+        matches = [dict(matched[k], raw=item.strip()) for item in items if (k := normalize_query(item))]
+        totals = {k: sum(m["nutrients"][k] for m in matches) for k in NUTRIENTS}
+        manual = fields["calories"]
+        recipes.append({
+            "title": fields["title"][:150],
+            "ingredients": fields["ingredients"],
+            "instructions": fields["instructions"],
+            "image_url": _import_image(fields["image"] or fields["image_url"], images_dir, stored_images),
+            "youtube_url": fields["youtube_url"] or None,
+            "user_id": owner_id,
+            "calories": round(manual if manual is not None else totals["calories"], 2),
+            "calories_manual": manual is not None,
+            "servings": fields["servings"],
+            **{k: round(totals[k], 2) for k in NUTRIENTS if k != "calories"},
+        })
+        ingredient_lists.append(matches)
+
+    if recipes:
+        ids = db.session.execute(
+            db.insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True), recipes
+        ).scalars().all()
+        rows = [{"recipe_id": rid, **ingredient_row_values(i, m)}
+                for rid, matches in zip(ids, ingredient_lists) for i, m in enumerate(matches)]
+        if rows:
+            db.session.execute(db.insert(RecipeIngredient), rows)
+    db.session.commit()
+    return len(recipes), skipped
+
+
+@recipes_cli.command("import")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), help="Default: from the file name (.csv, else jsonl).")
+@click.option("--user", "username", required=True, help="Owner of recipes whose `author` isn't an existing user.")
+@click.option("--images-dir", type=click.Path(file_okay=False, exists=True),
+              help="Directory that relative `image` / `image_url` values are read from.")
+@click.option("--chunk-size", default=1000, show_default=True, help="Recipes per batch/transaction.")
+def recipes_import_command(source, fmt, username, images_dir, chunk_size):
+    """
+    Import recipes from JSON Lines or CSV (`-` for stdin), streamed in
+    chunks. Columns: title, ingredients, instructions (required), author,
+    image / image_url, youtube_url, servings, calories and calories_manual
+    (a calories value is kept as typed unless calories_manual is false).
+    Nutrition is computed from the ingredients.
+    """
+    owner_id = db.session.execute(db.select(User.id).where(User.username == username)).scalar()
+    if owner_id is None:
+        raise click.UsageError(f"no user named {username!r}")
+
+    start = time.perf_counter()
+    imported = skipped = 0
+    owners, stored_images, chunk = {}, {}, []
+
+    def flush():
+        nonlocal imported, skipped
+        done, bad = import_recipe_chunk(chunk, owners, owner_id, images_dir, stored_images)
+        chunk.clear()
+        imported += done
+        skipped += len(bad)
+        for line, reason in bad:
+            click.echo(f"  line {line}: skipped ({reason})", err=True)
+        rate = imported / max(time.perf_counter() - start, 1e-9)
+        click.echo(f"  {imported} recipes imported ({rate:.0f}/s)")
+
+    try:
+        for line, record in _read_records(source, _file_format(source, fmt)):
+            chunk.append((line, record))
+            if len(chunk) >= chunk_size:
+                flush()
+    except (ValueError, csv.Error) as e:
+        # json.JSONDecodeError is a ValueError
+        raise click.ClickException(f"{getattr(source, 'name', 'input')}: {e} (after {imported} imported)")
+    if chunk:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    click.echo(f"Imported {imported} recipes ({skipped} skipped) in {elapsed:.2f}s "
+               f"— {imported / max(elapsed, 1e-9):.0f} recipes/s")
+
+
+@recipes_cli.command("export")
+@click.argument("target", type=click.File("w", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), help="Default: from the file name (.csv, else jsonl).")
+@click.option("--chunk-size", default=1000, show_default=True, help="Recipes fetched per query.")
+def recipes_export_command(target, fmt, chunk_size):
+    """Export every recipe as JSON Lines or CSV (`-` for stdout), streamed by id."""
+    fmt = _file_format(target, fmt)
+    writer = csv.DictWriter(target, EXPORT_FIELDS) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    start = time.perf_counter()
+    exported = 0
+    for ids in _iter_id_chunks(chunk_size):
+        rows = db.session.execute(
+            db.select(Recipe.title, Recipe.ingredients, Recipe.instructions, Recipe.image_url,
+                      Recipe.youtube_url, User.username.label("author"), Recipe.servings, Recipe.calories,
+                      Recipe.calories_manual, Recipe.proteins, Recipe.fats, Recipe.carbs, Recipe.fibers)
+            .join(User, User.id == Recipe.user_id).where(Recipe.id.in_(ids)).order_by(Recipe.id)
+        ).mappings()
+        for row in rows:
+            if writer:
+                writer.writerow(dict(row))
+            else:
+                target.write(json.dumps(dict(row), ensure_ascii=False) + "\n")
+            exported += 1
+    elapsed = time.perf_counter() - start
+    click.echo(f"Exported {exported} recipes in {elapsed:.2f}s — {exported / max(elapsed, 1e-9):.0f} recipes/s",
+               err=True)
+
+
+@app.cli.group("schema")
+def schema_cli():
+    """Database schema commands."""
+
+
+@schema_cli.command("upgrade")
+def schema_upgrade_command():
+    """Create missing tables, columns, indexes and the search index, then run one-off backfills."""
+    init_schema()
+    click.echo("Schema is up to date.")
+
+
+def init_schema():
+    """
+    Bring the database up to the current models. Run once per deploy
+    (`flask schema upgrade`), not on every worker start.
+    """
     with app.app_context():
+        new_ingredient_table = not db.inspect(db.engine).has_table(RecipeIngredient.__tablename__)
         db.create_all()
+        added_columns = upgrade_schema()
+        search_index.install(db.engine)
+        if new_ingredient_table or ("recipe_ingredient", "calories") in added_columns:
+            # rows predating the per-ingredient contributions get them now
+            backfill_ingredient_rows()
+        if ("recipe", "rating_count") in added_columns:
+            backfill_rating_aggregates()
+
+
+def preload_nutrition():
+    """
+    Load the nutrient table and build the matcher now instead of on the
+    first request. Under `gunicorn --preload` this runs once in the master
+    and forked workers share the pages copy-on-write.
+    """
+    from nutrition_calculator import nutrition_utils
+    nutrition_utils.get_nutrition("onion")  # warms the matcher's code paths too
+
+
+# Consumed while `app` was set up at import: Flask-SQLAlchemy binds its
+# engines in init_app, the fragment cache picks its backend, and the pool
+# settings were folded into SQLALCHEMY_ENGINE_OPTIONS by config.py
+IMPORT_TIME_CONFIG = ("FRAGMENT_CACHE_URL", "FRAGMENT_CACHE_SIZE", "FRAGMENT_CACHE_TTL",
+                      "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_RECYCLE", "NUTRITION_WORKERS")
+IMPORT_TIME_PREFIXES = ("SQLALCHEMY_", "BCRYPT_")
+
+
+def create_app(config=None):
+    """
+    Finish setting up the application and return it, e.g.
+    `gunicorn 'app:create_app()'`.
+
+    This is not a factory: there is one module-level `app`, configured from
+    the environment (see config.py) when this module is imported, and every
+    call returns that same object. `config` overrides settings that are read
+    per request or here (TESTING, AUTO_CREATE_SCHEMA, PRELOAD_NUTRITION,
+    METRICS_ENABLED, UPLOAD_FOLDER, PDF_CACHE_DIR...; the directories are
+    created here). Settings already consumed at import, the database URI
+    and engine options, the fragment cache backend or the nutrition lookup
+    pool size, would be silently ignored, so changing them raises
+    ValueError; set them in the environment (DATABASE_URL,
+    FRAGMENT_CACHE_URL, NUTRITION_WORKERS...) before importing instead.
+
+    Importing this module only defines routes and models; schema work
+    happens here when AUTO_CREATE_SCHEMA is set (otherwise via `flask schema
+    upgrade`), and the nutrition data is loaded here when PRELOAD_NUTRITION
+    is set. With METRICS_ENABLED, nutrition matching is timed per request
+    as well.
+    """
+    if config:
+        fixed = sorted(k for k in config
+                       if (k in IMPORT_TIME_CONFIG or k.startswith(IMPORT_TIME_PREFIXES))
+                       and config[k] != app.config.get(k))
+        if fixed:
+            raise ValueError(f"{', '.join(fixed)} can't be changed after `app` is imported; "
+                             "set them in the environment instead")
+        app.config.update(config)
+    make_dirs()
+    if app.config["AUTO_CREATE_SCHEMA"]:
+        init_schema()
+    if app.config["PRELOAD_NUTRITION"]:
+        preload_nutrition()
+    if app.config["METRICS_ENABLED"]:
+        from nutrition_calculator import nutrition_utils
+        nutrition_utils.timing_observer = _observe_nutrition
+    return app
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.join(os.path.dirname(__file__), "instance"), exist_ok=True)
+    init_schema()
     app.run(debug=True)
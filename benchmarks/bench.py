@@ -0,0 +1,220 @@
+"""
+Latency and memory of the nutrition functions and the hot views, against a
+tracked baseline.
+
+    python benchmarks/seed.py --recipes 10k          # once, builds instance/bench_10k.db
+    python benchmarks/bench.py [--db instance/bench_10k.db] [--iterations 200]
+                               [--only search_title,recipes] [--check] [--update]
+
+Scenarios:
+  get_nutrition_cold      single lookup with the resolved-ingredient cache cleared
+  get_nutrition_warm      single lookup served from the cache
+  recipe_nutrition        calculate_recipe_nutrition() on stored ingredient lists (warm cache)
+  search_title            GET /search?q=<word>
+  search_ingredients      GET /search?ingredients=<a>,<b>
+  recipes                 GET /recipes at a random keyset cursor
+  recipe_detail           GET /recipe/<id> for random recipes
+  api_recipes_macros      GET /api/recipes?max_calories=<n>&min_proteins=<n> (per-serving ranges)
+
+Each scenario runs --iterations times and reports p50/p95/p99 in ms, then
+a shorter pass under tracemalloc for the peak memory allocated by one call.
+Results are compared with benchmarks/bench_baseline.json under the
+database's size label (10k, 100k, 1M). --update rewrites that entry, and
+--check exits 1 when a p95 is more than --tolerance (default 25%) over it,
+or a peak more than --memory-tolerance (default 50%). Peaks get the wider
+margin because they are the largest of a few random pages, and count
+whatever the fragment cache keeps from them.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "bench_baseline.json")
+MEMORY_ITERATIONS = 20
+# differences below these are timer / allocator noise, never a regression
+NOISE = {"p95_ms": 0.1, "peak_kb": 8.0}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def measure(call, iterations, setup=None):
+    if setup:
+        setup()
+    call()  # first call pays for imports and template compilation
+    times = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - t) * 1000)
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(iterations, MEMORY_ITERATIONS)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return {
+        "p50_ms": round(statistics.median(times), 3),
+        "p95_ms": round(percentile(times, 95), 3),
+        "p99_ms": round(percentile(times, 99), 3),
+        "peak_kb": round(max(peaks) / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    """Regression messages for `results` against `baseline` (both scenario -> measure)."""
+    regressions = []
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        for key, allowed in (("p95_ms", tolerance), ("peak_kb", memory_tolerance)):
+            if r[key] > old[key] * (1 + allowed) and r[key] - old[key] > NOISE[key]:
+                regressions.append(f"{name} {key} {r[key]} > {old[key]} +{allowed:.0%}")
+    return regressions
+
+
+def scenarios(appmod, rng):
+    """name -> (setup or None, zero-argument callable doing one unit of work)."""
+    from app import Recipe, RecipeIngredient, User, db
+    from nutrition_calculator import nutrition_utils as nu
+
+    with appmod.app.app_context():
+        max_id = db.session.execute(db.select(db.func.max(Recipe.id))).scalar() or 0
+        sample_ids = [rng.randint(1, max_id) for _ in range(500)] if max_id else []
+        lists = [appmod.split_ingredients(r.ingredients)
+                 for r in Recipe.query.filter(Recipe.id.in_(sample_ids[:200]))]
+        names = [n for (n,) in db.session.execute(
+            db.select(RecipeIngredient.name).distinct().limit(500))]
+        heads = [h for (h,) in db.session.execute(
+            db.select(RecipeIngredient.head).distinct().limit(200)) if h]
+        titles = [t for (t,) in db.session.execute(
+            db.select(Recipe.title).where(Recipe.id.in_(sample_ids[:200])))]
+        user = User.query.order_by(User.id).first()
+    if not (max_id and user and names):
+        sys.exit("the database is empty; run benchmarks/seed.py first")
+    words = sorted({w for t in titles for w in re.findall(r"[a-z]{4,}", t.lower())})
+
+    client = appmod.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+        session["_fresh"] = True
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        response.get_data()
+
+    def cold():
+        nu.nutrition_cache.clear()
+        nu.get_nutrition(rng.choice(names))
+
+    warm_names = names[:50]
+    return {
+        "get_nutrition_cold": (None, cold),
+        "get_nutrition_warm": (lambda: [nu.get_nutrition(n) for n in warm_names],
+                               lambda: nu.get_nutrition(rng.choice(warm_names))),
+        # ingredients already resolved: this measures parsing and the batch maths
+        "recipe_nutrition": (lambda: nu.calculate_recipes_nutrition_batch(lists),
+                             lambda: nu.calculate_recipe_nutrition(rng.choice(lists))),
+        "search_title": (None, lambda: get(f"/search?q={rng.choice(words)}")),
+        "search_ingredients": (None, lambda: get(f"/search?ingredients={','.join(rng.sample(heads, 2))}")),
+        "recipes": (None, lambda: get(f"/recipes?after={rng.randint(0, max_id)}")),
+        "recipe_detail": (None, lambda: get(f"/recipe/{rng.choice(sample_ids)}")),
+        "api_recipes_macros": (None, lambda: get(f"/api/recipes?max_calories={rng.randint(200, 800)}"
+                                                 f"&min_proteins={rng.randint(5, 30)}")),
+    }
+
+
+def size_label(appmod):
+    from app import Recipe, db
+    with appmod.app.app_context():
+        n = db.session.execute(db.select(db.func.count(Recipe.id))).scalar()
+    for limit, name in ((1_000_000, "1M"), (100_000, "100k"), (10_000, "10k")):
+        if n >= limit * 0.9:
+            return name
+    return str(n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.path.join(ROOT, "instance", "bench_10k.db"))
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.5)
+    parser.add_argument("--check", action="store_true", help="fail when slower than the baseline")
+    parser.add_argument("--update", action="store_true", help="write the result as the new baseline")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.db)
+    if not os.path.exists(path):
+        sys.exit(f"{path} not found; create it with benchmarks/seed.py")
+    # the app reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    sys.path.insert(0, ROOT)
+    import app as appmod
+    appmod.create_app()
+    appmod.app.logger.disabled = True  # query budget warnings would drown the table
+
+    rng = random.Random(args.seed)
+    label = size_label(appmod)
+    todo = scenarios(appmod, rng)
+    if args.only:
+        wanted = args.only.split(",")
+        unknown = set(wanted) - set(todo)
+        if unknown:
+            sys.exit(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+        todo = {name: todo[name] for name in wanted}
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f).get(label, {})
+
+    print(f"{os.path.relpath(path, ROOT)} ({label}), {args.iterations} iterations")
+    print(f"{'scenario':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>9}  vs baseline p95")
+    results = {}
+    for name, (setup, call) in todo.items():
+        r = results[name] = measure(call, args.iterations, setup)
+        old = baseline.get(name)
+        change = f"{r['p95_ms'] / old['p95_ms'] - 1:+.0%}" if old else ""
+        print(f"{name:<22} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['peak_kb']:>9.1f}  {change}")
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS {rss_mb:.0f} MB")
+
+    if args.update:
+        data = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                data = json.load(f)
+        data.setdefault(label, {}).update(results)
+        data[label]["python"] = sys.version.split()[0]
+        with open(BASELINE, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {os.path.relpath(BASELINE, ROOT)} [{label}]")
+    elif args.check and regressions:
+        sys.exit("regressed:\n  " + "\n  ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
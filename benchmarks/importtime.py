@@ -0,0 +1,89 @@
+"""
+Import time of `app`, from `python -X importtime`, against a tracked baseline.
+
+    python benchmarks/importtime.py [--runs 5] [--top 15] [--check] [--update]
+
+Each sample imports `app` in a fresh interpreter. Prints the median total
+and the slowest modules imported directly by app.py. The baseline lives in
+benchmarks/importtime_baseline.json; --update rewrites it, --check exits 1
+when the median is more than --tolerance (default 25%) over it.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "importtime_baseline.json")
+
+# "import time:   self [us] | cumulative | imported package"
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def sample(module):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total = None
+    children = {}
+    for line in out.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        if depth == 0 and name == module:
+            total = cumulative
+        elif depth == 1:
+            children[name] = cumulative
+    return total / 1000, {k: v / 1000 for k, v in children.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--check", action="store_true", help="fail when slower than the baseline")
+    parser.add_argument("--update", action="store_true", help="write the result as the new baseline")
+    args = parser.parse_args()
+
+    runs = [sample(args.module) for _ in range(args.runs)]
+    total = statistics.median(r[0] for r in runs)
+    names = set().union(*(r[1] for r in runs))
+    children = {n: statistics.median(r[1].get(n, 0.0) for r in runs) for n in names}
+
+    print(f"import {args.module}: {total:.1f} ms (median of {args.runs})")
+    print(f"{'module':<40} {'cumulative (ms)':>16}")
+    for name, ms in sorted(children.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"{name:<40} {ms:>16.1f}")
+
+    baseline = None
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f).get(args.module)
+    if baseline:
+        change = total / baseline["total_ms"] - 1
+        print(f"baseline: {baseline['total_ms']:.1f} ms ({change:+.0%})")
+
+    if args.update:
+        data = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                data = json.load(f)
+        data[args.module] = {"total_ms": round(total, 1), "python": sys.version.split()[0]}
+        with open(BASELINE, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {os.path.relpath(BASELINE, ROOT)}")
+    elif args.check and baseline and total > baseline["total_ms"] * (1 + args.tolerance):
+        sys.exit(f"import {args.module} regressed: {total:.1f} ms > {baseline['total_ms']:.1f} ms "
+                 f"+{args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
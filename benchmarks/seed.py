@@ -0,0 +1,170 @@
+"""
+Synthetic database for the benchmarks: users, recipes with parsed
+ingredient rows, ratings, comments and favorites.
+
+    python benchmarks/seed.py --recipes 10000 [--db instance/bench_10k.db] [--force]
+
+Sizes like 10k / 100k / 1M are accepted. Nothing touches instance/site.db
+unless it is passed as --db. Ingredient lines are drawn from a fixed pool
+("2 tbsp oil", "1 cup rice"...) that is matched once, so seeding a million
+recipes does not run the matcher a million times. Output is deterministic
+for a given --seed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DISHES = ["curry", "dal", "pulao", "biryani", "khichdi", "salad", "soup", "paratha", "dosa",
+          "upma", "poha", "halwa", "kheer", "sabzi", "raita", "chaat", "wrap", "bowl",
+          "stir fry", "smoothie", "pancake", "tikka", "masala", "kurma", "stew"]
+ADJECTIVES = ["spicy", "quick", "creamy", "homestyle", "healthy", "crispy", "tangy", "simple",
+              "smoky", "festive", "light", "rich", "street style", "protein", "one pot"]
+QUANTITIES = ["1 cup", "1/2 cup", "2 cups", "1 tbsp", "2 tbsp", "1 tsp", "1/2 tsp", "100 g",
+              "200 g", "2", "3", "1 medium", "1 pinch", ""]
+STEPS = ["Wash and chop the vegetables.", "Heat oil in a pan.", "Add the spices and saute.",
+         "Simmer for ten minutes.", "Season with salt.", "Garnish and serve hot.",
+         "Blend until smooth.", "Soak for an hour.", "Cook until soft."]
+COMMENTS = ["Loved it!", "Too salty for me.", "Made this twice this week.", "Kids enjoyed it.",
+            "Added extra chilli.", "Great with rice.", "Will try again.", "Perfect texture."]
+
+
+def count(value):
+    """10000, 10k, 1.5M -> int."""
+    value = value.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * scale)
+
+
+def label(n):
+    return f"{n // 1_000_000}M" if n >= 1_000_000 and n % 1_000_000 == 0 else \
+        f"{n // 1000}k" if n >= 1000 and n % 1000 == 0 else str(n)
+
+
+def ingredient_pool(rng, size):
+    """Distinct ingredient lines built from the portion table's foods."""
+    import csv
+    with open(os.path.join(ROOT, "dataset", "portions.csv"), newline="", encoding="utf-8") as f:
+        foods = [r["name"] for r in csv.DictReader(f) if r["name"] and not r["name"].startswith("#")]
+    lines = set()
+    while len(lines) < min(size, len(foods) * len(QUANTITIES)):
+        lines.add(f"{rng.choice(QUANTITIES)} {rng.choice(foods)}".strip())
+    return sorted(lines)
+
+
+def chunks(n, size):
+    for start in range(0, n, size):
+        yield start, min(n, start + size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=count, default=count("10k"))
+    parser.add_argument("--db", help="sqlite file (default instance/bench_<size>.db)")
+    parser.add_argument("--users", type=count, help="default recipes / 20, at least 50")
+    parser.add_argument("--ratings", type=float, default=3.0, help="per recipe, on average")
+    parser.add_argument("--comments", type=float, default=1.0, help="per recipe, on average")
+    parser.add_argument("--favorites", type=float, default=1.0, help="per recipe, on average")
+    parser.add_argument("--pool", type=int, default=1500, help="distinct ingredient lines")
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="replace an existing file")
+    args = parser.parse_args()
+
+    n = args.recipes
+    path = os.path.abspath(args.db or os.path.join(ROOT, "instance", f"bench_{label(n)}.db"))
+    if os.path.exists(path):
+        if not args.force:
+            sys.exit(f"{path} exists; pass --force to replace it")
+        os.remove(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # the app reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    sys.path.insert(0, ROOT)
+    import app as appmod
+    from app import Comment, Favorite, Rating, Recipe, RecipeIngredient, User, db
+    from nutrition_calculator.nutrition_utils import match_ingredients
+
+    rng = random.Random(args.seed)
+    n_users = args.users or max(50, n // 20)
+    started = time.perf_counter()
+    appmod.create_app({"AUTO_CREATE_SCHEMA": True})
+
+    pool = ingredient_pool(rng, args.pool)
+    matched = match_ingredients(pool)
+    print(f"matched {len(pool)} ingredient lines in {time.perf_counter() - started:.1f}s")
+
+    with appmod.app.app_context():
+        # every user shares one hash; bcrypt per row would dominate seeding
+        u = User(username="bench0")
+        u.set_password("benchmark")
+        password_hash = u.password_hash
+        for lo, hi in chunks(n_users, args.batch):
+            db.session.execute(db.insert(User), [
+                {"id": i + 1, "username": f"bench{i}", "password_hash": password_hash}
+                for i in range(lo, hi)
+            ])
+        db.session.commit()
+
+        rating_id = comment_id = favorite_id = ingredient_id = 0
+        for lo, hi in chunks(n, args.batch):
+            recipes, ingredients, ratings, comments, favorites = [], [], [], [], []
+            for i in range(lo, hi):
+                recipe_id = i + 1
+                picks = rng.sample(range(len(pool)), rng.randint(4, 12))
+                totals = dict.fromkeys(appmod.NUTRIENTS, 0.0)
+                for position, p in enumerate(picks):
+                    ingredient_id += 1
+                    values = appmod.ingredient_row_values(position, matched[p])
+                    ingredients.append({"id": ingredient_id, "recipe_id": recipe_id, **values})
+                    for k in totals:
+                        totals[k] += values[k]
+
+                scores = [rng.randint(1, 5) for _ in range(min(n_users, int(rng.expovariate(1 / args.ratings))))]
+                raters = rng.sample(range(1, n_users + 1), len(scores))
+                for user_id, score in zip(raters, scores):
+                    rating_id += 1
+                    ratings.append({"id": rating_id, "score": score, "user_id": user_id, "recipe_id": recipe_id})
+                for _ in range(int(rng.expovariate(1 / args.comments))):
+                    comment_id += 1
+                    comments.append({"id": comment_id, "content": rng.choice(COMMENTS),
+                                     "user_id": rng.randint(1, n_users), "recipe_id": recipe_id})
+                fans = rng.sample(range(1, n_users + 1), min(n_users, int(rng.expovariate(1 / args.favorites))))
+                for user_id in fans:
+                    favorite_id += 1
+                    favorites.append({"id": favorite_id, "user_id": user_id, "recipe_id": recipe_id})
+
+                recipes.append({
+                    "id": recipe_id,
+                    "title": f"{rng.choice(ADJECTIVES)} {matched[picks[0]]['head']} "
+                             f"{rng.choice(DISHES)}".title(),
+                    "ingredients": ", ".join(pool[p] for p in picks),
+                    "instructions": " ".join(rng.sample(STEPS, 4)),
+                    "user_id": rng.randint(1, n_users),
+                    "rating_count": len(scores),
+                    "rating_sum": sum(scores),
+                    "rating_avg": sum(scores) / len(scores) if scores else None,
+                    "servings": rng.randint(1, 6),
+                    **{k: round(v, 2) for k, v in totals.items()},
+                })
+
+            for model, rows in ((Recipe, recipes), (RecipeIngredient, ingredients), (Rating, ratings),
+                                (Comment, comments), (Favorite, favorites)):
+                if rows:
+                    db.session.execute(db.insert(model), rows)
+            db.session.commit()
+            print(f"  {hi}/{n} recipes", end="\r", flush=True)
+
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+    print(f"\n{path}: {n} recipes, {n_users} users, {rating_id} ratings, {comment_id} comments, "
+          f"{favorite_id} favorites, {ingredient_id} ingredient rows "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
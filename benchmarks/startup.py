@@ -0,0 +1,52 @@
+"""
+Import time and RSS of nutrition_calculator.nutrition_utils, csv vs compact table.
+
+    python benchmarks/startup.py [--runs 5]
+
+Each sample runs in a fresh interpreter so nothing is already imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, time
+t = time.perf_counter()
+import nutrition_calculator.nutrition_utils as nu
+elapsed = time.perf_counter() - t
+nu.get_nutrition("onion")
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import_s": elapsed, "rss_mb": rss_kb / 1024, "source": nu.source_path}))
+"""
+
+
+def sample(source):
+    env = dict(os.environ, NUTRITION_SOURCE=source)
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'source':<8} {'import (ms)':>12} {'peak RSS (MB)':>14}")
+    for source in ("csv", "auto"):
+        runs = [sample(source) for _ in range(args.runs)]
+        label = "csv" if source == "csv" else "table"
+        imp = statistics.median(r["import_s"] for r in runs) * 1000
+        rss = statistics.median(r["rss_mb"] for r in runs)
+        print(f"{label:<8} {imp:>12.1f} {rss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,4 +9,75 @@ class Config:
     basedir = os.path.abspath(os.path.dirname(__file__))
     default_db = f"sqlite:///{os.path.join(basedir, 'instance', 'site.db')}"
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", default_db)
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite connections: write-ahead log (readers don't block the writer),
+    # fsync only at checkpoints, and wait this long for a lock instead of
+    # failing with "database is locked"
+    SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # Connection pool for server databases (Postgres, MySQL); per worker process
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    # Recycle connections older than this (seconds), before the server or a
+    # proxy drops them
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLALCHEMY_DATABASE_URI.startswith("sqlite") else {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    # Results per page on /search
+    SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+    # Rows per page on /recipes, /favorites and /my_recipes (?per_page= up to 100)
+    LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", "24"))
+    # Stream listing pages so the first bytes go out before all rows render
+    STREAM_LISTINGS = os.getenv("STREAM_LISTINGS", "0") == "1"
+    # Ratings a recipe needs before it appears on /recipes/top
+    TOP_RATED_MIN_RATINGS = int(os.getenv("TOP_RATED_MIN_RATINGS", "1"))
+    # Background threads that resize uploaded images
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+    # Browser cache lifetime for static files requested without a ?v= hash
+    STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+    # "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd) hands file bodies to
+    # the front proxy; empty serves them from Python
+    SENDFILE_MODE = os.getenv("SENDFILE_MODE", "")
+    # nginx `internal` location that aliases the project root for X-Accel-Redirect
+    SENDFILE_ACCEL_PREFIX = os.getenv("SENDFILE_ACCEL_PREFIX", "/_protected")
+    # Rendered recipe PDFs, keyed by recipe id + content version
+    PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(basedir, "instance", "pdf_cache"))
+    # Worker processes rendering PDFs in the background
+    PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))
+    # wkhtmltopdf binary for the pdfkit fallback (else looked up on PATH)
+    WKHTMLTOPDF_PATH = os.getenv("WKHTMLTOPDF_PATH")
+    # Rendered recipe fragments: "" for an in-process LRU of FRAGMENT_CACHE_SIZE
+    # entries (0 turns caching off), or a redis:// URL shared by all workers
+    FRAGMENT_CACHE_URL = os.getenv("FRAGMENT_CACHE_URL", "")
+    FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "2048"))
+    # Seconds a fragment may live in Redis (entries are versioned; this just bounds memory)
+    FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", "86400"))
+    # Create/upgrade the schema inside create_app() instead of a separate
+    # `flask schema upgrade` step (handy for a single-process dev server)
+    AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", "0") == "1"
+    # Load the nutrient table in create_app(); with `gunicorn --preload` that
+    # happens once in the master and workers share it
+    PRELOAD_NUTRITION = os.getenv("PRELOAD_NUTRITION", "1") == "1"
+    # Threads serving /api/nutrition lookups
+    NUTRITION_WORKERS = int(os.getenv("NUTRITION_WORKERS", "4"))
+    # Per-request timings (DB, templates, nutrition) as a Server-Timing header
+    # and Prometheus histograms at /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+    # If set, /metrics wants "Authorization: Bearer <token>"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    # Requests sending "X-Profile: <token>" are profiled (needs METRICS_ENABLED)
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    # Profile every request and keep those slower than this many ms (0 = off;
+    # profiling slows everything, so turn it on while chasing a problem)
+    PROFILE_SLOW_MS = int(os.getenv("PROFILE_SLOW_MS", "0"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(basedir, "instance", "profiles"))
+    # Neighbours shown in the "similar recipes" panel (0 hides it); rebuild
+    # them with `flask similar rebuild`
+    SIMILAR_RECIPES = int(os.getenv("SIMILAR_RECIPES", "6"))
+    SIMILAR_MODEL_PATH = os.getenv("SIMILAR_MODEL_PATH", os.path.join(basedir, "instance", "similar_recipes.joblib"))
+    # Recipes re-scored when one is added or edited (those sharing an ingredient)
+    SIMILAR_MAX_CANDIDATES = int(os.getenv("SIMILAR_MAX_CANDIDATES", "2000"))
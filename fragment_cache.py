@@ -0,0 +1,160 @@
+"""
+Rendered-HTML fragment cache.
+
+Shared parts of a page (a recipe's body, a listing card) are rendered once
+per recipe version and reused across users. The per-user bits (favorite
+toggle, forms carrying a CSRF token, owner buttons) are left as holes,
+`<!--hole:name-->`, and filled in on every request with `fill()`.
+
+Keys carry the recipe's `cache_version`, which the app bumps whenever a
+recipe, its ratings or its comments change. Stale entries are never read
+again and simply age out. That also makes the default in-process backend
+safe with several gunicorn workers: each worker may render a new version
+once, but none serves an old one.
+
+Backends implement get_many / set / delete / clear:
+  MemoryBackend   bounded LRU inside the process (default)
+  RedisBackend    any Redis-protocol server (Redis, Valkey, KeyDB...),
+                  shared by all workers; needs the `redis` package
+  NullBackend     caching off
+"""
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+
+def hole(name):
+    """Placeholder for per-request content inside a cached fragment."""
+    return Markup(f"<!--hole:{name}-->")
+
+
+def fill(html, holes):
+    """Replace the hole placeholders in `html` with rendered per-request content."""
+    for name, content in holes.items():
+        html = html.replace(f"<!--hole:{name}-->", str(content))
+    return Markup(html)
+
+
+class NullBackend:
+    def get_many(self, keys):
+        return {}
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """Thread-safe LRU of key -> str, bounded by entry count."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = max(1, int(maxsize))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                    found[key] = value
+        return found
+
+    def set(self, key, value, ttl=None):
+        # entries are versioned, so a TTL isn't needed for correctness here
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    def __init__(self, url, prefix="frag:"):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + k for k in keys])
+        return {k: v.decode("utf-8") for k, v in zip(keys, values) if v is not None}
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value.encode("utf-8"), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+def backend_from_config(url, size):
+    """'' or memory:// -> MemoryBackend(size), redis://... -> RedisBackend, size 0 -> off."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if int(size) <= 0:
+        return NullBackend()
+    return MemoryBackend(size)
+
+
+class FragmentCache:
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # request threads count concurrently; += isn't atomic
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name, recipe_id, version):
+        return f"{name}:{recipe_id}:{version}"
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = self.backend.get_many(keys)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def set(self, key, html):
+        self.backend.set(key, str(html), self.ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
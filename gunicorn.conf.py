@@ -0,0 +1,30 @@
+"""
+gunicorn settings, picked up automatically from the project root.
+
+    gunicorn 'app:create_app()'
+
+With preload_app the app (and, with PRELOAD_NUTRITION, the nutrient table
+and matcher) is loaded once in the master; forked workers share those pages
+copy-on-write instead of each paying the cold start.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # Everything loaded so far lives as long as the process. Move it out of
+    # the collector's reach so GC passes in the workers don't write to (and
+    # so un-share) those pages.
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # connections opened in the master (schema checks) must not be shared
+    from app import db, app
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,161 @@
+"""
+Content-addressed storage for uploaded recipe images.
+
+An upload is stored once as `<sha256[:32]>.<ext>` no matter how many
+times it is uploaded, then decoded once and re-encoded in the background
+into fixed-width WebP variants:
+
+    <hash>.<ext>          original bytes
+    <hash>_card.webp      480 px wide, listing cards
+    <hash>_detail.webp    1200 px wide, recipe page
+
+Templates call `image_attrs(url, variant)` to get src/srcset/sizes; until
+the variants exist (or for external URLs / legacy uploads) only the
+original is referenced. Pillow is optional: without it uploads are still
+deduplicated but no variants are made.
+"""
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from markupsafe import Markup, escape
+
+_pillow = None
+
+VARIANTS = {"card": 480, "detail": 1200}
+SIZES = {
+    "card": "(max-width: 576px) 100vw, (max-width: 992px) 33vw, 25vw",
+    "detail": "(max-width: 768px) 100vw, 66vw",
+}
+WEBP_QUALITY = 80
+FORMAT_EXT = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+_HASHED = re.compile(r"^(?P<hash>[0-9a-f]{32})\.(?P<ext>[a-z0-9]+)$")
+_executor = None
+_executor_lock = threading.Lock()
+_ready = set()  # hashes whose variants are known to exist
+_pending = set()  # hashes queued for resizing
+
+
+def _pool(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-resize")
+        return _executor
+
+
+def _pil():
+    """(Image, ImageOps) or None without Pillow; imported on first use, it's slow to import."""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, ImageOps
+            _pillow = (Image, ImageOps)
+        except ImportError:  # pragma: no cover - Pillow not installed
+            _pillow = ()
+    return _pillow or None
+
+
+def _ext_for(data, filename):
+    pil = _pil()
+    if pil is not None:
+        Image = pil[0]
+        try:
+            from io import BytesIO
+            with Image.open(BytesIO(data)) as im:
+                fmt = FORMAT_EXT.get(im.format)
+                if fmt:
+                    return fmt
+        except Exception:
+            pass
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return {"jpeg": "jpg"}.get(ext, ext) or "bin"
+
+
+def variant_path(upload_dir, digest, variant):
+    return os.path.join(upload_dir, f"{digest}_{variant}.webp")
+
+
+def make_variants(upload_dir, filename):
+    """Decode `filename` once and write every missing variant. Returns True on success."""
+    m = _HASHED.match(filename)
+    pil = _pil()
+    if pil is None or not m:
+        return False
+    Image, ImageOps = pil
+    digest = m.group("hash")
+    targets = {v: variant_path(upload_dir, digest, v) for v in VARIANTS}
+    if all(os.path.exists(p) for p in targets.values()):
+        _ready.add(digest)
+        return True
+    try:
+        with Image.open(os.path.join(upload_dir, filename)) as im:
+            im = ImageOps.exif_transpose(im)
+            im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+            # largest first, each smaller variant resized from the previous one
+            source = im
+            for variant, width in sorted(VARIANTS.items(), key=lambda kv: -kv[1]):
+                if source.width > width:
+                    height = round(source.height * width / source.width)
+                    source = source.resize((width, height), Image.LANCZOS)
+                tmp = f"{targets[variant]}.{os.getpid()}.{threading.get_ident()}.tmp"
+                source.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                os.replace(tmp, targets[variant])
+    except Exception:
+        return False
+    finally:
+        _pending.discard(digest)
+    _ready.add(digest)
+    return True
+
+
+def store_upload(file_storage, upload_dir, workers=2, background=True):
+    """
+    Save a werkzeug FileStorage under its content hash and queue variant
+    generation (unless `background` is False, in which case the caller runs
+    make_variants). Returns the stored file name (relative to `upload_dir`).
+    """
+    data = file_storage.read()
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    filename = f"{digest}.{_ext_for(data, file_storage.filename)}"
+    dest = os.path.join(upload_dir, filename)
+    if not os.path.exists(dest):
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+    if background and _pil() is not None and digest not in _ready and digest not in _pending:
+        _pending.add(digest)
+        _pool(workers).submit(make_variants, upload_dir, filename)
+    return filename
+
+
+def is_stored_upload(url, upload_url_prefix):
+    """True for URLs of content-addressed uploads (the ones that get variants)."""
+    return bool(url) and url.startswith(upload_url_prefix) \
+        and _HASHED.match(url[len(upload_url_prefix):]) is not None
+
+
+def image_attrs(url, variant, upload_dir, upload_url_prefix):
+    """src / srcset / sizes attributes for an <img> showing `url`."""
+    if not url:
+        return Markup("")
+    attrs = f'src="{escape(url)}"'
+    if url.startswith(upload_url_prefix):
+        filename = url[len(upload_url_prefix):]
+        m = _HASHED.match(filename)
+        if m:
+            digest = m.group("hash")
+            if digest not in _ready and all(
+                os.path.exists(variant_path(upload_dir, digest, v)) for v in VARIANTS
+            ):
+                _ready.add(digest)
+            if digest in _ready:
+                prefix = url[: -len(filename)]
+                srcset = ", ".join(f"{prefix}{digest}_{v}.webp {w}w" for v, w in VARIANTS.items())
+                attrs = (f'src="{escape(prefix)}{digest}_{variant}.webp" '
+                         f'srcset="{escape(srcset)}" sizes="{SIZES[variant]}"')
+    return Markup(attrs)
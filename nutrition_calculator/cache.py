@@ -0,0 +1,73 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for an ingredient string: lower-case, single-spaced."""
+    return re.sub(r"\s+", " ", (query or "").strip().lower())
+
+
+class NutritionCache:
+    """
+    Bounded LRU mapping of normalised ingredient query -> nutrient tuple.
+
+    Thread-safe (gunicorn threads / dev server). Tracks hits, misses and
+    evictions so the size bound can be tuned from `/nutrition/cache_stats`.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = max(0, int(maxsize))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def file_signature(path):
+    """(mtime_ns, size) of `path`; changes whenever the file is rewritten."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
@@ -0,0 +1,105 @@
+import difflib
+from collections import defaultdict
+
+from rapidfuzz import fuzz, process
+
+
+def _trigrams(text: str):
+    """Character trigrams of `text`, padded so short words still get some."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientMatcher:
+    """
+    Prebuilt index over the INDB food names.
+
+    Lookup order:
+      1. exact name -> row position (dict)
+      2. trigram inverted index to shortlist candidate rows
+      3. RapidFuzz over the shortlist, then difflib on the survivors
+      4. a vectorised RapidFuzz pass over every name, cut off at the best
+         shortlisted score, with difflib on whatever survives it
+    Sharing more trigrams doesn't guarantee a higher difflib ratio, so step
+    3 alone can miss the best row; step 4 catches it while step 3's score
+    keeps the survivors few. The result is the row
+    `difflib.get_close_matches(query, names, n=1, cutoff=0.6)` returns.
+    """
+
+    def __init__(self, names, cutoff: float = 0.6, shortlist_size: int = 50):
+        self.names = [str(n) for n in names]
+        self.cutoff = cutoff
+        self.shortlist_size = shortlist_size
+
+        # first occurrence wins, same as df[df.food_name == name].iloc[0]
+        self.exact = {}
+        for pos, name in enumerate(self.names):
+            self.exact.setdefault(name, pos)
+
+        self.index = defaultdict(list)
+        for pos, name in enumerate(self.names):
+            for gram in _trigrams(name):
+                self.index[gram].append(pos)
+
+    def _shortlist(self, query: str):
+        counts = defaultdict(int)
+        for gram in _trigrams(query):
+            for pos in self.index.get(gram, ()):
+                counts[pos] += 1
+        if not counts:
+            return []
+        # ties broken by row position so every process picks the same rows
+        ranked = sorted(counts, key=lambda pos: (-counts[pos], pos))
+        return ranked[: self.shortlist_size]
+
+    def _best(self, query: str, choices, best=None):
+        """
+        (row, difflib ratio) of the best match among `choices` (a list of
+        names or a {row: name} dict), or `best` if none beats it; None if
+        nothing passes the cutoff.
+        """
+        if not choices:
+            return best
+        # Indel ratio is an upper bound of SequenceMatcher.ratio(), so
+        # anything under the cutoff (or under `best`) here can't pass
+        # difflib either. The epsilon keeps float noise from dropping ties.
+        floor = best[1] if best else self.cutoff
+        scored = process.extract(
+            query, choices, scorer=fuzz.ratio,
+            score_cutoff=floor * 100 - 1e-6, limit=None,
+        )
+        if best is not None:
+            best = ((best[1], self.names[best[0]]), best[0])
+        s = difflib.SequenceMatcher()
+        s.set_seq2(query)
+        for name, _, pos in scored:
+            s.set_seq1(name)
+            ratio = s.ratio()
+            if ratio < self.cutoff:
+                continue
+            # ties resolved like get_close_matches: (score, name) descending
+            key = (ratio, name)
+            if best is None or key > best[0]:
+                best = (key, pos)
+        return (best[1], best[0][0]) if best else None
+
+    def match(self, query: str):
+        """Return the integer row position of the best match, or None."""
+        return self.match_scored(query)[0]
+
+    def match_scored(self, query: str):
+        """(row position, similarity 0..1) of the best match; (None, 0.0) if none."""
+        if not query:
+            return None, 0.0
+        pos = self.exact.get(query)
+        if pos is not None:
+            return pos, 1.0
+
+        shortlist = self._shortlist(query)
+        found = self._best(query, {pos: self.names[pos] for pos in shortlist})
+        found = self._best(query, self.names, found)
+        if found is None:
+            return None, 0.0
+        pos, score = found
+        # duplicate names: always hand back the first row with that name
+        return self.exact[self.names[pos]], score
@@ -1,6 +1,16 @@
 import os
-import pandas as pd
-import difflib
+import re
+import time
+import threading
+import warnings
+from functools import wraps
+
+from nutrition_calculator.matcher import IngredientMatcher
+from nutrition_calculator.portions import PortionTable
+from nutrition_calculator.cache import NutritionCache, normalize_query, file_signature
+from nutrition_calculator.table import (
+    NUTRIENT_COLUMNS, read_table, table_from_csv, csv_digest,
+)
 
 # === Locate dataset ===
 # Works with either ./dataset/indb_clean.csv or ./dataset/indb.csv
@@ -9,123 +19,285 @@ DATASET_DIR = os.path.join(BASE_DIR, "dataset")
 
 clean_path = os.path.join(DATASET_DIR, "indb_clean.csv")
 raw_path = os.path.join(DATASET_DIR, "indb.csv")
+# Precompiled by `python -m nutrition_calculator.table`
+table_path = os.getenv("NUTRITION_TABLE_PATH", os.path.join(DATASET_DIR, "indb_table.bin"))
 
 if os.path.exists(clean_path):
     dataset_path = clean_path
 elif os.path.exists(raw_path):
     dataset_path = raw_path
+elif os.path.exists(table_path):
+    dataset_path = None
 else:
     raise FileNotFoundError("❌ No dataset found — please place indb.csv in the dataset folder.")
 
-# === Load and Clean Dataset ===
-df = pd.read_csv(dataset_path)
-df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-df.fillna(0, inplace=True)
-
-# Keep only relevant nutrient columns
-keep_cols = [
-    "food_name",
-    "unit_serving_energy_kcal",
-    "unit_serving_carb_g",
-    "unit_serving_protein_g",
-    "unit_serving_fat_g",
-    "unit_serving_fibre_g"
-]
-df = df[[c for c in keep_cols if c in df.columns]].copy()
-
-# Rename to app-standard names
-rename_map = {
-    "unit_serving_energy_kcal": "calories",
-    "unit_serving_carb_g": "carbs",
-    "unit_serving_protein_g": "proteins",
-    "unit_serving_fat_g": "fats",
-    "unit_serving_fibre_g": "fibers"
-}
-df.rename(columns=rename_map, inplace=True)
-
-# Normalize
-df["food_name"] = df["food_name"].astype(str).str.lower()
-df = df.fillna(0)
-
-# Clamp unrealistic per-serving values
-df["calories"] = df.get("calories", 0).clip(0, 800)
-df["proteins"] = df.get("proteins", 0).clip(0, 80)
-df["fats"] = df.get("fats", 0).clip(0, 100)
-df["carbs"] = df.get("carbs", 0).clip(0, 120)
-df["fibers"] = df.get("fibers", 0).clip(0, 25)
-
-major_nutrients = ["calories", "proteins", "fats", "carbs", "fibers"]
+# "auto" prefers the compact table, "csv" forces the pandas path
+NUTRITION_SOURCE = os.getenv("NUTRITION_SOURCE", "auto")
+
+major_nutrients = list(NUTRIENT_COLUMNS)
+
+
+def _open_table():
+    """Return (table, path it was loaded from)."""
+    if NUTRITION_SOURCE != "csv" and os.path.exists(table_path):
+        table = read_table(table_path)
+        if dataset_path is None or table.source_sha256 == csv_digest(dataset_path):
+            return table, table_path
+        warnings.warn(
+            f"{os.path.basename(table_path)} is stale; rebuild it with "
+            "`python -m nutrition_calculator.table`. Falling back to the csv."
+        )
+    return table_from_csv(dataset_path), dataset_path
+
+
+def _signature():
+    # either file changing means the loaded table may no longer be right
+    return (file_signature(table_path),
+            file_signature(dataset_path) if dataset_path else None)
+
+
+def _build():
+    """(Re)load the nutrient table and the prebuilt lookup structures."""
+    global nutrient_matrix, matcher, source_path, dataset_signature
+    table, source_path = _open_table()
+    dataset_signature = _signature()
+    nutrient_matrix = table.matrix
+    matcher = IngredientMatcher(table.names, cutoff=0.6)
+
+
+_build()
+
+# === Resolved-ingredient cache ===
+# Size is tunable via NUTRITION_CACHE_SIZE (0 disables caching).
+nutrition_cache = NutritionCache(int(os.getenv("NUTRITION_CACHE_SIZE", "2048")))
+
+# How often (seconds) to stat the dataset file for changes
+DATASET_CHECK_INTERVAL = float(os.getenv("NUTRITION_DATASET_CHECK_INTERVAL", "5"))
+_last_check = time.monotonic()
+_reload_lock = threading.Lock()
+
+
+def reload_if_changed(force=False):
+    """Rebuild tables and drop cached results if the dataset file changed."""
+    global _last_check
+    now = time.monotonic()
+    if not force and now - _last_check < DATASET_CHECK_INTERVAL:
+        return False
+    with _reload_lock:
+        _last_check = now
+        if not force and _signature() == dataset_signature:
+            return False
+        _build()
+        nutrition_cache.clear()
+        return True
+
+
+def cache_stats():
+    stats = nutrition_cache.stats()
+    stats["dataset"] = os.path.basename(source_path)
+    return stats
+
+
+# Portion weights: default serving, grams per cup and per piece for each
+# food, used with the quantity parsed out of the ingredient text
+portions_path = os.getenv("NUTRITION_PORTIONS_PATH", os.path.join(DATASET_DIR, "portions.csv"))
+portions = PortionTable.from_csv(portions_path)
+
+# Called with the seconds spent in each matching call below; the app uses
+# it for per-request timings. None (the default) costs nothing.
+timing_observer = None
+
+
+def _timed(fn):
+    @wraps(fn)
+    def wrapped(*args, **kwargs):
+        observer = timing_observer
+        if observer is None:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            observer(time.perf_counter() - started)
+    return wrapped
+
+
+# Above this many (recipe x ingredient) cells use a sparse scale matrix
+DENSE_BATCH_LIMIT = 200_000
 
 
 # === Core Functions ===
+def _resolve(food_query: str):
+    """
+    (matched food_name or None, nutrient tuple per 100 g, match score 0..1)
+    for a normalised query (cached). A blank query matches nothing.
+    """
+    if not food_query:
+        return None, (0.0,) * len(major_nutrients), 0.0
+    reload_if_changed()
+    cached = nutrition_cache.get(food_query)
+    if cached is not None:
+        return cached
+
+    # Exact / trigram-shortlisted fuzzy match with tolerance
+    pos, score = matcher.match_scored(food_query)
+    if pos is None:
+        resolved = (None, (0.0,) * len(major_nutrients), 0.0)
+    else:
+        resolved = (matcher.names[pos], tuple(float(v) for v in nutrient_matrix[pos]), score)
+
+    nutrition_cache.put(food_query, resolved)
+    return resolved
+
+
+def parse_ingredient(ingredient: str):
+    """
+    (food key, grams) for an ingredient line: "Rice- 1 Cup" -> ("rice", 185.0).
+    The key is what the INDB match is made on, with the quantity removed;
+    it is "" for a blank line.
+    """
+    text = normalize_query(ingredient)
+    if not text:
+        return "", 0.0
+    name, grams = portions.parse(text)
+    return normalize_query(name), float(grams)
+
+
+@_timed
 def get_nutrition(food_query: str):
     """Return nutrition data for one ingredient (per serving)."""
     if not food_query or not isinstance(food_query, str):
         return {k: 0.0 for k in major_nutrients}
 
-    food_query = food_query.strip().lower()
+    food_query = normalize_query(food_query)
     if not food_query:
         return {k: 0.0 for k in major_nutrients}
 
-    # Fuzzy match with tolerance
-    food_names = df["food_name"].tolist()
-    matches = difflib.get_close_matches(food_query, food_names, n=1, cutoff=0.6)
+    return dict(zip(major_nutrients, _resolve(food_query)[1]))
 
-    if not matches:
-        return {k: 0.0 for k in major_nutrients}
 
-    row = df[df["food_name"] == matches[0]].iloc[0]
-    return {k: float(row[k]) if k in row else 0.0 for k in major_nutrients}
+@_timed
+def match_ingredients(ingredients_list):
+    """
+    Per-ingredient match details, skipping blanks:
+    [{"raw", "name", "head", "food_name", "score", "portion_g", "nutrients"}],
+    where `name` is the normalised ingredient without its quantity
+    ("rice- 1 cup" -> "rice"), `head` its last word
+    ("basmati rice" -> "rice"), `food_name` the matched INDB row (or None)
+    with its similarity `score`, and `nutrients` the ingredient's unrounded
+    contribution at `portion_g`.
+    """
+    matches = []
+    for ingredient in ingredients_list:
+        text = normalize_query(ingredient)
+        if not text:
+            continue
+        key, portion = parse_ingredient(text)
+        name = key or text
+        words = re.findall(r"[^\W\d_]+", re.sub(r"\(.*?\)", " ", name))
+        food_name, values, score = _resolve(key)
+        matches.append({
+            "raw": ingredient.strip(),
+            "name": name,
+            "head": words[-1] if words else name,
+            "food_name": food_name,
+            "score": score,
+            "portion_g": portion,
+            "nutrients": {k: v * portion / 100.0 for k, v in zip(major_nutrients, values)},
+        })
+    return matches
 
 
-def calculate_recipe_nutrition(ingredients_list):
+@_timed
+def ingredient_nutrition(ingredient: str):
     """
-    Calculate total nutrition for a list of ingredients.
-    Adjusts nutrients based on realistic serving weights.
+    One ingredient's contribution to a recipe: {"ingredient", "food_name",
+    "score", "portion_g", "nutrients"}, nutrients scaled to the portion
+    (unrounded, so totals add up exactly like calculate_recipe_nutrition).
+    None if blank.
     """
-
-    # Average realistic portion weights (grams)
-    portion_weights = {
-        "poha": 80,
-        "rice": 100,
-        "bread": 30,              # per slice
-        "butter": 5,              # per tsp
-        "chutney": 15,            # per tbsp
-        "cucumber": 50,
-        "tomato": 50,
-        "onion": 40,
-        "capsicum": 40,
-        "potato": 60,
-        "oil": 5,                 # per tsp
-        "peas": 50,
-        "carrot": 50,
-        "lemon": 10,
-        "peanuts": 15,
-        "egg": 50,
-        "milk": 100,
-        "sugar": 5,
+    if not normalize_query(ingredient):
+        return None
+    key, portion = parse_ingredient(ingredient)
+    food_name, values, score = _resolve(key)
+    return {
+        "ingredient": ingredient.strip(),
+        "food_name": food_name,
+        "score": score,
+        "portion_g": portion,
+        "nutrients": {k: v * portion / 100.0 for k, v in zip(major_nutrients, values)},
     }
 
-    totals = {k: 0.0 for k in major_nutrients}
 
-    for ingredient in ingredients_list:
-        if not ingredient.strip():
-            continue
+def portion_for(ingredient: str):
+    """Portion weight in grams for an ingredient string, quantity included."""
+    return parse_ingredient(ingredient)[1]
 
-        nutrition = get_nutrition(ingredient)
-        if not nutrition:
-            continue
 
-        # Find a portion weight if available
-        portion = 100  # default: 100 g
-        for key in portion_weights:
-            if key in ingredient.lower():
-                portion = portion_weights[key]
-                break
+@_timed
+def calculate_recipes_nutrition_batch(ingredient_lists):
+    """
+    Calculate total nutrition for many recipes at once.
+
+    Every distinct ingredient across the batch is resolved once; totals are
+    the (recipe x ingredient) scale matrix times the (ingredient x nutrient)
+    matrix. Returns one dict per input list, in order.
+    """
+    import numpy as np
+
+    columns = {}         # raw ingredient string -> column (None = blank)
+    unique = {}          # normalised ingredient -> column (quantity matters)
+    vectors = []         # nutrient tuple per column
+    scales = []          # portion / 100 per column
+    rows, cols = [], []
+
+    for r, ingredients in enumerate(ingredient_lists):
+        for ingredient in ingredients:
+            try:
+                col = columns[ingredient]
+            except KeyError:
+                key = normalize_query(ingredient)
+                if not key:
+                    col = None
+                elif key in unique:
+                    col = unique[key]
+                else:
+                    col = unique[key] = len(vectors)
+                    food_key, grams = parse_ingredient(key)
+                    vectors.append(_resolve(food_key)[1])
+                    # Scale nutrients relative to 100 g
+                    scales.append(grams / 100.0)
+                columns[ingredient] = col
+            if col is not None:
+                rows.append(r)
+                cols.append(col)
 
-        # Scale nutrients relative to 100 g
-        scale = portion / 100.0
-        for k in major_nutrients:
-            totals[k] += nutrition.get(k, 0.0) * scale
+    n_recipes = len(ingredient_lists)
+    if not vectors:
+        return [{k: 0.0 for k in major_nutrients} for _ in range(n_recipes)]
 
-    return {k: round(v, 2) for k, v in totals.items()}
+    nutrients = np.asarray(vectors, dtype=float)
+    weights = np.asarray(scales, dtype=float)[cols]
+    if n_recipes * len(vectors) <= DENSE_BATCH_LIMIT:
+        flat = np.asarray(rows) * len(vectors) + np.asarray(cols)
+        scale = np.bincount(flat, weights, minlength=n_recipes * len(vectors))
+        totals = scale.reshape(n_recipes, len(vectors)) @ nutrients
+    else:
+        from scipy.sparse import csr_matrix
+        # duplicate (row, col) pairs are summed on construction
+        scale = csr_matrix((weights, (rows, cols)), shape=(n_recipes, len(vectors)))
+        totals = np.asarray(scale @ nutrients)
+
+    return [
+        {k: round(v, 2) for k, v in zip(major_nutrients, row)}
+        for row in totals.tolist()
+    ]
+
+
+def calculate_recipe_nutrition(ingredients_list):
+    """
+    Calculate total nutrition for a list of ingredients.
+    Scales nutrients to the quantity given ("2 tbsp oil"), or a realistic
+    serving weight when there is none.
+    """
+    return calculate_recipes_nutrition_batch([ingredients_list])[0]
@@ -0,0 +1,224 @@
+"""
+How many grams an ingredient line stands for.
+
+    "2 tbsp oil"            2 x 15 ml, at oil's density
+    "200g paneer"           200 g
+    "1/2 cup milk"          120 ml, at milk's density
+    "Milk – 2 Cups"         quantity after the name works too
+    "3 onions"              3 x one onion
+    "butter"                no quantity: butter's usual serving
+
+The quantity and unit are parsed out of the text; what remains is the
+ingredient name. Densities (grams per cup), piece weights and default
+servings come from a data file (dataset/portions.csv). Names are found with
+a token trie: the longest run of whole words that is an entry wins (ties
+go to the rightmost run, since the head noun comes last in "rice flour").
+This costs the same per ingredient however big the table gets, and
+"buttermilk" never matches "butter".
+"""
+import csv
+import re
+from fractions import Fraction
+
+DEFAULT_SERVING_G = 100.0
+
+# unit -> (kind, factor); mass in grams, volume in millilitres
+UNITS = {}
+for _names, _kind, _factor in [
+    (("g", "gm", "gms", "gr", "gram", "grams", "gramme", "grammes"), "mass", 1.0),
+    (("kg", "kgs", "kilo", "kilos", "kilogram", "kilograms"), "mass", 1000.0),
+    (("mg",), "mass", 0.001),
+    (("oz", "ounce", "ounces"), "mass", 28.35),
+    (("lb", "lbs", "pound", "pounds"), "mass", 453.6),
+    (("pinch", "pinches"), "mass", 0.5),
+    (("dash", "dashes"), "mass", 0.6),
+    (("handful", "handfuls"), "mass", 30.0),
+    (("ml", "milliliter", "milliliters", "millilitre", "millilitres"), "volume", 1.0),
+    (("l", "ltr", "liter", "liters", "litre", "litres"), "volume", 1000.0),
+    (("tsp", "tsps", "teaspoon", "teaspoons"), "volume", 5.0),
+    (("tbsp", "tbsps", "tbs", "tbl", "tablespoon", "tablespoons"), "volume", 15.0),
+    (("cup", "cups"), "volume", 240.0),
+    (("glass", "glasses"), "volume", 250.0),
+    (("piece", "pieces", "pc", "pcs", "no", "nos", "whole", "slice", "slices",
+      "clove", "cloves", "pod", "pods", "stick", "sticks", "inch", "inches",
+      "leaf", "leaves", "sprig", "sprigs", "strand", "strands",
+      "small", "medium", "large", "big"), "count", 1.0),
+]:
+    for _name in _names:
+        UNITS[_name] = (_kind, _factor)
+
+_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4",
+              "⅕": "1/5", "⅛": "1/8", "⅜": "3/8"}
+_NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?"
+_QUANTITY = re.compile(
+    rf"(?<![\w.])(?P<amount>{_NUMBER})"
+    rf"(?:\s*(?:-|–|to)\s*(?P<upper>{_NUMBER}))?"
+    r"(?:\s*(?P<unit>[a-z]+)\b\.?)?"
+)
+_WORD = re.compile(r"[a-z]+")
+_PARENS = re.compile(r"\(.*?\)")
+_PUNCT = re.compile(r"[\-–—:;,.()\[\]]+")
+
+
+def _number(text):
+    return float(sum(Fraction(part) for part in text.split()))
+
+
+_IRREGULAR = {"leaves": "leaf", "halves": "half", "loaves": "loaf"}
+
+
+def _stem(token):
+    # crude singular so "tomatoes"/"tomato", "chillies"/"chilli" meet
+    token = _IRREGULAR.get(token, token)
+    if len(token) > 3:
+        if token.endswith("ies"):
+            token = token[:-3] + "i"
+        elif token.endswith("oes"):
+            token = token[:-2]
+        elif token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+    if token.endswith("y") and len(token) > 2:
+        token = token[:-1] + "i"
+    return token
+
+
+def tokens(text):
+    return [_stem(t) for t in _WORD.findall(text.lower())]
+
+
+def parse_quantity(text):
+    """
+    (amount or None, unit or None, name) for an ingredient line. A range
+    like "3-4" is read as its midpoint; words after the number that aren't
+    units stay in the name ("3 onions" -> 3, None, "onions").
+    """
+    text = (text or "").lower()
+    for char, frac in _FRACTIONS.items():
+        text = text.replace(char, f" {frac} ")
+    # "1 1/2" written as "1 ½" became "1  1/2": normalise the gap
+    text = re.sub(r"\s+", " ", text)
+
+    amount = unit = None
+    m = _QUANTITY.search(text)
+    if m:
+        amount = _number(m.group("amount"))
+        if m.group("upper"):
+            amount = (amount + _number(m.group("upper"))) / 2
+        unit = m.group("unit")
+        end = m.end()
+        if unit not in UNITS:
+            # not a unit: it belongs to the name ("3 onions")
+            unit = None
+            end = m.end("upper") if m.group("upper") else m.end("amount")
+        text = text[:m.start()] + " " + text[end:]
+
+    # asides like "(chopped)" or "(cottage cheese)" only get in the way,
+    # unless they're all there is
+    name = _PARENS.sub(" ", text) if tokens(_PARENS.sub(" ", text)) else text
+    name = _PUNCT.sub(" ", name)
+    name = re.sub(r"^\s*of\s+", " ", name)
+    return amount, unit, re.sub(r"\s+", " ", name).strip()
+
+
+# words that can trail a bare quantity ("1 (chopped)", "1 cup (cooked)")
+_QUANTITY_WORDS = {"chopped", "sliced", "diced", "cubed", "grated", "shredded", "minced",
+                   "crushed", "finely", "roughly", "fresh", "cooked", "boiled", "soaked",
+                   "peeled", "heaped", "level", "optional", "to", "taste"}
+
+
+def is_quantity_only(text):
+    """True for fragments like "1 cup" or "3 medium (chopped)" that name no ingredient."""
+    amount, unit, name = parse_quantity(text)
+    return amount is not None and set(tokens(name)) <= _QUANTITY_WORDS
+
+
+def join_quantities(items):
+    """
+    Fold quantity-only items into the item before them, for lists written
+    as "Rice, 1 cup, Salt, 2 tsp" -> ["Rice 1 cup", "Salt 2 tsp"]. Only an
+    item without a quantity of its own takes one ("1 bay leaf, 3 cloves"
+    stays as it is).
+    """
+    joined = []
+    for item in items:
+        if (joined and joined[-1] and is_quantity_only(item)
+                and parse_quantity(joined[-1])[0] is None):
+            joined[-1] = f"{joined[-1]} {item}"
+        else:
+            joined.append(item)
+    return joined
+
+
+class PortionEntry:
+    __slots__ = ("name", "serving_g", "cup_g", "piece_g")
+
+    def __init__(self, name, serving_g=None, cup_g=None, piece_g=None):
+        self.name = name
+        self.serving_g = DEFAULT_SERVING_G if serving_g is None else serving_g
+        self.cup_g = cup_g
+        self.piece_g = piece_g
+
+
+class PortionTable:
+    def __init__(self, entries=()):
+        self._root = {}
+        self.size = 0
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Rows of name, serving_g, cup_g, piece_g (the last two may be blank)."""
+        def num(value):
+            return float(value) if value not in (None, "") else None
+
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [r for r in csv.DictReader(f) if r.get("name") and not r["name"].startswith("#")]
+        return cls(PortionEntry(r["name"].strip(), num(r["serving_g"]), num(r.get("cup_g")),
+                                num(r.get("piece_g")))
+                   for r in rows)
+
+    def add(self, entry):
+        node = self._root
+        for token in tokens(entry.name):
+            node = node.setdefault(token, {})
+        if None not in node:
+            self.size += 1
+        node[None] = entry  # None key marks "an entry ends here"
+
+    def lookup(self, name):
+        """Entry for the longest (then rightmost) whole-word run of `name`, or None."""
+        words = tokens(name)
+        best, best_key = None, None
+        for start in range(len(words)):
+            node = self._root
+            for end in range(start, len(words)):
+                node = node.get(words[end])
+                if node is None:
+                    break
+                if None in node:
+                    key = (end - start, start)
+                    if best_key is None or key > best_key:
+                        best, best_key = node[None], key
+        return best
+
+    def grams(self, text):
+        """Grams for an ingredient line; see the module docstring."""
+        return self.parse(text)[1]
+
+    def parse(self, text):
+        """(name without the quantity, grams) for an ingredient line."""
+        amount, unit, name = parse_quantity(text)
+        entry = self.lookup(name)
+        if entry is None and UNITS.get(unit, ("",))[0] == "count":
+            entry = self.lookup(unit)  # "3 cloves", "2 sticks" of cinnamon...
+        serving = entry.serving_g if entry else DEFAULT_SERVING_G
+        if amount is None:
+            return name, serving
+        kind, factor = UNITS.get(unit, ("count", 1.0))
+        if kind == "mass":
+            return name, amount * factor
+        if kind == "volume":
+            grams_per_ml = entry.cup_g / 240.0 if entry and entry.cup_g else 1.0
+            return name, amount * factor * grams_per_ml
+        return name, amount * (entry.piece_g if entry and entry.piece_g else serving)
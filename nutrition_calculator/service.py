@@ -0,0 +1,51 @@
+"""
+Thread-pool nutrition lookups with request coalescing.
+
+The add-recipe form asks for nutrition as the user types, so the same
+ingredient strings arrive many times at once. `NutritionService.submit()`
+hands out one shared Future per normalised ingredient while a lookup is in
+flight ("single flight"); later callers just wait on it. Results are then
+kept by the resolved-ingredient LRU in nutrition_utils.
+
+Futures are concurrent.futures ones, so they work from plain threads and,
+via asyncio.wrap_future, from async views running on any event loop.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from nutrition_calculator.cache import normalize_query
+
+
+class NutritionService:
+    def __init__(self, workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nutrition")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+
+    def submit(self, ingredient: str):
+        """Future for nutrition_utils.ingredient_nutrition(ingredient), shared with identical in-flight calls."""
+        from nutrition_calculator.nutrition_utils import ingredient_nutrition
+
+        key = normalize_query(ingredient)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._executor.submit(ingredient_nutrition, key)
+            self._inflight[key] = future
+            self.submitted += 1
+        future.add_done_callback(lambda _f: self._forget(key, _f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {"submitted": self.submitted, "coalesced": self.coalesced,
+                    "in_flight": len(self._inflight)}
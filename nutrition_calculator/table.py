@@ -0,0 +1,169 @@
+"""
+Compact on-disk nutrient table.
+
+Build (needs pandas, run whenever the INDB csv changes):
+
+    python -m nutrition_calculator.table
+
+Layout of the artifact (little-endian):
+
+    8 bytes   magic b"INDBTBL1"
+    4 bytes   uint32 header length H
+    H bytes   JSON header: rows, columns, names_bytes, data_offset, source_sha256
+    ...       food names, utf-8, newline separated
+    ...       zero padding up to data_offset (16-byte aligned)
+    ...       float32 matrix, rows x columns, C order
+
+At runtime the matrix is memory-mapped, so forked workers share the pages
+and pandas is never imported.
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"INDBTBL1"
+NUTRIENT_COLUMNS = ["calories", "proteins", "fats", "carbs", "fibers"]
+
+# Clamp unrealistic per-serving values
+CLAMPS = {
+    "calories": (0, 800),
+    "proteins": (0, 80),
+    "fats": (0, 100),
+    "carbs": (0, 120),
+    "fibers": (0, 25),
+}
+
+
+def csv_digest(path):
+    """sha256 of the csv with line endings normalised (git autocrlf safe)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return hashlib.sha256(data.replace(b"\r\n", b"\n")).hexdigest()
+
+
+# === Build step (pandas only needed here) ===
+def load_dataset(path):
+    """Read the INDB csv and return the cleaned 6-column DataFrame."""
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+    df.fillna(0, inplace=True)
+
+    # Keep only relevant nutrient columns
+    keep_cols = [
+        "food_name",
+        "unit_serving_energy_kcal",
+        "unit_serving_carb_g",
+        "unit_serving_protein_g",
+        "unit_serving_fat_g",
+        "unit_serving_fibre_g"
+    ]
+    df = df[[c for c in keep_cols if c in df.columns]].copy()
+
+    # Rename to app-standard names
+    rename_map = {
+        "unit_serving_energy_kcal": "calories",
+        "unit_serving_carb_g": "carbs",
+        "unit_serving_protein_g": "proteins",
+        "unit_serving_fat_g": "fats",
+        "unit_serving_fibre_g": "fibers"
+    }
+    df.rename(columns=rename_map, inplace=True)
+
+    # Normalize
+    df["food_name"] = df["food_name"].astype(str).str.lower()
+    df = df.fillna(0)
+
+    for col, (lo, hi) in CLAMPS.items():
+        df[col] = df.get(col, 0).clip(lo, hi)
+    return df
+
+
+def build_table(csv_path, out_path):
+    """Write the compact artifact for `csv_path` to `out_path`."""
+    df = load_dataset(csv_path)
+    names = [n.replace("\n", " ") for n in df["food_name"].tolist()]
+    matrix = np.ascontiguousarray(df[NUTRIENT_COLUMNS].to_numpy(dtype="<f4"))
+    write_table(out_path, names, matrix, csv_digest(csv_path))
+    return len(names)
+
+
+def write_table(out_path, names, matrix, source_sha256=""):
+    names_blob = "\n".join(names).encode("utf-8")
+
+    def header(data_offset):
+        return json.dumps({
+            "rows": len(names),
+            "columns": NUTRIENT_COLUMNS,
+            "names_bytes": len(names_blob),
+            "data_offset": data_offset,
+            "source_sha256": source_sha256,
+        }).encode("utf-8")
+
+    # data_offset appears in the header itself, so settle it iteratively
+    data_offset = 0
+    while True:
+        prefix = len(MAGIC) + 4 + len(header(data_offset)) + len(names_blob)
+        aligned = (prefix + 15) // 16 * 16
+        if aligned == data_offset:
+            break
+        data_offset = aligned
+    head = header(data_offset)
+
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(head)))
+        f.write(head)
+        f.write(names_blob)
+        f.write(b"\0" * (data_offset - f.tell()))
+        f.write(np.asarray(matrix, dtype="<f4").tobytes(order="C"))
+    os.replace(tmp, out_path)
+
+
+# === Runtime ===
+class NutrientTable:
+    """Food names plus a read-only (rows x 5) float32 matrix."""
+
+    def __init__(self, names, matrix, source_sha256=""):
+        self.names = names
+        self.matrix = matrix
+        self.source_sha256 = source_sha256
+
+    def __len__(self):
+        return len(self.names)
+
+
+def read_table(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a nutrient table")
+        (head_len,) = struct.unpack("<I", f.read(4))
+        head = json.loads(f.read(head_len))
+        names_blob = f.read(head["names_bytes"])
+    names = names_blob.decode("utf-8").split("\n") if head["rows"] else []
+    shape = (head["rows"], len(head["columns"]))
+    if head["columns"] != NUTRIENT_COLUMNS:
+        raise ValueError(f"{path} has unexpected columns {head['columns']}")
+    matrix = np.memmap(path, dtype="<f4", mode="r", offset=head["data_offset"], shape=shape)
+    return NutrientTable(names, matrix, head.get("source_sha256", ""))
+
+
+def table_from_csv(csv_path):
+    """Fallback when no artifact is available: build the table in memory."""
+    df = load_dataset(csv_path)
+    matrix = df[NUTRIENT_COLUMNS].to_numpy(dtype="<f4")
+    return NutrientTable(df["food_name"].tolist(), matrix)
+
+
+if __name__ == "__main__":
+    base = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset")
+    src = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base, "indb_clean.csv")
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base, "indb_table.bin")
+    rows = build_table(src, dst)
+    print(f"wrote {rows} rows to {dst}")
@@ -0,0 +1,174 @@
+"""
+Background PDF export with an on-disk cache.
+
+Rendering a recipe to PDF takes seconds (WeasyPrint, or pdfkit /
+wkhtmltopdf as a fallback), so it runs in a small process pool instead of
+the request. Finished files live in `cache_dir` as
+
+    recipe_<id>_<version>.pdf
+
+where `version` hashes everything the PDF shows. An edited recipe gets a
+new version, and `invalidate(recipe_id)` removes the stale files. Workers
+only ever write their own file: a job for an older version may finish
+after a newer one, so older files are pruned by the request that serves
+the current version (`prune`).
+
+Jobs are identified by "<id>-<version>", so repeated clicks on Export while
+a job is running all wait on the same job. Finished jobs are dropped once
+their file exists; failed ones stay until `forget()` so the failure can be
+reported.
+"""
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_STATIC_VERSION = re.compile(r"(file:///[^\"'?\s]+)\?v=[0-9a-f]+")
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_jobs = {}  # job id -> Future, while queued, running or failed
+
+
+def content_version(recipe, template_path):
+    """Short hash of the recipe fields shown in the PDF plus the print template."""
+    fields = [recipe.title, recipe.ingredients, recipe.instructions, recipe.image_url,
+              recipe.youtube_url, recipe.calories, recipe.proteins, recipe.fats,
+              recipe.carbs, recipe.fibers]
+    h = hashlib.sha256(json.dumps(fields, default=str).encode("utf-8"))
+    with open(template_path, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def cache_path(cache_dir, recipe_id, version):
+    return os.path.join(cache_dir, f"recipe_{recipe_id}_{version}.pdf")
+
+
+def job_id(recipe_id, version):
+    return f"{recipe_id}-{version}"
+
+
+def localize_static(html, static_dir):
+    """Point /static/ URLs at files on disk so the renderer needn't call back into the app."""
+    static_dir_url = static_dir.replace("\\", "/").lstrip("/")  # convert \ -> /, no //// on posix
+    html = html.replace('/static/', f'file:///{static_dir_url}/')
+    # cache-busting ?v= suffixes mean nothing to file://
+    return _STATIC_VERSION.sub(r"\1", html)
+
+
+def render_pdf(html, wkhtmltopdf_path=None):
+    """PDF bytes for `html`, or None if neither renderer works here."""
+    try:
+        from weasyprint import HTML
+        return HTML(string=html).write_pdf()
+    except Exception:
+        log.warning("WeasyPrint failed", exc_info=True)
+
+    try:
+        import pdfkit
+        wk_path = wkhtmltopdf_path if wkhtmltopdf_path and os.path.exists(wkhtmltopdf_path) \
+            else shutil.which('wkhtmltopdf')
+        config = pdfkit.configuration(wkhtmltopdf=wk_path) if wk_path else None
+        return pdfkit.from_string(html, False, configuration=config)
+    except Exception:
+        log.warning("pdfkit failed", exc_info=True)
+    return None
+
+
+def _render_to_file(html, path, wkhtmltopdf_path):
+    # runs in a worker process
+    pdf = render_pdf(html, wkhtmltopdf_path)
+    if not pdf:
+        return None
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+    return path
+
+
+def _pool(workers):
+    # called with _lock held
+    global _executor
+    if _executor is None:
+        # spawn: workers import only this module, not the whole app
+        _executor = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _succeeded(future):
+    return future.done() and not future.cancelled() and future.exception() is None \
+        and future.result() is not None
+
+
+def submit(jid, html, path, workers=1, wkhtmltopdf_path=None):
+    """Queue a render unless one for `jid` is already queued or running."""
+    global _executor
+    with _lock:
+        # a finished job is its file on disk now
+        for done in [j for j, f in _jobs.items() if _succeeded(f)]:
+            del _jobs[done]
+        future = _jobs.get(jid)
+        if future is None or future.done():
+            try:
+                future = _pool(workers).submit(_render_to_file, html, path, wkhtmltopdf_path)
+            except BrokenProcessPool:
+                # a worker died (OOM, segfault in the renderer): retry once on a new pool
+                log.warning("PDF worker pool broke; starting a new one")
+                _executor.shutdown(wait=False)
+                _executor = None
+                future = _pool(workers).submit(_render_to_file, html, path, wkhtmltopdf_path)
+            _jobs[jid] = future
+        return future
+
+
+def status(jid, path):
+    """'done', 'pending', 'failed' or 'missing' (never submitted)."""
+    if os.path.exists(path):
+        forget(jid)
+        return "done"
+    future = _jobs.get(jid)
+    if future is None:
+        return "missing"
+    if not future.done():
+        return "pending"
+    return "failed"
+
+
+def forget(jid):
+    with _lock:
+        _jobs.pop(jid, None)
+
+
+def prune(cache_dir, recipe_id, keep):
+    """Delete cached PDFs of `recipe_id` other than `keep`, the current version's."""
+    for path in glob.glob(os.path.join(cache_dir, f"recipe_{recipe_id}_*.pdf")):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def invalidate(cache_dir, recipe_id):
+    """Delete cached PDFs of `recipe_id` (after an edit or delete)."""
+    for path in glob.glob(os.path.join(cache_dir, f"recipe_{recipe_id}_*.pdf")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    prefix = f"{recipe_id}-"
+    with _lock:
+        for jid in [j for j in _jobs if j.startswith(prefix)]:
+            del _jobs[jid]
@@ -0,0 +1,173 @@
+"""
+Request timings, Prometheus-format metrics and on-demand profiles.
+
+Each request's wall time is split into time spent in SQL (and the number
+of statements), in template rendering and in nutrition matching. Those go
+into per-endpoint histograms served as text by `Registry.render()`, in the
+Prometheus exposition format.
+
+Numbers are per process. Under gunicorn each worker keeps its own, so
+scrape the workers directly, or read them as a sample.
+
+`Profiler` wraps pyinstrument when it is installed (an HTML call tree) and
+cProfile otherwise (a .prof file for `python -m pstats` or snakeviz).
+"""
+import bisect
+import math
+import os
+import re
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_label_value(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labels=("endpoint",), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), series):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (_number(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # (name, help, read, labels, kind)
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name, help, read, labels=(), kind="gauge"):
+        """
+        Metric read at scrape time from `read()`, which returns a number or
+        {label values tuple: number}; for counters kept elsewhere (cache
+        hit counts) pass kind="counter".
+        """
+        self._collectors.append((name, help, read, tuple(labels), kind))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help, read, labels, kind in self._collectors:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            values = read()
+            if not isinstance(values, dict):
+                values = {(): values}
+            for key, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(labels, key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """One request's profile: pyinstrument if installed, else cProfile."""
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler as Sampler  # optional dependency
+            self._impl, self.kind = Sampler(async_mode="disabled"), "pyinstrument"
+        except ImportError:
+            import cProfile
+            self._impl, self.kind = cProfile.Profile(), "cprofile"
+
+    def start(self):
+        """False if another profiler already runs in this process (cProfile allows one)."""
+        try:
+            if self.kind == "pyinstrument":
+                self._impl.start()
+            else:
+                self._impl.enable()
+        except (RuntimeError, ValueError):
+            return False
+        return True
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self._impl.stop()
+        else:
+            self._impl.disable()
+
+    def save(self, directory, name, elapsed):
+        """Write the profile to `directory` and return its path."""
+        os.makedirs(directory, exist_ok=True)
+        stem = f"{time.strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}_{elapsed * 1000:.0f}ms"
+        if self.kind == "pyinstrument":
+            path = os.path.join(directory, stem + ".html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self._impl.output_html())
+        else:
+            path = os.path.join(directory, stem + ".prof")
+            self._impl.dump_stats(path)
+        return path
@@ -0,0 +1,171 @@
+"""
+Full-text search over recipe title, ingredients and instructions.
+
+SQLite:   FTS5 external-content table `recipe_fts`, kept in sync by triggers.
+Postgres: generated `search_vector` tsvector column with a GIN index.
+Anything else (or SQLite built without FTS5) reports `available() == False`
+and the caller falls back to ILIKE filtering.
+
+Title matches weigh more than ingredients, which weigh more than
+instructions.
+"""
+import re
+
+from sqlalchemy import text
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5(
+        title, ingredients, instructions,
+        content='recipe', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS recipe_fts_ai AFTER INSERT ON recipe BEGIN
+        INSERT INTO recipe_fts(rowid, title, ingredients, instructions)
+        VALUES (new.id, new.title, new.ingredients, new.instructions);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS recipe_fts_ad AFTER DELETE ON recipe BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, title, ingredients, instructions)
+        VALUES ('delete', old.id, old.title, old.ingredients, old.instructions);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS recipe_fts_au AFTER UPDATE OF title, ingredients, instructions ON recipe BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, title, ingredients, instructions)
+        VALUES ('delete', old.id, old.title, old.ingredients, old.instructions);
+        INSERT INTO recipe_fts(rowid, title, ingredients, instructions)
+        VALUES (new.id, new.title, new.ingredients, new.instructions);
+    END""",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE recipe ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(instructions, '')), 'C')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_search_vector ON recipe USING GIN (search_vector)",
+]
+
+_available = {}
+
+
+def available(engine):
+    """Whether the index exists; probed once per process, install() need not have run here."""
+    key = engine.url.render_as_string()
+    if key not in _available:
+        _available[key] = _probe(engine)
+    return _available[key]
+
+
+def _probe(engine):
+    dialect = engine.dialect.name
+    try:
+        with engine.connect() as conn:
+            if dialect == "sqlite":
+                return conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'recipe_fts'"
+                )).first() is not None
+            if dialect == "postgresql":
+                return conn.execute(text(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'recipe' AND column_name = 'search_vector'"
+                )).first() is not None
+    except Exception:
+        pass
+    return False
+
+
+def install(engine):
+    """Create the index objects if missing; backfills a newly created index."""
+    key = engine.url.render_as_string()
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                existed = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'recipe_fts'"
+                )).first() is not None
+                for ddl in SQLITE_DDL:
+                    conn.execute(text(ddl))
+                if not existed:
+                    conn.execute(text("INSERT INTO recipe_fts(recipe_fts) VALUES ('rebuild')"))
+            elif dialect == "postgresql":
+                # generated column fills existing rows as it is added
+                for ddl in POSTGRES_DDL:
+                    conn.execute(text(ddl))
+            else:
+                _available[key] = False
+                return False
+    except Exception:
+        # e.g. SQLite compiled without FTS5
+        _available[key] = False
+        return False
+    _available[key] = True
+    return True
+
+
+def rebuild(engine):
+    """Re-index every recipe (backfill after bulk loads or restores)."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("INSERT INTO recipe_fts(recipe_fts) VALUES ('rebuild')"))
+            conn.execute(text("INSERT INTO recipe_fts(recipe_fts) VALUES ('optimize')"))
+        elif engine.dialect.name == "postgresql":
+            # touching the row recomputes the generated column
+            conn.execute(text("UPDATE recipe SET title = title"))
+            conn.execute(text("REINDEX INDEX ix_recipe_search_vector"))
+
+
+def _words(s):
+    return _WORD.findall((s or "").lower())
+
+
+def _sqlite_match(q):
+    # every word of the query, as a prefix, anywhere in the recipe
+    return " AND ".join(f'"{w}"*' for w in _words(q))
+
+
+def _pg_tsquery(q):
+    return " & ".join(f"{w}:*" for w in _words(q))
+
+
+def match_clause(session, q, id_column="recipe.id"):
+    """
+    WHERE clause restricting `id_column` to ids of recipes matching `q`, for
+    combining the text index with other filters. None if `q` has no words.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        match = _sqlite_match(q)
+        if not match:
+            return None
+        return text(
+            f"{id_column} IN (SELECT rowid FROM recipe_fts WHERE recipe_fts MATCH :fts_match)"
+        ).bindparams(fts_match=match)
+    tsquery = _pg_tsquery(q)
+    if not tsquery:
+        return None
+    return text(
+        f"{id_column} IN (SELECT id FROM recipe WHERE search_vector @@ to_tsquery('english', :fts_query))"
+    ).bindparams(fts_query=tsquery)
+
+
+def search_ids(session, q, limit, offset=0):
+    """Ids of recipes matching free text `q`, best match first."""
+    engine = session.get_bind()
+    if engine.dialect.name == "sqlite":
+        match = _sqlite_match(q)
+        if not match:
+            return []
+        rows = session.execute(text(
+            "SELECT rowid FROM recipe_fts WHERE recipe_fts MATCH :match "
+            "ORDER BY bm25(recipe_fts, 10.0, 4.0, 1.0) LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit, "offset": offset})
+    else:
+        tsquery = _pg_tsquery(q)
+        if not tsquery:
+            return []
+        rows = session.execute(text(
+            "SELECT id FROM recipe, to_tsquery('english', :tsquery) query "
+            "WHERE search_vector @@ query "
+            "ORDER BY ts_rank(search_vector, query) DESC, id DESC LIMIT :limit OFFSET :offset"
+        ), {"tsquery": tsquery, "limit": limit, "offset": offset})
+    return [r[0] for r in rows]
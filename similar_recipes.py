@@ -0,0 +1,183 @@
+"""
+"Similar recipes" neighbours from ingredient TF-IDF vectors and macro profiles.
+
+A recipe is a document whose terms are its matched ingredients (the INDB
+food name, or the cleaned ingredient name when nothing matched). TF-IDF
+makes a shared "saffron" count for more than a shared "onion", and
+ingredients found in more than MAX_DF of all recipes (salt, oil, water)
+are dropped altogether. The macro profile is the share of calories from
+protein, fat and carbs plus fibre density, centred on the collection
+mean, so two high-protein dishes sit closer than a dal and a kheer.
+
+    score = (1 - MACRO_WEIGHT) * cosine(ingredients) + MACRO_WEIGHT * cosine(macros)
+
+Only recipes sharing at least one kept ingredient are compared, which keeps
+the all-pairs product sparse. `fit()` builds the model, `neighbours()`
+yields every recipe's top k in blocks, and `Model.scores()` rates one
+recipe against a candidate set for incremental updates. The neighbours
+themselves live in the recipe_similarity table, so a page view reads
+them with one indexed lookup.
+
+numpy, scipy and scikit-learn are imported on first use; they would
+double the app's import time.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_K = 6
+# ingredients in more than this share of recipes carry no signal
+MAX_DF = 0.5
+MACRO_WEIGHT = 0.3
+# neighbours scoring lower than this aren't worth showing
+MIN_SCORE = 0.05
+
+_models = {}  # path -> (mtime, Model)
+_executor = None
+_lock = threading.Lock()
+
+
+def term(food_name, name):
+    """The ingredient's term: what it matched, else its own name."""
+    return food_name or name
+
+
+def _terms(doc):
+    # documents arrive already tokenised (a list of terms)
+    return doc
+
+
+class Model:
+    def __init__(self, vectorizer, macro_mean):
+        self.vectorizer = vectorizer
+        self.macro_mean = macro_mean
+
+    @property
+    def vocabulary(self):
+        return self.vectorizer.vocabulary_
+
+    def vectors(self, docs):
+        """L2-normalised TF-IDF rows (CSR); terms unseen at fit time are ignored."""
+        return self.vectorizer.transform(docs).tocsr()
+
+    def macros(self, profiles):
+        """Centred, L2-normalised macro rows for (proteins, fats, carbs, fibers) grams."""
+        import numpy as np
+
+        m = _macro_shares(profiles) - self.macro_mean
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        return np.divide(m, norms, out=np.zeros_like(m), where=norms > 0)
+
+    def scores(self, doc, profile, docs, profiles):
+        """Scores of one recipe against each of `docs` / `profiles`."""
+        import numpy as np
+
+        if not docs:
+            return np.zeros(0)
+        sims = (self.vectors(docs) @ self.vectors([doc]).T).toarray().ravel()
+        macro = self.macros(profiles) @ self.macros([profile])[0]
+        return _combine(sims, macro)
+
+
+def _macro_shares(profiles):
+    import numpy as np
+
+    p = np.array([[v or 0.0 for v in row] for row in profiles], dtype=np.float64).reshape(-1, 4)
+    kcal = p[:, 0] * 4 + p[:, 1] * 9 + p[:, 2] * 4
+    out = np.zeros((len(p), 4))
+    has = kcal > 0
+    out[has, :3] = p[has, :3] * (4, 9, 4) / kcal[has, None]
+    # grams of fibre per 100 kcal, mostly 0-5, scaled to the shares' range
+    out[has, 3] = np.minimum(p[has, 3] / kcal[has] * 10, 1.0)
+    return out
+
+
+def _combine(sims, macro):
+    return (1 - MACRO_WEIGHT) * sims + MACRO_WEIGHT * macro
+
+
+def top(ids, scores, k, exclude=None):
+    """[(id, score)] of the k best scores above MIN_SCORE, best first."""
+    import numpy as np
+
+    ids = np.asarray(ids)
+    keep = scores >= MIN_SCORE
+    if exclude is not None:
+        keep &= ids != exclude
+    ids, scores = ids[keep], scores[keep]
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores, kind="stable")
+    return [(int(ids[i]), round(float(scores[i]), 4)) for i in order]
+
+
+def fit(docs, profiles):
+    """Model for the whole collection, or None if no recipe has ingredients."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    for max_df in (MAX_DF, 1.0):
+        vectorizer = TfidfVectorizer(analyzer=_terms, max_df=max_df, sublinear_tf=True)
+        try:
+            vectorizer.fit(docs)
+        except ValueError:
+            # too few recipes for MAX_DF to leave anything, or none at all
+            continue
+        return Model(vectorizer, _macro_shares(profiles).mean(axis=0))
+    return None
+
+
+def neighbours(model, ids, docs, profiles, k=DEFAULT_K, block=1000):
+    """
+    Yield (recipe_id, [(similar_id, score), ...]) for every recipe, `block`
+    rows of the similarity matrix at a time.
+    """
+    import numpy as np
+
+    ids = np.asarray(ids)
+    x = model.vectors(docs)
+    xt = x.T.tocsr()
+    m = model.macros(profiles)
+    for lo in range(0, len(ids), block):
+        sims = (x[lo:lo + block] @ xt).tocsr()
+        for r in range(sims.shape[0]):
+            i = lo + r
+            cols = sims.indices[sims.indptr[r]:sims.indptr[r + 1]]
+            if not len(cols):
+                yield int(ids[i]), []
+                continue
+            data = sims.data[sims.indptr[r]:sims.indptr[r + 1]]
+            scores = _combine(data, m[cols] @ m[i])
+            yield int(ids[i]), top(ids[cols], scores, k, exclude=ids[i])
+
+
+def save(model, path):
+    import joblib
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, path)  # workers never load a half-written file
+
+
+def load(path):
+    """The saved model, reloaded when the file changes; None before the first build."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _models.get(path)
+    if cached is None or cached[0] != mtime:
+        import joblib
+
+        cached = _models[path] = (mtime, joblib.load(path))
+    return cached[1]
+
+
+def submit(fn, *args):
+    """Run `fn` on the update thread; one at a time, so two edits never race on the same lists."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similar-recipes")
+        return _executor.submit(fn, *args)
@@ -0,0 +1,76 @@
+// Favorite, rate and comment forms marked data-xhr="favorite|rate|comment"
+// are sent with fetch() asking for JSON, and the page is updated in place
+// from the reply: no redirect, no re-rendered page. Without JavaScript, or
+// if the request fails, the form is submitted the normal way.
+(function () {
+  'use strict';
+
+  function status(form, text) {
+    const el = form.querySelector('[data-xhr-status]');
+    if (el) el.textContent = text;
+  }
+
+  const handlers = {
+    favorite(form, data) {
+      if (!data.favorite && form.dataset.removeClosest) {
+        form.closest(form.dataset.removeClosest).remove();
+        return;
+      }
+      const button = form.querySelector('button');
+      const state = data.favorite ? 'on' : 'off';
+      if (button.dataset[state + 'Label']) {
+        button.textContent = button.dataset[state + 'Label'];
+        button.className = button.dataset[state + 'Class'];
+      }
+    },
+    rate(form, data) {
+      const summary = document.querySelector('[data-rating-summary]');
+      if (summary && data.rating_avg !== null) {
+        const plural = data.rating_count === 1 ? '' : 's';
+        summary.textContent = `Average: ${data.rating_avg.toFixed(1)} / 5 (${data.rating_count} rating${plural})`;
+        summary.hidden = false;
+      }
+      status(form, `Rated ${data.score} / 5`);
+    },
+    comment(form, data) {
+      const list = document.querySelector('[data-comments]');
+      if (list) {
+        const empty = list.querySelector('[data-empty]');
+        if (empty) empty.remove();
+        list.insertAdjacentHTML('beforeend', data.html);
+      }
+      form.reset();
+      status(form, 'Comment added');
+    },
+  };
+
+  document.addEventListener('submit', async (event) => {
+    const form = event.target;
+    const handler = handlers[form.dataset.xhr];
+    if (!handler) return;
+    event.preventDefault();
+    if (form.dataset.busy) return;  // a double click sends one request
+    form.dataset.busy = '1';
+    try {
+      const response = await fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        credentials: 'same-origin',
+        headers: { 'Accept': 'application/json' },
+      });
+      const isJson = (response.headers.get('Content-Type') || '').includes('application/json');
+      if (response.status === 400 && isJson) {
+        const { errors } = await response.json();
+        status(form, Object.values(errors || {}).flat().join(' ') || 'Please check the form.');
+        return;
+      }
+      // a login redirect or an error page: let the browser show it
+      if (!response.ok || !isJson) throw new Error(`HTTP ${response.status}`);
+      handler(form, await response.json());
+    } catch (err) {
+      form.submit();
+    } finally {
+      delete form.dataset.busy;
+    }
+  });
+})();
@@ -0,0 +1,115 @@
+"""
+Cache-friendly file responses for /static and /images.
+
+URLs built with `url_for` get a `?v=<content hash>` suffix (uploads are
+already content-addressed and are left alone). A request whose `v` matches
+the file, or any content-addressed upload, is served with
+
+    Cache-Control: public, max-age=31536000, immutable
+
+Everything else gets a short max-age so it is revalidated. Every response
+carries a strong ETag derived from the file's bytes, and If-None-Match /
+If-Modified-Since are answered with 304.
+
+With SENDFILE_MODE = "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd)
+the body is left to the front proxy and the worker only sends headers.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import Response, abort, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from image_store import VARIANTS
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# exactly what image_store writes: <hash>.<ext> and <hash>_<variant>.webp.
+# Legacy uploads (<uuid hex>_<original name>) look similar but their name
+# says nothing about their bytes.
+_HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{32}(\.[a-z0-9]+|_(%s)\.webp)$" % "|".join(VARIANTS))
+
+_digests = {}  # path -> ((mtime_ns, size), digest)
+_lock = threading.Lock()
+
+
+def file_digest(path):
+    """Short sha256 of the file's bytes, recomputed only when it changes. None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _digests.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    digest = h.hexdigest()[:16]
+    with _lock:
+        _digests[path] = (key, digest)
+    return digest
+
+
+def is_content_addressed(filename):
+    return bool(_HASHED_NAME.search(filename))
+
+
+def version_for(directory, filename):
+    """Value for the `v` query parameter, or None if the URL needs none."""
+    if is_content_addressed(filename):
+        return None
+    path = safe_join(directory, filename)
+    return file_digest(path) if path else None
+
+
+def send_file_cached(directory, filename, url_prefix, config):
+    """
+    Serve `directory/filename` with a strong ETag, conditional 304s and
+    long-lived caching for versioned URLs. `url_prefix` is the public path
+    the proxy maps to `directory` (used for X-Accel-Redirect).
+    """
+    path = safe_join(directory, filename)
+    digest = file_digest(path) if path else None
+    if digest is None:
+        abort(404)
+
+    immutable = is_content_addressed(filename) or request.args.get("v") == digest
+    st = os.stat(path)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    mode = config.get("SENDFILE_MODE", "")
+    # with a proxy sending the bytes, Range requests are its business too
+    proxied = mode in ("x-accel", "x-sendfile")
+    if mode == "x-accel":
+        rv = Response(mimetype=mimetype)
+        prefix = config.get("SENDFILE_ACCEL_PREFIX", "/_protected")
+        rv.headers["X-Accel-Redirect"] = f"{prefix.rstrip('/')}{url_prefix}{filename}"
+        rv.headers["Content-Length"] = str(st.st_size)
+    elif mode == "x-sendfile":
+        rv = Response(mimetype=mimetype)
+        rv.headers["X-Sendfile"] = path
+        rv.headers["Content-Length"] = str(st.st_size)
+    else:
+        rv = Response(wrap_file(request.environ, open(path, "rb")), mimetype=mimetype,
+                      direct_passthrough=True)
+        rv.content_length = st.st_size
+
+    rv.set_etag(digest)
+    rv.last_modified = int(st.st_mtime)
+    rv.cache_control.public = True
+    if immutable:
+        rv.cache_control.max_age = IMMUTABLE_MAX_AGE
+        rv.cache_control.immutable = True
+    else:
+        rv.cache_control.max_age = config.get("STATIC_MAX_AGE", 3600)
+    if proxied:
+        return rv.make_conditional(request.environ)
+    return rv.make_conditional(request.environ, accept_ranges=True, complete_length=st.st_size)
@@ -0,0 +1,99 @@
+"""
+App tests run against a throwaway SQLite file, recreated for every test.
+The app object is created at import from the environment (see config.py),
+so the database and cache locations are set before `app` is imported.
+"""
+import os
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="recipe_app_tests_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    "PDF_CACHE_DIR": os.path.join(_tmp, "pdf_cache"),
+    "SIMILAR_MODEL_PATH": os.path.join(_tmp, "similar_recipes.joblib"),
+    "PROFILE_DIR": os.path.join(_tmp, "profiles"),
+    "FRAGMENT_CACHE_URL": "",
+    "STREAM_LISTINGS": "0",
+    "METRICS_ENABLED": "0",
+})
+
+
+@pytest.fixture(scope="session")
+def appmod():
+    import app as appmod
+
+    appmod.create_app({"TESTING": True, "WTF_CSRF_ENABLED": False, "PRELOAD_NUTRITION": False})
+    return appmod
+
+
+@pytest.fixture
+def app(appmod, tmp_path):
+    """The app with an empty, fully upgraded database."""
+    import similar_recipes
+
+    app = appmod.app
+    app.config["UPLOAD_FOLDER"] = str(tmp_path / "uploads")
+    os.makedirs(app.config["UPLOAD_FOLDER"])
+    path = app.config["SQLALCHEMY_DATABASE_URI"][len("sqlite:///"):]
+    with app.app_context():
+        appmod.db.engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    appmod.init_schema()
+    appmod.fragments.backend.clear()
+    yield app
+    # background similar-recipe updates must not outlive their database
+    similar_recipes.submit(lambda: None).result()
+
+
+@pytest.fixture
+def db(app, appmod):
+    """The database with an app context pushed, for tests that only touch the database.
+    Tests sending requests open their own contexts instead: the request would
+    reuse this one, sharing its `g` and session (and so its loaded objects)."""
+    with app.app_context():
+        yield appmod.db
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app, appmod):
+    def make_user(username="cook"):
+        with app.app_context():
+            user = appmod.User(username=username, password_hash="x")
+            appmod.db.session.add(user)
+            appmod.db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def make_recipe(app, appmod):
+    def make_recipe(user_id, title="Dal", ingredients="1 cup toor dal, 1 onion", **values):
+        from nutrition_calculator.nutrition_utils import calculate_recipe_nutrition
+
+        totals = calculate_recipe_nutrition(appmod.split_ingredients(ingredients))
+        with app.app_context():
+            recipe = appmod.Recipe(title=title, ingredients=ingredients, instructions="Cook.",
+                                   user_id=user_id, **{**totals, **values})
+            recipe.ingredient_rows = appmod.build_ingredient_rows(appmod.split_ingredients(ingredients))
+            appmod.db.session.add(recipe)
+            appmod.db.session.commit()
+            return recipe.id
+    return make_recipe
+
+
+@pytest.fixture
+def login(client):
+    def login(user_id):
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+    return login
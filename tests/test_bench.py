@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks import bench
+
+BASELINE = {"recipes": {"p95_ms": 10.0, "peak_kb": 400.0}}
+
+
+def test_percentile_interpolates():
+    samples = list(range(1, 101))
+    assert bench.percentile(samples, 50) == pytest.approx(50.5)
+    assert bench.percentile(samples, 95) == pytest.approx(95.05)
+    assert bench.percentile([3.0], 99) == 3.0
+
+
+@pytest.mark.parametrize("p95, peak, regressed", [
+    (12.4, 590.0, []),                                    # inside both margins
+    (12.6, 400.0, ["recipes p95_ms 12.6 > 10.0 +25%"]),
+    (10.0, 610.0, ["recipes peak_kb 610.0 > 400.0 +50%"]),
+])
+def test_compare_uses_separate_memory_tolerance(p95, peak, regressed):
+    results = {"recipes": {"p95_ms": p95, "peak_kb": peak}}
+    assert bench.compare(results, BASELINE, 0.25, 0.5) == regressed
+
+
+def test_compare_ignores_noise_and_new_scenarios():
+    small = {"tiny": {"p95_ms": 0.01, "peak_kb": 1.0}}
+    results = {"tiny": {"p95_ms": 0.05, "peak_kb": 5.0}, "new": {"p95_ms": 99.0, "peak_kb": 999.0}}
+    assert bench.compare(results, small, 0.25, 0.5) == []
@@ -0,0 +1,94 @@
+import pytest
+
+from nutrition_calculator import nutrition_utils
+
+
+@pytest.fixture
+def matched(monkeypatch):
+    """The ingredients sent to the matcher, one list per call."""
+    calls = []
+    match_ingredients = nutrition_utils.match_ingredients
+
+    def recording(ingredients_list):
+        calls.append(list(ingredients_list))
+        return match_ingredients(ingredients_list)
+
+    monkeypatch.setattr(nutrition_utils, "match_ingredients", recording)
+    return calls
+
+
+def edit(client, recipe_id, ingredients, title="Dal"):
+    return client.post(f"/recipe/{recipe_id}/edit", data={
+        "title": title, "ingredients": ingredients, "instructions": "Cook.", "servings": "2"})
+
+
+def rows_of(app, appmod, recipe_id):
+    with app.app_context():
+        recipe = appmod.db.session.get(appmod.Recipe, recipe_id)
+        return recipe, [(r.id, r.position, r.raw, r.food_name, r.calories, r.proteins)
+                        for r in recipe.ingredient_rows]
+
+
+def test_title_only_edit_skips_the_matcher(app, appmod, client, login, make_user, make_recipe, matched):
+    user = make_user()
+    recipe_id = make_recipe(user, ingredients="1 cup toor dal, 1 onion")
+    _, before = rows_of(app, appmod, recipe_id)
+    matched.clear()
+    login(user)
+
+    assert edit(client, recipe_id, "1 cup toor dal, 1 onion", title="Toor dal").status_code == 302
+    recipe, after = rows_of(app, appmod, recipe_id)
+    assert matched == []
+    assert after == before
+    assert recipe.title == "Toor dal"
+
+
+def test_only_changed_ingredients_are_matched(app, appmod, client, login, make_user, make_recipe, matched):
+    user = make_user()
+    recipe_id = make_recipe(user, ingredients="1 cup toor dal, 1 onion, 1 tbsp ghee")
+    _, before = rows_of(app, appmod, recipe_id)
+    matched.clear()
+    login(user)
+
+    assert edit(client, recipe_id, "1 onion, 1 cup toor dal, 2 tomatoes").status_code == 302
+    recipe, after = rows_of(app, appmod, recipe_id)
+    assert matched == [["2 tomatoes"]]
+    # kept ingredients keep their rows (and matches), in their new order
+    ids = {raw: row_id for row_id, _, raw, *_ in before}
+    assert [(r[0], r[1]) for r in after[:2]] == [(ids["1 onion"], 0), (ids["1 cup toor dal"], 1)]
+    assert after[2][0] not in ids.values() and after[2][2] == "2 tomatoes"
+    # totals are the sum of the stored contributions
+    assert recipe.calories == pytest.approx(sum(r[4] for r in after), abs=0.01)
+    assert recipe.proteins == pytest.approx(sum(r[5] for r in after), abs=0.01)
+    expected = nutrition_utils.calculate_recipe_nutrition(["1 onion", "1 cup toor dal", "2 tomatoes"])
+    assert recipe.calories == pytest.approx(expected["calories"], abs=0.01)
+
+
+def test_rows_without_contributions_are_rematched(app, appmod, client, login, make_user, make_recipe, matched):
+    user = make_user()
+    recipe_id = make_recipe(user, ingredients="1 cup toor dal, 1 onion")
+    with app.app_context():
+        appmod.db.session.execute(appmod.db.update(appmod.RecipeIngredient).values(calories=None))
+        appmod.db.session.commit()
+    matched.clear()
+    login(user)
+
+    edit(client, recipe_id, "1 cup toor dal, 1 onion", title="Toor dal")
+    recipe, after = rows_of(app, appmod, recipe_id)
+    assert matched == [["1 cup toor dal", "1 onion"]]
+    assert all(r[4] is not None for r in after)
+    assert recipe.calories == pytest.approx(sum(r[4] for r in after), abs=0.01)
+
+
+def test_detail_page_shows_the_breakdown_without_matching(app, appmod, client, login, make_user, make_recipe, matched):
+    user = make_user()
+    recipe_id = make_recipe(user, ingredients="2 cups basmati rice, 1 zzzqx")
+    _, rows = rows_of(app, appmod, recipe_id)
+    matched.clear()
+    login(user)
+
+    html = client.get(f"/recipe/{recipe_id}").get_data(as_text=True)
+    assert "Per-ingredient breakdown" in html
+    assert rows[0][3] in html
+    assert "no match" in html
+    assert matched == []
@@ -0,0 +1,78 @@
+import threading
+
+import fragment_cache
+
+
+def test_fill_replaces_holes():
+    html = f"<div>{fragment_cache.hole('fav')}</div><p>{fragment_cache.hole('forms')}</p>"
+    assert fragment_cache.fill(html, {"fav": "<button>♥</button>", "forms": ""}) == "<div><button>♥</button></div><p></p>"
+
+
+def test_memory_backend_is_a_bounded_lru():
+    cache = fragment_cache.FragmentCache(fragment_cache.MemoryBackend(2))
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"  # b is now the oldest
+    cache.set("c", "C")
+    assert cache.get_many(["a", "b", "c"]) == {"a": "A", "c": "C"}
+    assert cache.stats() == {"backend": "MemoryBackend", "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+
+def test_size_zero_turns_caching_off():
+    cache = fragment_cache.FragmentCache(fragment_cache.backend_from_config("", 0))
+    cache.set("a", "A")
+    assert cache.get("a") is None
+
+
+def test_counters_are_exact_across_threads():
+    cache = fragment_cache.FragmentCache(fragment_cache.MemoryBackend(8))
+    cache.set("hit", "x")
+
+    def work():
+        for _ in range(2000):
+            cache.get_many(["hit", "miss"])
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (16000, 16000)
+
+
+def test_recipe_page_is_shared_but_per_user_parts_are_not(appmod, client, login, make_user, make_recipe):
+    owner, other = make_user("owner"), make_user("other")
+    recipe = make_recipe(owner, title="Shared kheer")
+
+    login(owner)
+    first = client.get(f"/recipe/{recipe}").get_data(as_text=True)
+    hits = appmod.fragments.hits
+    login(other)
+    second = client.get(f"/recipe/{recipe}").get_data(as_text=True)
+    assert appmod.fragments.hits == hits + 1
+    assert "Shared kheer" in first and "Shared kheer" in second
+    # owner buttons only for the owner, even from the cached body
+    assert f"/recipe/{recipe}/edit" in first
+    assert f"/recipe/{recipe}/edit" not in second
+
+
+def test_comment_makes_the_cached_page_stale(client, login, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user)
+    login(user)
+    client.get(f"/recipe/{recipe}")
+    client.post(f"/recipe/{recipe}/comment", data={"content": "Needs more salt"})
+    assert "Needs more salt" in client.get(f"/recipe/{recipe}").get_data(as_text=True)
+
+
+def test_edit_makes_listing_cards_stale(client, login, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user, title="Old title")
+    login(user)
+    assert "Old title" in client.get("/recipes").get_data(as_text=True)
+    response = client.post(f"/recipe/{recipe}/edit", data={
+        "title": "New title", "ingredients": "1 cup toor dal, 1 onion", "instructions": "Cook.", "servings": 1,
+    })
+    assert response.status_code == 302
+    body = client.get("/recipes").get_data(as_text=True)
+    assert "New title" in body and "Old title" not in body
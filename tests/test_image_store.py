@@ -0,0 +1,95 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import image_store
+
+
+def jpeg(width=1600, height=900, color=(200, 80, 20)):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+def upload(data, filename="photo.jpeg"):
+    return FileStorage(io.BytesIO(data), filename=filename)
+
+
+def test_same_bytes_are_stored_once(tmp_path):
+    data = jpeg()
+    first = image_store.store_upload(upload(data, "a.jpeg"), str(tmp_path), background=False)
+    second = image_store.store_upload(upload(data, "b.png"), str(tmp_path), background=False)
+    assert first == second
+    assert first.endswith(".jpg")  # from the bytes, not the file name
+    assert os.listdir(tmp_path) == [first]
+    assert image_store.store_upload(upload(jpeg(color=(0, 0, 0))), str(tmp_path), background=False) != first
+
+
+def test_variants_are_resized_webp(tmp_path):
+    name = image_store.store_upload(upload(jpeg()), str(tmp_path), background=False)
+    assert image_store.make_variants(str(tmp_path), name)
+    digest = name.split(".")[0]
+    for variant, width in image_store.VARIANTS.items():
+        with Image.open(image_store.variant_path(str(tmp_path), digest, variant)) as im:
+            assert im.format == "WEBP"
+            assert im.size == (width, round(900 * width / 1600))
+
+
+def test_small_images_are_not_upscaled(tmp_path):
+    name = image_store.store_upload(upload(jpeg(300, 200)), str(tmp_path), background=False)
+    image_store.make_variants(str(tmp_path), name)
+    with Image.open(image_store.variant_path(str(tmp_path), name.split(".")[0], "detail")) as im:
+        assert im.size == (300, 200)
+
+
+def test_image_attrs(tmp_path):
+    prefix = "/static/uploads/"
+    name = image_store.store_upload(upload(jpeg(color=(1, 2, 3))), str(tmp_path), background=False)
+    digest = name.split(".")[0]
+    # variants not made yet: just the original
+    assert image_store.image_attrs(prefix + name, "card", str(tmp_path), prefix) == f'src="{prefix}{name}"'
+    image_store.make_variants(str(tmp_path), name)
+    attrs = image_store.image_attrs(prefix + name, "card", str(tmp_path), prefix)
+    assert f'src="{prefix}{digest}_card.webp"' in attrs
+    assert f"{prefix}{digest}_detail.webp 1200w" in attrs
+    assert 'sizes="' in attrs
+    external = image_store.image_attrs("https://example.com/a.jpg?x=<1>", "card", str(tmp_path), prefix)
+    assert external == 'src="https://example.com/a.jpg?x=&lt;1&gt;"'
+
+
+@pytest.mark.parametrize("url, stored", [
+    ("/static/uploads/0123456789abcdef0123456789abcdef.jpg", True),
+    ("/static/uploads/0123456789abcdef0123456789abcdef_photo.jpg", False),
+    ("https://example.com/0123456789abcdef0123456789abcdef.jpg", False),
+    (None, False),
+])
+def test_is_stored_upload(url, stored):
+    assert image_store.is_stored_upload(url, "/static/uploads/") is stored
+
+
+def test_migrate_moves_legacy_uploads(app, appmod, make_user, make_recipe):
+    upload_dir = app.config["UPLOAD_FOLDER"]
+    legacy = "5f0c1d2e3a4b5c6d7e8f901234567890_photo.jpg"
+    data = jpeg()
+    with open(os.path.join(upload_dir, legacy), "wb") as f:
+        f.write(data)
+    with open(os.path.join(upload_dir, "orphan_old.jpg"), "wb") as f:
+        f.write(b"unreferenced")
+    user = make_user()
+    first = make_recipe(user, image_url=f"/static/uploads/{legacy}")
+    second = make_recipe(user, image_url=f"/static/uploads/{legacy}")
+
+    result = app.test_cli_runner().invoke(args=["images", "migrate"])
+    assert result.exit_code == 0, result.output
+    assert "Re-stored 1 uploads as 1 files; removed 2 unreferenced files." in result.output
+
+    with app.app_context():
+        urls = {appmod.db.session.get(appmod.Recipe, rid).image_url for rid in (first, second)}
+    (url,) = urls
+    name = url.rsplit("/", 1)[1]
+    assert image_store.is_stored_upload(url, "/static/uploads/")
+    digest = name.split(".")[0]
+    assert sorted(os.listdir(upload_dir)) == sorted([name, f"{digest}_card.webp", f"{digest}_detail.webp"])
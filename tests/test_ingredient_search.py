@@ -0,0 +1,34 @@
+def found(appmod, db, needed, match_all=True):
+    query = appmod.ingredient_search(needed, match_all=match_all)
+    return [(r.recipe_id, r.have, r.total) for r in db.session.execute(query)]
+
+
+def test_rows_are_stored_per_ingredient(appmod, db, make_user, make_recipe):
+    recipe = make_recipe(make_user(), ingredients="2 cups basmati rice, 1 onion")
+    rows = db.session.get(appmod.Recipe, recipe).ingredient_rows
+    assert [(r.position, r.name, r.head) for r in rows] == [(0, "basmati rice", "rice"), (1, "onion", "onion")]
+    assert rows[0].portion_g > 0 and rows[0].calories > 0
+
+
+def test_match_all_and_any(appmod, db, make_user, make_recipe):
+    user = make_user()
+    both = make_recipe(user, title="Rice and dal", ingredients="1 cup basmati rice, 1 cup toor dal")
+    rice = make_recipe(user, title="Jeera rice", ingredients="1 cup basmati rice, 1 tsp cumin, 1 tbsp ghee")
+    make_recipe(user, title="Halwa", ingredients="1 cup semolina, 2 tbsp sugar")
+
+    # a single word matches on the head word: "rice" finds "basmati rice"
+    assert found(appmod, db, ["rice", "toor dal"]) == [(both, 2, 2)]
+    # any: best coverage first
+    assert found(appmod, db, ["rice", "toor dal"], match_all=False) == [(both, 2, 2), (rice, 1, 3)]
+    assert found(appmod, db, ["saffron"]) == []
+    assert appmod.ingredient_search([]) is None
+
+
+def test_search_page_by_ingredients(client, login, make_user, make_recipe):
+    user = make_user()
+    make_recipe(user, title="Jeera rice", ingredients="1 cup basmati rice, 1 tsp cumin")
+    make_recipe(user, title="Halwa", ingredients="1 cup semolina")
+    login(user)
+    body = client.get("/search?ingredients=rice,+cumin").get_data(as_text=True)
+    assert "Jeera rice" in body
+    assert "Halwa" not in body
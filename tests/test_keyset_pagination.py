@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+
+@pytest.fixture
+def recipe_ids(make_user, make_recipe):
+    user = make_user()
+    return user, [make_recipe(user, title=f"Recipe {i}") for i in range(5)]
+
+
+def page(app, appmod, query_string):
+    with app.test_request_context(f"/recipes?{query_string}"):
+        result = appmod.keyset_paginate(appmod.Recipe.query, appmod.Recipe.id)
+        return [r.id for r in result.items], result.prev_cursor, result.next_cursor
+
+
+def test_pages_forward_and_back(app, appmod, recipe_ids):
+    ids = recipe_ids[1]
+    assert page(app, appmod, "per_page=2") == (ids[0:2], None, ids[1])
+    assert page(app, appmod, f"per_page=2&after={ids[1]}") == (ids[2:4], ids[2], ids[3])
+    assert page(app, appmod, f"per_page=2&after={ids[3]}") == (ids[4:5], ids[4], None)
+    assert page(app, appmod, f"per_page=2&before={ids[4]}") == (ids[2:4], ids[2], ids[3])
+    assert page(app, appmod, f"per_page=2&before={ids[2]}") == (ids[0:2], None, ids[1])
+
+
+def test_cursor_survives_inserts_and_deletes(app, appmod, recipe_ids, make_recipe):
+    user, ids = recipe_ids
+    with app.app_context():
+        appmod.db.session.execute(appmod.db.delete(appmod.Recipe).where(appmod.Recipe.id == ids[2]))
+        appmod.db.session.commit()
+    added = make_recipe(user, title="Later")
+    # no row skipped or repeated, unlike OFFSET paging
+    assert page(app, appmod, f"per_page=2&after={ids[1]}")[0] == [ids[3], ids[4]]
+    assert page(app, appmod, f"per_page=2&after={ids[4]}")[0] == [added]
+
+
+def test_per_page_is_clamped(app, appmod, recipe_ids):
+    assert len(page(app, appmod, "per_page=0")[0]) == 1
+    assert len(page(app, appmod, "per_page=1000")[0]) == 5
+
+
+def test_link_headers_walk_the_listing(client, login, recipe_ids):
+    user, ids = recipe_ids
+    login(user)
+    url, seen = "/my_recipes?per_page=2", []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_data(as_text=True)
+        seen += [rid for rid in ids if f"/recipe/{rid}/edit" in body or f"/recipe/{rid}\"" in body]
+        links = dict((rel, link) for link, rel in re.findall(r'<([^>]+)>; rel="(\w+)"', response.headers.get("Link", "")))
+        url = links.get("next")
+    assert seen == ids
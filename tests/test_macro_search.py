@@ -0,0 +1,90 @@
+from urllib.parse import urlsplit
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+# title -> whole-recipe calories, proteins and servings
+RECIPES = {
+    "Paneer bowl": (800, 50, 2),     # 400 kcal, 25 g protein per serving
+    "Dal": (300, 18, 1),
+    "Chicken curry": (1500, 120, 4),  # 375 kcal, 30 g
+    "Kheer": (450, 8, 1),
+    "Egg bhurji": (350, 25, 1),
+    "Rajma": (1200, 60, 3),          # 400 kcal, 20 g
+}
+
+
+@pytest.fixture
+def recipes(make_user, make_recipe):
+    user = make_user()
+    return {title: make_recipe(user, title=title, ingredients="1 onion", calories=cal, proteins=protein,
+                               servings=servings)
+            for title, (cal, protein, servings) in RECIPES.items()}
+
+
+def titles(data, recipes):
+    names = {v: k for k, v in recipes.items()}
+    return [names[r["id"]] for r in data["recipes"]]
+
+
+def test_macro_filters_parses_ranges_and_sort(appmod):
+    conds, (column, descending) = appmod.macro_filters(MultiDict({"max_calories": "400", "min_proteins": "20"}))
+    assert len(conds) == 3  # two bounds and "has a value" on the order column
+    assert column is appmod.Recipe.calories_per_serving and not descending
+    _, (column, descending) = appmod.macro_filters(MultiDict({"min_proteins": "20"}))
+    assert column is appmod.Recipe.proteins_per_serving and descending
+    _, (column, descending) = appmod.macro_filters(MultiDict({"max_calories": "400", "sort": "-fibers"}))
+    assert column is appmod.Recipe.fibers_per_serving and descending
+    assert appmod.macro_filters(MultiDict()) == ([], (None, True))
+    for bad in ({"max_calories": "lots"}, {"min_fats": "nan"}, {"sort": "sugar"}):
+        with pytest.raises(ValueError):
+            appmod.macro_filters(MultiDict(bad))
+
+
+def test_api_filters_per_serving(client, recipes):
+    data = client.get("/api/recipes?max_calories=400&min_proteins=20").get_json()
+    assert titles(data, recipes) == ["Egg bhurji", "Chicken curry", "Paneer bowl", "Rajma"]
+    assert data["next"] is None
+    paneer = data["recipes"][2]
+    assert paneer["servings"] == 2 and paneer["per_serving"]["calories"] == 400
+    assert paneer["url"] == f"/recipe/{recipes['Paneer bowl']}"
+
+
+@pytest.mark.parametrize("query", ["sort=-proteins", "sort=calories", "max_calories=450", ""])
+def test_api_cursor_pages_through_every_match_once(client, recipes, query):
+    everything = titles(client.get(f"/api/recipes?{query}&per_page=100").get_json(), recipes)
+    seen, url = [], f"/api/recipes?{query}&per_page=2"
+    while url:
+        data = client.get(url).get_json()
+        assert len(data["recipes"]) <= 2
+        seen += titles(data, recipes)
+        url = data["next"] and urlsplit(data["next"])._replace(scheme="", netloc="").geturl()
+    assert seen == everything and len(set(seen)) == len(seen)
+    if query == "sort=-proteins":
+        # ties on the sort value fall back to the id, in the same direction
+        assert seen[:3] == ["Chicken curry", "Egg bhurji", "Paneer bowl"]
+
+
+def test_api_rejects_bad_input(client, recipes):
+    for url in ("/api/recipes?max_calories=x", "/api/recipes?sort=sugar", "/api/recipes?sort=calories&after=1",
+                "/api/recipes?after=abc"):
+        response = client.get(url)
+        assert response.status_code == 400 and "error" in response.get_json()
+
+
+def test_macro_range_uses_the_per_serving_index(appmod, db):
+    conds, order = appmod.macro_filters(MultiDict({"max_calories": "400"}))
+    query = db.select(appmod.Recipe.id).where(*conds).order_by(*appmod.macro_order_by(*order)).limit(20)
+    sql = str(query.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    plan = " ".join(row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "ix_recipe_calories_per_serving" in plan and "TEMP B-TREE" not in plan
+
+
+def test_search_page_filters_by_macros(client, recipes):
+    html = client.get("/search?max_calories=400&min_proteins=20&sort=-proteins").get_data(as_text=True)
+    shown = [t for t in RECIPES if t in html]
+    assert sorted(shown) == ["Chicken curry", "Egg bhurji", "Paneer bowl", "Rajma"]
+    assert html.index("Chicken curry") < html.index("Rajma")
+
+    html = client.get("/search?max_calories=lots").get_data(as_text=True)
+    assert "max_calories must be a number." in html
@@ -0,0 +1,55 @@
+import difflib
+
+import pytest
+
+from nutrition_calculator import nutrition_utils
+from nutrition_calculator.matcher import IngredientMatcher
+
+
+@pytest.fixture(scope="module")
+def names():
+    return nutrition_utils.matcher.names
+
+
+def close_match(query, names):
+    found = difflib.get_close_matches(query, names, n=1, cutoff=0.6)
+    return found[0] if found else None
+
+
+def matched_name(matcher, query):
+    pos = matcher.match(query)
+    return None if pos is None else matcher.names[pos]
+
+
+@pytest.mark.parametrize("query", [
+    "onion", "tomato", "basmati rice", "paneer", "ghee", "garlic", "green chilli",
+    # the trigram shortlist alone picks a weaker row for these
+    "chana dal", "palak", "parboiled rice",
+    "xyzzy qwerty",
+])
+def test_matches_difflib(names, query):
+    assert matched_name(nutrition_utils.matcher, query) == close_match(query, names)
+
+
+def test_matches_difflib_on_truncated_food_names(names):
+    queries = sorted({n.lower()[:-2] for n in names})[::25]
+    matcher = nutrition_utils.matcher
+    assert [matched_name(matcher, q) for q in queries] == [close_match(q, names) for q in queries]
+
+
+def test_exact_match_returns_first_row_with_full_score():
+    matcher = IngredientMatcher(["Rice", "Dal", "Rice"])
+    assert matcher.match_scored("Rice") == (0, 1.0)
+
+
+def test_duplicate_fuzzy_match_returns_first_row():
+    matcher = IngredientMatcher(["Lentil soup", "Rice", "Lentil soup"])
+    pos, score = matcher.match_scored("lentil soup")
+    assert pos == 0
+    assert score == pytest.approx(difflib.SequenceMatcher(None, "Lentil soup", "lentil soup").ratio())
+
+
+def test_nothing_above_cutoff():
+    matcher = IngredientMatcher(["Rice", "Dal"])
+    assert matcher.match_scored("zzzzzz") == (None, 0.0)
+    assert matcher.match_scored("") == (None, 0.0)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from nutrition_calculator import nutrition_utils
+from nutrition_calculator.table import (
+    NUTRIENT_COLUMNS, build_table, csv_digest, read_table, write_table,
+)
+
+CSV = """food_name,unit_serving_energy_kcal,unit_serving_carb_g,unit_serving_protein_g,unit_serving_fat_g,unit_serving_fibre_g
+Rice,130,28,2.7,0.3,0.4
+Paneer,265,1.2,18.3,20.8,0
+Ghee,900,0,0,99.5,0
+"""
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "indb_clean.csv"
+    path.write_text(CSV)
+    return path
+
+
+def test_round_trip(tmp_path):
+    names = ["rice", "paneer", "dal – tadka"]
+    matrix = np.arange(15, dtype="<f4").reshape(3, 5)
+    path = tmp_path / "table.bin"
+    write_table(str(path), names, matrix, "abc")
+
+    table = read_table(str(path))
+    assert table.names == names
+    assert table.source_sha256 == "abc"
+    assert table.matrix.dtype == np.dtype("<f4")
+    assert table.matrix.shape == (3, len(NUTRIENT_COLUMNS))
+    np.testing.assert_array_equal(table.matrix, matrix)
+
+
+def test_empty_table(tmp_path):
+    path = tmp_path / "table.bin"
+    write_table(str(path), [], np.zeros((0, 5), dtype="<f4"))
+    assert len(read_table(str(path))) == 0
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "table.bin"
+    path.write_bytes(b"not a table at all")
+    with pytest.raises(ValueError):
+        read_table(str(path))
+
+
+def test_build_from_csv_lowercases_and_clamps(tmp_path, dataset):
+    path = tmp_path / "table.bin"
+    assert build_table(str(dataset), str(path)) == 3
+    table = read_table(str(path))
+    assert table.names == ["rice", "paneer", "ghee"]
+    assert table.source_sha256 == csv_digest(str(dataset))
+    calories, proteins, fats = table.matrix[2][:3]
+    assert (calories, proteins, fats) == (800, 0, 99.5)  # calories clamped
+
+
+def test_digest_ignores_line_endings(tmp_path, dataset):
+    crlf = tmp_path / "crlf.csv"
+    crlf.write_bytes(CSV.replace("\n", "\r\n").encode())
+    assert csv_digest(str(crlf)) == csv_digest(str(dataset))
+
+
+def test_stale_table_falls_back_to_csv(tmp_path, dataset, monkeypatch):
+    path = tmp_path / "table.bin"
+    build_table(str(dataset), str(path))
+    monkeypatch.setattr(nutrition_utils, "table_path", str(path))
+    monkeypatch.setattr(nutrition_utils, "dataset_path", str(dataset))
+    monkeypatch.setattr(nutrition_utils, "NUTRITION_SOURCE", "auto")
+
+    table, source = nutrition_utils._open_table()
+    assert source == str(path)
+
+    dataset.write_text(CSV + "Dal,116,20,9,0.4,8\n")
+    with pytest.warns(UserWarning, match="stale"):
+        table, source = nutrition_utils._open_table()
+    assert source == str(dataset)
+    assert table.names[-1] == "dal"
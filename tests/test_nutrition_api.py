@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import pytest
+
+from nutrition_calculator import nutrition_utils
+from nutrition_calculator.service import NutritionService
+
+INGREDIENTS = "1 cup rice, 2 tbsp ghee, 1 cup rice"
+
+
+def test_items_and_totals(client):
+    response = client.post("/api/nutrition", json={"ingredients": INGREDIENTS})
+    assert response.status_code == 200
+    data = response.json
+    assert [i["ingredient"] for i in data["items"]] == ["1 cup rice", "2 tbsp ghee", "1 cup rice"]
+    assert data["items"][0]["food_name"]
+    expected = nutrition_utils.calculate_recipe_nutrition(["1 cup rice", "2 tbsp ghee", "1 cup rice"])
+    assert data["totals"] == pytest.approx(expected, abs=0.011)
+
+
+def test_list_input_and_blanks(client):
+    data = client.post("/api/nutrition", json={"ingredients": ["1 onion", " ", 3]}).json
+    assert [i["ingredient"] for i in data["items"]] == ["1 onion"]
+
+
+def test_stream_sends_one_line_per_ingredient_then_totals(client):
+    response = client.post("/api/nutrition?stream=1", json={"ingredients": INGREDIENTS})
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    assert lines[-1]["totals"] == client.post("/api/nutrition", json={"ingredients": INGREDIENTS}).json["totals"]
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"ingredients": {"a": 1}}, 400),
+    ({"ingredients": ", ".join(["1 onion"] * 101)}, 400),
+    ({}, 200),
+])
+def test_api_rejects_bad_payloads(client, body, status):
+    assert client.post("/api/nutrition", json=body).status_code == status
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"json": ["onion"]},
+    {"json": "x"},
+    {"json": 5},
+    {"data": "{not json", "content_type": "application/json"},
+    {},
+])
+def test_api_rejects_bodies_that_are_not_objects(client, kwargs):
+    response = client.post("/api/nutrition", **kwargs)
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
+def test_calculate_nutrition(client):
+    response = client.post("/calculate_nutrition", json={"ingredients": "1 cup rice, 1 onion"})
+    assert response.status_code == 200
+    assert response.json == nutrition_utils.calculate_recipe_nutrition(["1 cup rice", "1 onion"])
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"data": "ingredients=rice", "content_type": "application/x-www-form-urlencoded"},
+    {"data": "{not json", "content_type": "application/json"},
+    {"json": ["rice"]},
+    {"json": {"ingredients": ["rice"]}},
+    {},
+])
+def test_calculate_nutrition_rejects_bad_payloads(client, kwargs):
+    response = client.post("/calculate_nutrition", **kwargs)
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
+def test_identical_lookups_in_flight_are_coalesced(monkeypatch):
+    release, calls = threading.Event(), []
+
+    def slow_lookup(ingredient):
+        calls.append(ingredient)
+        release.wait(5)
+        return {"ingredient": ingredient}
+
+    monkeypatch.setattr(nutrition_utils, "ingredient_nutrition", slow_lookup)
+    service = NutritionService(workers=2)
+    first = service.submit("1 cup Rice")
+    assert service.submit("1  cup rice ") is first
+    other = service.submit("1 onion")
+    assert service.stats() == {"submitted": 2, "coalesced": 1, "in_flight": 2}
+    release.set()
+    assert first.result(5) == {"ingredient": "1 cup rice"}
+    other.result(5)
+    assert sorted(calls) == ["1 cup rice", "1 onion"]
+    # finished lookups are no longer shared (the done callback may still be running)
+    deadline = time.monotonic() + 5
+    while service.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.submit("1 cup rice") is not first
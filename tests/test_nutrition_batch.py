@@ -0,0 +1,49 @@
+import pytest
+
+from nutrition_calculator import nutrition_utils
+
+RECIPES = [
+    ["1 cup rice", "2 tbsp ghee", "1 onion"],
+    ["200 g paneer", "1 tomato", "", "1 cup rice"],
+    [],
+    ["   ", "1 cup RICE"],
+]
+
+
+def summed(ingredients):
+    totals = dict.fromkeys(nutrition_utils.major_nutrients, 0.0)
+    for ingredient in ingredients:
+        found = nutrition_utils.ingredient_nutrition(ingredient)
+        for k, v in (found["nutrients"] if found else {}).items():
+            totals[k] += v
+    return {k: round(v, 2) for k, v in totals.items()}
+
+
+def test_batch_matches_per_ingredient_sums():
+    batch = nutrition_utils.calculate_recipes_nutrition_batch(RECIPES)
+    assert len(batch) == len(RECIPES)
+    for ingredients, totals in zip(RECIPES, batch):
+        assert totals == pytest.approx(summed(ingredients), abs=0.011)
+    assert batch[2] == dict.fromkeys(nutrition_utils.major_nutrients, 0.0)
+    assert batch[0]["calories"] > 0
+
+
+def test_sparse_path_matches_dense(monkeypatch):
+    dense = nutrition_utils.calculate_recipes_nutrition_batch(RECIPES)
+    monkeypatch.setattr(nutrition_utils, "DENSE_BATCH_LIMIT", 0)
+    assert nutrition_utils.calculate_recipes_nutrition_batch(RECIPES) == dense
+
+
+def test_repeated_ingredient_counts_twice():
+    once, twice = nutrition_utils.calculate_recipes_nutrition_batch([["1 cup rice"], ["1 cup rice", "1 cup rice"]])
+    assert twice["calories"] == pytest.approx(2 * once["calories"], abs=0.011)
+
+
+def test_single_recipe_wrapper():
+    assert nutrition_utils.calculate_recipe_nutrition(RECIPES[0]) == \
+        nutrition_utils.calculate_recipes_nutrition_batch(RECIPES[:1])[0]
+
+
+def test_nothing_to_resolve():
+    assert nutrition_utils.calculate_recipes_nutrition_batch([[""], []]) == \
+        [dict.fromkeys(nutrition_utils.major_nutrients, 0.0)] * 2
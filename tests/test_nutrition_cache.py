@@ -0,0 +1,55 @@
+import threading
+
+from nutrition_calculator import nutrition_utils
+from nutrition_calculator.cache import NutritionCache, normalize_query
+
+
+def test_evicts_least_recently_used():
+    cache = NutritionCache(2)
+    cache.put("rice", 1)
+    cache.put("dal", 2)
+    assert cache.get("rice") == 1  # dal is now the oldest
+    cache.put("ghee", 3)
+    assert cache.get("dal") is None
+    assert cache.get("rice") == 1
+    assert cache.get("ghee") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (3, 1, 1, 2)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_size_zero_disables_caching():
+    cache = NutritionCache(0)
+    cache.put("rice", 1)
+    assert cache.get("rice") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_counts_stay_exact_across_threads():
+    cache = NutritionCache(16)
+    cache.put("rice", 1)
+
+    def work():
+        for _ in range(1000):
+            cache.get("rice")
+            cache.get("missing")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (cache.hits, cache.misses) == (8000, 8000)
+
+
+def test_normalize_query():
+    assert normalize_query("  Basmati   RICE\n") == "basmati rice"
+    assert normalize_query(None) == ""
+
+
+def test_get_nutrition_is_served_from_cache():
+    nutrition_utils.nutrition_cache.clear()
+    first = nutrition_utils.get_nutrition("Onion")
+    hits = nutrition_utils.nutrition_cache.hits
+    assert nutrition_utils.get_nutrition("  onion ") == first
+    assert nutrition_utils.nutrition_cache.hits == hits + 1
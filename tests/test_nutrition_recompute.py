@@ -0,0 +1,47 @@
+import pytest
+
+
+def test_recompute_updates_stale_rows_and_keeps_manual_calories(app, appmod, db, make_user, make_recipe):
+    user = make_user()
+    fresh = make_recipe(user, title="Fresh")
+    stale = make_recipe(user, title="Stale", ingredients="1 cup rice, 2 tbsp ghee")
+    manual = make_recipe(user, title="Manual", ingredients="1 cup rice", calories=999, calories_manual=True)
+    expected = {rid: db.session.get(appmod.Recipe, rid).proteins for rid in (stale, manual)}
+    db.session.execute(db.update(appmod.Recipe).where(appmod.Recipe.id.in_([stale, manual]))
+                       .values(proteins=0, fats=0, carbs=0, fibers=0))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["nutrition", "recompute", "--chunk-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert "Recomputed 3 recipes (2 changed)" in result.output
+
+    db.session.expire_all()
+    recipes = {r.id: r for r in appmod.Recipe.query}
+    assert recipes[stale].proteins == pytest.approx(expected[stale])
+    assert recipes[manual].proteins == pytest.approx(expected[manual])
+    assert recipes[manual].calories == 999
+    assert recipes[fresh].cache_version == 0
+    assert recipes[stale].cache_version == 1
+
+
+def test_recompute_invalidates_recipes_whose_breakdown_moved(app, appmod, db, make_user, make_recipe):
+    user = make_user()
+    fresh = make_recipe(user, title="Fresh")
+    moved = make_recipe(user, title="Moved", ingredients="2 cups basmati rice, 1 onion")
+    row = db.session.execute(db.select(appmod.RecipeIngredient)
+                             .where(appmod.RecipeIngredient.recipe_id == moved).limit(1)).scalar()
+    matched_as = row.food_name
+    # a match that has since moved, with the same contribution
+    row.food_name = "old match"
+    db.session.commit()
+    ids = {r.id for r in appmod.RecipeIngredient.query.filter_by(recipe_id=fresh)}
+
+    result = app.test_cli_runner().invoke(args=["nutrition", "recompute"])
+    assert "Recomputed 2 recipes (1 changed)" in result.output
+
+    db.session.expire_all()
+    recipes = {r.id: r for r in appmod.Recipe.query}
+    assert recipes[moved].cache_version == 1 and recipes[fresh].cache_version == 0
+    assert recipes[moved].ingredient_rows[0].food_name == matched_as
+    # unchanged recipes keep their rows
+    assert {r.id for r in recipes[fresh].ingredient_rows} == ids
@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import pytest
+
+import pdf_export
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+    """Jobs run on a thread pool with a stub renderer: `fail` makes it return nothing,
+    clearing `release` holds it until set."""
+    stub = SimpleNamespace(release=threading.Event(), fail=False)
+    stub.release.set()
+
+    def render(html, wkhtmltopdf_path=None):
+        stub.release.wait(5)
+        return None if stub.fail else b"%PDF-1.4 " + html.encode()
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(pdf_export, "render_pdf", render)
+    monkeypatch.setattr(pdf_export, "_executor", pool)
+    monkeypatch.setattr(pdf_export, "_jobs", {})
+    yield stub
+    stub.release.set()
+    pool.shutdown()
+
+
+def test_job_lifecycle(tmp_path, renderer):
+    path = pdf_export.cache_path(str(tmp_path), 1, "v1")
+    jid = pdf_export.job_id(1, "v1")
+    assert pdf_export.status(jid, path) == "missing"
+
+    renderer.release.clear()
+    future = pdf_export.submit(jid, "<h1>Dal</h1>", path)
+    assert pdf_export.submit(jid, "<h1>Dal</h1>", path) is future  # one job per version
+    assert pdf_export.status(jid, path) == "pending"
+    renderer.release.set()
+    assert future.result(5) == path
+    assert pdf_export.status(jid, path) == "done"
+    assert pdf_export._jobs == {}  # a finished job is its file now
+    with open(path, "rb") as f:
+        assert f.read().startswith(b"%PDF")
+
+
+def test_failed_job_is_reported_until_forgotten(tmp_path, renderer):
+    renderer.fail = True
+    path = pdf_export.cache_path(str(tmp_path), 2, "v1")
+    jid = pdf_export.job_id(2, "v1")
+    pdf_export.submit(jid, "<p>2</p>", path).result(5)
+    assert pdf_export.status(jid, path) == "failed"
+    pdf_export.forget(jid)
+    assert pdf_export.status(jid, path) == "missing"
+
+
+def test_finished_jobs_do_not_pile_up(tmp_path, renderer):
+    for rid in range(20):
+        path = pdf_export.cache_path(str(tmp_path), rid, "v1")
+        pdf_export.submit(pdf_export.job_id(rid, "v1"), f"<p>{rid}</p>", path).result(5)
+    assert len(pdf_export._jobs) <= 1
+
+
+def test_late_old_version_does_not_remove_the_current_file(tmp_path, renderer):
+    new = pdf_export.cache_path(str(tmp_path), 3, "new")
+    old = pdf_export.cache_path(str(tmp_path), 3, "old")
+    pdf_export._render_to_file("<p>new</p>", new, None)
+    pdf_export._render_to_file("<p>old</p>", old, None)  # finishes last
+    assert os.path.exists(new)
+    pdf_export.prune(str(tmp_path), 3, keep=new)
+    assert os.listdir(tmp_path) == [os.path.basename(new)]
+
+
+def test_broken_pool_is_replaced(tmp_path, renderer, monkeypatch):
+    class Broken:
+        def submit(self, *args):
+            raise BrokenProcessPool("a worker died")
+
+        def shutdown(self, wait=True):
+            pass
+
+    fresh = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pdf_export, "_executor", Broken())
+    monkeypatch.setattr(pdf_export, "ProcessPoolExecutor", lambda **kwargs: fresh)
+    path = pdf_export.cache_path(str(tmp_path), 4, "v1")
+    assert pdf_export.submit(pdf_export.job_id(4, "v1"), "<p>4</p>", path).result(5) == path
+    assert pdf_export._executor is fresh
+    fresh.shutdown()
+
+
+def test_renderer_failures_are_logged(monkeypatch, caplog):
+    import builtins
+
+    real_import = builtins.__import__
+
+    def no_renderers(name, *args, **kwargs):
+        if name in ("weasyprint", "pdfkit"):
+            raise ImportError(f"No module named {name!r}")
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_renderers)
+    with caplog.at_level(logging.WARNING, logger="pdf_export"):
+        assert pdf_export.render_pdf("<p>x</p>") is None
+    assert [r.getMessage() for r in caplog.records] == ["WeasyPrint failed", "pdfkit failed"]
+    assert all(r.exc_info for r in caplog.records)
+
+
+def test_localize_static_points_at_files():
+    html = '<link href="/static/css/style.css?v=0123abcd"><img src="/static/uploads/a.jpg">'
+    assert pdf_export.localize_static(html, "/srv/app/static") == (
+        '<link href="file:///srv/app/static/css/style.css"><img src="file:///srv/app/static/uploads/a.jpg">')
+
+
+def export_job(app, appmod, recipe_id):
+    with app.app_context():
+        _, path, jid = appmod._pdf_job(appmod.db.session.get(appmod.Recipe, recipe_id))
+    return path, jid
+
+
+def test_export_serves_the_current_version_and_prunes_older_ones(app, appmod, client, login,
+                                                                 make_user, make_recipe, renderer):
+    user = make_user()
+    recipe = make_recipe(user)
+    login(user)
+    assert client.get(f"/recipe/{recipe}/export").status_code == 202
+    path, jid = export_job(app, appmod, recipe)
+    pdf_export._jobs[jid].result(5)
+    assert client.get(f"/recipe/{recipe}/export/status").json["state"] == "done"
+
+    stale = pdf_export.cache_path(app.config["PDF_CACHE_DIR"], recipe, "0123456789abcdef")
+    with open(stale, "wb") as f:
+        f.write(b"%PDF old")
+    response = client.get(f"/recipe/{recipe}/export")
+    assert response.status_code == 200
+    assert response.mimetype == "application/pdf"
+    assert os.path.exists(path) and not os.path.exists(stale)
+
+
+def test_export_falls_back_to_the_print_page(app, appmod, client, login, make_user, make_recipe, renderer):
+    renderer.fail = True
+    user = make_user()
+    recipe = make_recipe(user, title="Unprintable")
+    login(user)
+    assert client.get(f"/recipe/{recipe}/export").status_code == 202
+    path, jid = export_job(app, appmod, recipe)
+    pdf_export._jobs[jid].result(5)
+    assert client.get(f"/recipe/{recipe}/export/status").json["state"] == "failed"
+
+    response = client.get(f"/recipe/{recipe}/export")
+    assert response.status_code == 200
+    assert "Unprintable" in response.get_data(as_text=True)
+    assert jid not in pdf_export._jobs
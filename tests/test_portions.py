@@ -0,0 +1,91 @@
+import pytest
+
+from nutrition_calculator.nutrition_utils import parse_ingredient
+from nutrition_calculator.portions import (DEFAULT_SERVING_G, PortionEntry, PortionTable,
+                                           join_quantities, parse_quantity)
+
+
+@pytest.fixture
+def table():
+    return PortionTable([
+        PortionEntry("rice", 100, cup_g=185),
+        PortionEntry("rice flour", 30, cup_g=160),
+        PortionEntry("butter", 5, cup_g=227),
+        PortionEntry("buttermilk", 200, cup_g=245),
+        PortionEntry("milk", 100, cup_g=245),
+        PortionEntry("onion", 40, cup_g=160, piece_g=110),
+        PortionEntry("clove", 1, piece_g=0.5),
+    ])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 tbsp oil", (2.0, "tbsp", "oil")),
+    ("200g paneer", (200.0, "g", "paneer")),
+    ("1/2 cup milk", (0.5, "cup", "milk")),
+    ("1 ½ cups rice", (1.5, "cups", "rice")),
+    ("Milk – 2 Cups", (2.0, "cups", "milk")),
+    ("3-4 cloves garlic", (3.5, "cloves", "garlic")),
+    ("3 onions", (3.0, None, "onions")),
+    ("paneer (cottage cheese)", (None, None, "paneer")),
+    ("butter", (None, None, "butter")),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+
+@pytest.mark.parametrize("text, grams", [
+    ("200g paneer", 200.0),
+    ("1 kg rice", 1000.0),
+    ("1 cup rice", 185.0),
+    ("1/2 cup milk", 122.5),
+    ("2 tbsp milk", 30 * 245 / 240),
+    ("3 onions", 330.0),
+    ("2 medium onions", 220.0),
+    ("rice", 100.0),
+    ("saffron", DEFAULT_SERVING_G),
+    ("1 cup water", 240.0),          # no entry: 1 g per ml
+    ("3 cloves", 1.5),                # the unit names the ingredient
+])
+def test_grams(table, text, grams):
+    assert table.grams(text) == pytest.approx(grams)
+
+
+def test_lookup_takes_whole_words_longest_then_rightmost(table):
+    assert table.lookup("buttermilk").name == "buttermilk"
+    assert table.lookup("peanut butter").name == "butter"
+    assert table.lookup("rice flour").name == "rice flour"
+    assert table.lookup("fried onion rice").name == "rice"
+    assert table.lookup("tomatoes") is None
+    # plurals meet their singular entry
+    assert table.lookup("Onions").name == "onion"
+
+
+def test_from_csv_skips_comments_and_counts_entries(tmp_path):
+    path = tmp_path / "portions.csv"
+    path.write_text("name,serving_g,cup_g,piece_g\n"
+                    "# name,serving_g\n"
+                    "ghee,5,218,\n"
+                    "egg,50,,50\n"
+                    "Egg,50,,55\n", encoding="utf-8")
+    table = PortionTable.from_csv(path)
+    assert table.size == 2
+    assert table.grams("2 tbsp ghee") == pytest.approx(30 * 218 / 240)
+    assert table.grams("2 eggs") == 110.0
+    assert table.lookup("egg").cup_g is None
+
+
+def test_join_quantities():
+    assert join_quantities(["Rice", "1 cup", "Salt", "2 tsp"]) == ["Rice 1 cup", "Salt 2 tsp"]
+    assert join_quantities(["1 bay leaf", "3 cloves"]) == ["1 bay leaf", "3 cloves"]
+
+
+@pytest.mark.parametrize("ingredient, expected", [
+    ("Rice- 1 Cup", ("rice", 185.0)),
+    ("200g paneer", ("paneer", 200.0)),
+    ("buttermilk", ("buttermilk", 200.0)),
+    ("butter", ("butter", 5.0)),
+    ("   ", ("", 0.0)),
+])
+def test_parse_ingredient_uses_the_shipped_table(ingredient, expected):
+    name, grams = parse_ingredient(ingredient)
+    assert (name, grams) == (expected[0], pytest.approx(expected[1]))
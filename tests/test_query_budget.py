@@ -0,0 +1,75 @@
+import pytest
+from flask import Response, stream_with_context
+
+LISTINGS = ["/recipes", "/recipes/top", "/favorites", "/my_recipes",
+            "/search?q=curry", "/search?ingredients=onion&match=any", "/search?max_calories=5000",
+            "/api/recipes?max_calories=5000"]
+
+
+@pytest.fixture
+def populated(app, appmod, make_user, make_recipe):
+    """Enough users, recipes, ratings, comments and favorites for an N+1 to show."""
+    users = [make_user(f"cook{i}") for i in range(4)]
+    recipes = [make_recipe(users[i % 4], title=f"Curry {i}") for i in range(8)]
+    with app.app_context():
+        for rid in recipes:
+            for uid in users:
+                appmod.db.session.add(appmod.Rating(user_id=uid, recipe_id=rid, score=4))
+                appmod.db.session.add(appmod.Comment(user_id=uid, recipe_id=rid, content="Nice"))
+                appmod.db.session.add(appmod.Favorite(user_id=uid, recipe_id=rid))
+        appmod.db.session.commit()
+        appmod.backfill_rating_aggregates()
+    return users[0], recipes
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("url", LISTINGS)
+def test_listings_stay_within_budget(app, client, login, populated, monkeypatch, url, stream):
+    monkeypatch.setitem(app.config, "STREAM_LISTINGS", stream)
+    login(populated[0])
+    # buffered: the body is read and the response closed, so streamed
+    # listings are checked too
+    assert client.get(url, buffered=True).status_code == 200
+
+
+def test_recipe_page_within_budget(client, login, populated):
+    user, recipes = populated
+    login(user)
+    for _ in range(2):  # fragment cache miss, then hit
+        assert client.get(f"/recipe/{recipes[0]}", buffered=True).status_code == 200
+
+
+@pytest.fixture
+def n_plus_one(app, appmod, monkeypatch, populated):
+    """Swap the index page for a view that loads every recipe's owner one by one."""
+    def install(stream=False):
+        def titles():
+            for recipe in appmod.Recipe.query.order_by(appmod.Recipe.id):
+                yield f"{recipe.title} by {recipe.user.username}\n"
+
+        def view():
+            if stream:
+                return Response(stream_with_context(titles()))
+            return "".join(titles())
+
+        monkeypatch.setitem(app.view_functions, "index", appmod.query_budget(3)(view))
+    return install
+
+
+def test_over_budget_view_fails_under_testing(client, n_plus_one):
+    n_plus_one()
+    with pytest.raises(AssertionError, match=r"index issued \d+ SQL queries \(budget 3\)"):
+        client.get("/")
+
+
+def test_over_budget_streamed_view_fails_under_testing(client, n_plus_one):
+    n_plus_one(stream=True)
+    with pytest.raises(AssertionError, match=r"budget 3"):
+        client.get("/", buffered=True)
+
+
+def test_over_budget_only_logs_when_not_enforced(app, client, n_plus_one, monkeypatch, caplog):
+    n_plus_one()
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_ENFORCE", False)
+    assert client.get("/").status_code == 200
+    assert "index issued" in caplog.text
@@ -0,0 +1,79 @@
+import pytest
+
+
+def aggregates(app, appmod, recipe_id):
+    with app.app_context():
+        r = appmod.db.session.get(appmod.Recipe, recipe_id)
+        return r.rating_count, r.rating_sum, r.rating_avg
+
+
+def rate(client, login, user, recipe_id, score):
+    login(user)
+    return client.post(f"/recipe/{recipe_id}/rate", data={"score": score})
+
+
+def test_aggregates_follow_new_ratings_and_re_ratings(app, appmod, client, login, make_user, make_recipe):
+    alice, bob = make_user("alice"), make_user("bob")
+    recipe = make_recipe(alice)
+    assert aggregates(app, appmod, recipe) == (0, 0, None)
+
+    assert rate(client, login, alice, recipe, 4).status_code == 302
+    assert aggregates(app, appmod, recipe) == (1, 4, 4.0)
+    rate(client, login, bob, recipe, 1)
+    assert aggregates(app, appmod, recipe) == (2, 5, 2.5)
+    # re-rating replaces the score, it doesn't add a rating
+    rate(client, login, alice, recipe, 2)
+    assert aggregates(app, appmod, recipe) == (2, 3, 1.5)
+    rate(client, login, alice, recipe, 2)
+    assert aggregates(app, appmod, recipe) == (2, 3, 1.5)
+
+    with app.app_context():
+        assert appmod.Rating.query.filter_by(recipe_id=recipe).count() == 2
+        # the stored aggregates agree with a recount from the rating table
+        appmod.backfill_rating_aggregates()
+    assert aggregates(app, appmod, recipe) == (2, 3, 1.5)
+
+
+def test_rating_bumps_the_cache_version(app, appmod, client, login, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user)
+    rate(client, login, user, recipe, 5)
+    with app.app_context():
+        assert appmod.db.session.get(appmod.Recipe, recipe).cache_version == 1
+
+
+def test_invalid_score_changes_nothing(app, appmod, client, login, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user)
+    rate(client, login, user, recipe, 9)
+    assert aggregates(app, appmod, recipe) == (0, 0, None)
+
+
+def test_missing_recipe_is_404(app, appmod, client, login, make_user):
+    assert rate(client, login, make_user(), 999, 3).status_code == 404
+    with app.app_context():
+        assert appmod.Rating.query.count() == 0
+
+
+def test_top_rated_orders_by_average(client, login, make_user, make_recipe):
+    users = [make_user(f"u{i}") for i in range(2)]
+    low, high = make_recipe(users[0], title="Plain rice"), make_recipe(users[0], title="Best biryani")
+    for user in users:
+        rate(client, login, user, low, 2)
+        rate(client, login, user, high, 5)
+    body = client.get("/recipes/top").get_data(as_text=True)
+    assert body.index("Best biryani") < body.index("Plain rice")
+
+
+@pytest.mark.parametrize("scores", [[5], [1, 2, 3], [5, 5, 4, 1]])
+def test_backfill_matches_the_rating_table(app, appmod, make_user, make_recipe, scores):
+    users = [make_user(f"u{i}") for i in range(len(scores))]
+    recipe = make_recipe(users[0])
+    with app.app_context():
+        for user, score in zip(users, scores):
+            appmod.db.session.add(appmod.Rating(user_id=user, recipe_id=recipe, score=score))
+        appmod.db.session.commit()
+        appmod.backfill_rating_aggregates()
+    count, total, average = aggregates(app, appmod, recipe)
+    assert (count, total) == (len(scores), sum(scores))
+    assert average == pytest.approx(sum(scores) / len(scores))
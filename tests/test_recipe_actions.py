@@ -0,0 +1,66 @@
+import pytest
+
+JSON = {"Accept": "application/json"}
+
+
+@pytest.fixture
+def cook(client, login, make_user, make_recipe):
+    user = make_user()
+    login(user)
+    return user, make_recipe(user)
+
+
+def count(app, appmod, model, **filters):
+    with app.app_context():
+        return model.query.filter_by(**filters).count()
+
+
+def test_favorite_toggles_with_json(app, appmod, client, cook):
+    user, recipe = cook
+    assert client.post(f"/recipe/{recipe}/favorite", headers=JSON).get_json() == {"favorite": True}
+    assert count(app, appmod, appmod.Favorite, user_id=user, recipe_id=recipe) == 1
+    assert client.post(f"/recipe/{recipe}/favorite", headers=JSON).get_json() == {"favorite": False}
+    assert count(app, appmod, appmod.Favorite, user_id=user, recipe_id=recipe) == 0
+    # a plain form post still redirects to the recipe
+    response = client.post(f"/recipe/{recipe}/favorite")
+    assert response.status_code == 302 and response.location.endswith(f"/recipe/{recipe}")
+
+
+def test_rate_answers_with_the_new_aggregates(client, login, make_user, cook):
+    _, recipe = cook
+    assert client.post(f"/recipe/{recipe}/rate", data={"score": 4}, headers=JSON).get_json() == \
+        {"score": 4, "rating_count": 1, "rating_avg": 4.0}
+    login(make_user("bob"))
+    assert client.post(f"/recipe/{recipe}/rate", data={"score": 1}, headers=JSON).get_json() == \
+        {"score": 1, "rating_count": 2, "rating_avg": 2.5}
+
+    response = client.post(f"/recipe/{recipe}/rate", data={"score": 9}, headers=JSON)
+    assert response.status_code == 400 and "score" in response.get_json()["errors"]
+
+
+def test_comment_answers_with_its_markup(app, appmod, client, cook):
+    _, recipe = cook
+    response = client.post(f"/recipe/{recipe}/comment", data={"content": "Needs <b>more</b> salt"}, headers=JSON)
+    html = response.get_json()["html"]
+    assert "<strong>cook</strong>" in html and "Needs &lt;b&gt;more&lt;/b&gt; salt" in html
+    assert count(app, appmod, appmod.Comment, recipe_id=recipe) == 1
+    # the cached page shows it straight away
+    assert "Needs &lt;b&gt;more&lt;/b&gt; salt" in client.get(f"/recipe/{recipe}").get_data(as_text=True)
+
+    response = client.post(f"/recipe/{recipe}/comment", data={"content": ""}, headers=JSON)
+    assert response.status_code == 400 and "content" in response.get_json()["errors"]
+
+
+@pytest.mark.parametrize("action, data", [("favorite", {}), ("rate", {"score": 3}), ("comment", {"content": "Hi"})])
+def test_actions_on_a_missing_recipe_are_404(app, appmod, client, cook, action, data):
+    for headers in (JSON, {}):
+        assert client.post(f"/recipe/99999/{action}", data=data, headers=headers).status_code == 404
+    assert count(app, appmod, appmod.Comment) == 0
+    assert count(app, appmod, appmod.Rating) == 0
+    assert count(app, appmod, appmod.Favorite) == 0
+
+
+def test_actions_need_a_login(client, make_user, make_recipe):
+    recipe = make_recipe(make_user())
+    response = client.post(f"/recipe/{recipe}/comment", data={"content": "Hi"}, headers=JSON)
+    assert response.status_code == 302 and "/login" in response.location
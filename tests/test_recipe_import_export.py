@@ -0,0 +1,147 @@
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from nutrition_calculator import nutrition_utils
+
+RECORDS = [
+    {"title": "Jeera rice", "ingredients": "2 cups basmati rice, 1 tbsp ghee", "instructions": "Cook.",
+     "author": "asha", "servings": 4},
+    {"title": "Ghee rice", "ingredients": "1 tbsp ghee, 2 cups basmati rice", "instructions": "Fry.",
+     "calories": "750", "calories_manual": "true"},
+    {"title": "", "ingredients": "1 onion", "instructions": "Chop."},
+    {"title": "Kheer", "ingredients": "1 cup milk, 2 tbsp sugar", "instructions": "Simmer.",
+     "calories": "123", "calories_manual": "false", "servings": "500"},
+]
+
+
+@pytest.fixture
+def cli(app):
+    runner = app.test_cli_runner()
+
+    def cli(*args):
+        result = runner.invoke(args=list(args))
+        assert result.exit_code == 0, result.output
+        return result
+    return cli
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    return str(path)
+
+
+def stored(app, appmod):
+    with app.app_context():
+        return {r.title: r for r in appmod.Recipe.query.order_by(appmod.Recipe.id)}
+
+
+def test_import_jsonl(app, appmod, cli, make_user, tmp_path):
+    make_user("cook")
+    asha = make_user("asha")
+    result = cli("recipes", "import", write_jsonl(tmp_path / "in.jsonl", RECORDS), "--user", "cook")
+    assert "line 3: skipped (missing title)" in result.output
+    assert "Imported 3 recipes (1 skipped)" in result.output
+
+    recipes = stored(app, appmod)
+    assert list(recipes) == ["Jeera rice", "Ghee rice", "Kheer"]
+    jeera, ghee, kheer = recipes.values()
+    assert jeera.user_id == asha and jeera.servings == 4
+    expected = nutrition_utils.calculate_recipe_nutrition(["2 cups basmati rice", "1 tbsp ghee"])
+    assert jeera.calories == pytest.approx(expected["calories"], abs=0.01)
+    assert jeera.proteins == pytest.approx(expected["proteins"], abs=0.01)
+    assert (ghee.calories, ghee.calories_manual) == (750, True)
+    # an exported computed value is recomputed; servings are clamped
+    assert kheer.calories != 123 and not kheer.calories_manual and kheer.servings == 100
+    with app.app_context():
+        rows = appmod.db.session.get(appmod.Recipe, jeera.id).ingredient_rows
+        assert [r.raw for r in rows] == ["2 cups basmati rice", "1 tbsp ghee"]
+
+
+def test_each_distinct_ingredient_is_matched_once_per_chunk(cli, make_user, tmp_path, monkeypatch):
+    make_user("cook")
+    calls = []
+    match_ingredients = nutrition_utils.match_ingredients
+    monkeypatch.setattr(nutrition_utils, "match_ingredients",
+                        lambda items: calls.append(list(items)) or match_ingredients(items))
+
+    cli("recipes", "import", write_jsonl(tmp_path / "in.jsonl", RECORDS), "--user", "cook", "--chunk-size", "2")
+    assert calls == [["2 cups basmati rice", "1 tbsp ghee"], ["1 cup milk", "2 tbsp sugar"]]
+
+
+@pytest.mark.parametrize("name", ["out.jsonl", "out.csv"])
+def test_export_import_round_trip(app, appmod, cli, make_user, make_recipe, tmp_path, name):
+    user = make_user("cook")
+    make_recipe(user, title="Dal, \"tadka\"", ingredients="1 cup toor dal, 1 onion", servings=3)
+    make_recipe(user, title="Rice", ingredients="2 cups basmati rice", calories=500, calories_manual=True,
+                image_url="https://example.com/rice.jpg")
+    first, second = str(tmp_path / name), str(tmp_path / f"again_{name}")
+    cli("recipes", "export", first, "--chunk-size", "1")
+
+    with app.app_context():
+        appmod.db.session.execute(appmod.db.delete(appmod.RecipeIngredient))
+        appmod.db.session.execute(appmod.db.delete(appmod.Recipe))
+        appmod.db.session.commit()
+    assert "Imported 2 recipes (0 skipped)" in cli("recipes", "import", first, "--user", "cook").output
+    cli("recipes", "export", second)
+
+    with open(first, encoding="utf-8") as a, open(second, encoding="utf-8") as b:
+        assert a.read() == b.read()
+    recipes = stored(app, appmod)
+    assert recipes["Rice"].calories_manual and recipes["Rice"].image_url == "https://example.com/rice.jpg"
+    assert recipes['Dal, "tadka"'].servings == 3
+
+
+def test_import_stores_local_images(app, appmod, cli, make_user, tmp_path):
+    make_user("cook")
+    images = tmp_path / "images"
+    images.mkdir()
+    Image.new("RGB", (64, 48), (200, 80, 20)).save(images / "dal.jpg", "JPEG")
+    records = [{"title": t, "ingredients": "1 onion", "instructions": "Cook.", "image": "dal.jpg"}
+               for t in ("One", "Two")]
+    records.append({"title": "Three", "ingredients": "1 onion", "instructions": "Cook.", "image": "missing.jpg"})
+    cli("recipes", "import", write_jsonl(tmp_path / "in.jsonl", records), "--user", "cook",
+        "--images-dir", str(images))
+
+    one, two, three = stored(app, appmod).values()
+    assert one.image_url == two.image_url and one.image_url.startswith("/static/uploads/")
+    assert os.path.basename(one.image_url) in os.listdir(app.config["UPLOAD_FOLDER"])
+    assert three.image_url is None
+
+
+def test_malformed_records_are_skipped_and_reported(app, appmod, cli, make_user, tmp_path):
+    make_user("cook")
+    good = RECORDS[0]
+    records = [
+        ["not", "an", "object"],
+        {**good, "title": 5},
+        {**good, "title": "NaN servings", "servings": "nan"},
+        {**good, "title": "Endless", "servings": "inf"},
+        {**good, "title": "Few", "servings": "some"},
+        {**good, "title": "Bad calories", "calories": "lots", "calories_manual": "true"},
+        {**good, "title": "Bad author", "author": ["asha"]},
+        good,
+    ]
+    result = cli("recipes", "import", write_jsonl(tmp_path / "in.jsonl", records), "--user", "cook",
+                 "--chunk-size", "3")
+    for line, reason in [(1, "not an object"), (2, "title must be text"), (3, "servings must be a number"),
+                         (4, "servings must be a number"), (5, "servings must be a number"),
+                         (6, "calories must be a number"), (7, "author must be text")]:
+        assert f"line {line}: skipped ({reason})" in result.output
+    assert "Imported 1 recipes (7 skipped)" in result.output
+    assert list(stored(app, appmod)) == ["Jeera rice"]
+
+
+def test_import_errors(app, make_user, tmp_path):
+    make_user("cook")
+    runner = app.test_cli_runner()
+    path = write_jsonl(tmp_path / "in.jsonl", RECORDS[:1])
+    result = runner.invoke(args=["recipes", "import", path, "--user", "nobody"])
+    assert result.exit_code == 2 and "no user named 'nobody'" in result.output
+
+    bad = tmp_path / "bad.jsonl"
+    bad.write_text(json.dumps(RECORDS[0]) + "\n{not json\n", encoding="utf-8")
+    result = runner.invoke(args=["recipes", "import", str(bad), "--user", "cook"])
+    assert result.exit_code == 1 and "(after 0 imported)" in result.output
@@ -0,0 +1,98 @@
+import os
+import re
+
+import pytest
+
+import request_metrics
+from nutrition_calculator import nutrition_utils
+
+
+@pytest.fixture
+def metrics_on(app, appmod, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, "METRICS_ENABLED", True)
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "scrape")
+    monkeypatch.setitem(app.config, "PROFILE_TOKEN", "prof")
+    monkeypatch.setitem(app.config, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(nutrition_utils, "timing_observer", appmod._observe_nutrition)
+    return app
+
+
+def scrape(client):
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    return response.get_data(as_text=True)
+
+
+def sample(text, name, **labels):
+    """The value of one series in a scrape, 0 if it isn't there yet."""
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    m = re.search(rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$", text, re.M)
+    return float(m.group(1)) if m else 0.0
+
+
+def test_metrics_endpoint_is_opt_in_and_behind_its_token(app, client, monkeypatch):
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setitem(app.config, "METRICS_ENABLED", True)
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "scrape")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 401
+    assert scrape(client).startswith("# HELP ")
+
+
+def test_no_server_timing_when_disabled(client):
+    assert "Server-Timing" not in client.get("/").headers
+
+
+def test_server_timing_and_histograms(metrics_on, client):
+    before = scrape(client)
+    response = client.get("/")
+    parts = dict(p.split(";dur=") for p in response.headers["Server-Timing"].split(", "))
+    assert set(parts) == {"db", "tpl", "nutrition", "total"}
+    assert float(parts["total"]) >= float(parts["tpl"]) > 0
+
+    after = scrape(client)
+    count = "recipe_app_request_seconds_count"
+    assert sample(after, count, endpoint="index") == sample(before, count, endpoint="index") + 1
+    responses = "recipe_app_responses_total"
+    assert (sample(after, responses, endpoint="index", status="200")
+            == sample(before, responses, endpoint="index", status="200") + 1)
+
+
+def test_nutrition_time_is_charged_to_the_request(metrics_on, client):
+    nutrition_utils.nutrition_cache.clear()
+    labels = {"endpoint": "calculate_nutrition"}
+    before = sample(scrape(client), "recipe_app_request_nutrition_seconds_sum", **labels)
+    client.post("/calculate_nutrition", json={"ingredients": "2 cups basmati rice, 1 tbsp ghee"})
+    assert sample(scrape(client), "recipe_app_request_nutrition_seconds_sum", **labels) > before
+
+
+def test_profile_header_saves_a_profile(metrics_on, client):
+    assert "X-Profile-File" not in client.get("/", headers={"X-Profile": "wrong"}).headers
+    response = client.get("/", headers={"X-Profile": "prof"})
+    name = response.headers["X-Profile-File"]
+    assert name.endswith((".prof", ".html")) and "_index_" in name
+    assert os.listdir(metrics_on.config["PROFILE_DIR"]) == [name]
+
+
+def test_registry_renders_prometheus_text():
+    registry = request_metrics.Registry()
+    latency = registry.histogram("t_seconds", "Latency.", buckets=(0.1, 1.0))
+    hits = registry.counter("t_total", "Hits.", labels=("result",))
+    registry.collector("t_size", "Size.", lambda: {("a\"b",): 3}, labels=("name",))
+    latency.observe(("index",), 0.05)
+    latency.observe(("index",), 0.5)
+    latency.observe(("index",), 5.0)
+    hits.inc(("hit",))
+    hits.inc(("hit",), 2)
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP t_seconds Latency.", "# TYPE t_seconds histogram"]
+    assert 't_seconds_bucket{endpoint="index",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{endpoint="index",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{endpoint="index",le="+Inf"} 3' in lines
+    assert 't_seconds_sum{endpoint="index"} 5.55' in lines
+    assert 't_seconds_count{endpoint="index"} 3' in lines
+    assert 't_total{result="hit"} 3' in lines
+    assert "# TYPE t_size gauge" in lines
+    assert 't_size{name="a\\"b"} 3' in lines
@@ -0,0 +1,68 @@
+import pytest
+
+
+def indexes(db, table):
+    return {i["name"]: i for i in db.inspect(db.engine).get_indexes(table)}
+
+
+@pytest.fixture
+def legacy(app, appmod, make_user, make_recipe):
+    """A database from before the indexes, the unique favorites and the per-ingredient contributions."""
+    user = make_user()
+    recipe = make_recipe(user)
+    db = appmod.db
+    with app.app_context(), db.engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE favorite")
+        conn.exec_driver_sql("CREATE TABLE favorite (id INTEGER PRIMARY KEY, "
+                             "user_id INTEGER NOT NULL, recipe_id INTEGER NOT NULL)")
+        conn.exec_driver_sql("INSERT INTO favorite (id, user_id, recipe_id) VALUES (1, ?, ?), (2, ?, ?)",
+                             (user, recipe, user, recipe))
+        conn.exec_driver_sql("DROP INDEX ix_rating_recipe_id")
+        conn.exec_driver_sql("ALTER TABLE recipe_ingredient DROP COLUMN fibers")
+    return user, recipe
+
+
+def test_upgrade_adds_columns_and_indexes_and_dedups(app, appmod, legacy):
+    db = appmod.db
+    with app.app_context():
+        assert appmod.upgrade_schema() == {("recipe_ingredient", "fibers")}
+        assert indexes(db, "favorite")["uq_favorite_user_recipe"]["unique"]
+        assert "ix_favorite_recipe_id" in indexes(db, "favorite")
+        assert "ix_rating_recipe_id" in indexes(db, "rating")
+        # the newest of the duplicates is kept
+        assert db.session.execute(db.select(appmod.Favorite.id)).scalars().all() == [2]
+        # nothing left to do the second time
+        assert appmod.upgrade_schema() == set()
+
+
+def test_schema_upgrade_command(app, appmod, legacy):
+    result = app.test_cli_runner().invoke(args=["schema", "upgrade"])
+    assert result.exit_code == 0, result.output
+    assert "Schema is up to date." in result.output
+    with app.app_context():
+        assert "fibers" in {c["name"] for c in appmod.db.inspect(appmod.db.engine).get_columns("recipe_ingredient")}
+
+
+def test_insert_or_ignore(appmod, db, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user)
+    assert appmod.insert_or_ignore(appmod.Favorite, ("user_id", "recipe_id"), user_id=user, recipe_id=recipe)
+    assert not appmod.insert_or_ignore(appmod.Favorite, ("user_id", "recipe_id"), user_id=user, recipe_id=recipe)
+    db.session.commit()
+    assert appmod.Favorite.query.filter_by(user_id=user, recipe_id=recipe).count() == 1
+
+
+def test_rerating_updates_the_one_row(appmod, db, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user)
+    assert appmod.save_rating(user, recipe, 4) == (1, 4.0)
+    assert appmod.save_rating(user, recipe, 2) == (1, 2.0)
+    db.session.commit()
+    assert [r.score for r in appmod.Rating.query.filter_by(recipe_id=recipe)] == [2]
+
+
+def test_sqlite_connections_use_wal_and_a_busy_timeout(app, db):
+    with db.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == app.config["SQLITE_BUSY_TIMEOUT_MS"]
@@ -0,0 +1,52 @@
+import search_index
+
+
+def ids_for(db, q):
+    return search_index.search_ids(db.session, q, limit=10)
+
+
+def test_triggers_follow_insert_update_delete(appmod, db, make_user, make_recipe):
+    user = make_user()
+    paneer = make_recipe(user, title="Paneer tikka", ingredients="200 g paneer, 1 tbsp oil")
+    dal = make_recipe(user, title="Dal tadka")
+    assert ids_for(db, "paneer") == [paneer]
+    assert ids_for(db, "tadk") == [dal]  # words match as prefixes
+
+    recipe = db.session.get(appmod.Recipe, dal)
+    recipe.title = "Moong soup"
+    db.session.commit()
+    assert ids_for(db, "tadka") == []
+    assert ids_for(db, "moong soup") == [dal]
+
+    db.session.delete(db.session.get(appmod.Recipe, paneer))
+    db.session.commit()
+    assert ids_for(db, "paneer") == []
+
+
+def test_title_outranks_ingredients(db, make_user, make_recipe):
+    user = make_user()
+    in_ingredients = make_recipe(user, title="Mixed curry", ingredients="1 cup spinach, 1 onion")
+    in_title = make_recipe(user, title="Spinach curry", ingredients="1 onion")
+    assert ids_for(db, "spinach") == [in_title, in_ingredients]
+
+
+def test_rebuild_reindexes_rows_written_behind_its_back(app, appmod, db, make_user, make_recipe):
+    user = make_user()
+    recipe = make_recipe(user, title="Kheer")
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM recipe_fts")
+    assert ids_for(db, "kheer") == []
+
+    result = app.test_cli_runner().invoke(args=["search", "rebuild"])
+    assert result.exit_code == 0, result.output
+    assert ids_for(db, "kheer") == [recipe]
+
+
+def test_search_page(client, login, make_user, make_recipe):
+    user = make_user()
+    make_recipe(user, title="Palak paneer")
+    make_recipe(user, title="Aloo gobi")
+    login(user)
+    body = client.get("/search?q=paneer").get_data(as_text=True)
+    assert "Palak paneer" in body
+    assert "Aloo gobi" not in body
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import similar_recipes
+
+DOCS = [
+    ["paneer", "capsicum", "onion"],
+    ["paneer", "tomato", "butter", "onion"],
+    ["capsicum", "rice", "onion"],
+    ["milk", "sugar", "rice", "onion"],
+    ["milk", "sugar", "curd"],
+    [],
+]
+# proteins, fats, carbs, fibers (g)
+PROFILES = [(20, 15, 10, 3), (18, 25, 12, 2), (6, 5, 60, 3), (8, 10, 70, 0), (9, 8, 40, 0), (0, 0, 0, 0)]
+IDS = [11, 12, 13, 14, 15, 16]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return similar_recipes.fit(DOCS, PROFILES)
+
+
+def test_fit_drops_ingredients_most_recipes_share(model):
+    assert "onion" not in model.vocabulary  # in 4 of 6 recipes
+    assert {"paneer", "milk", "rice"} <= set(model.vocabulary)
+
+
+def test_fit_with_too_few_recipes_keeps_everything():
+    assert set(similar_recipes.fit([["dal"], ["dal"]], [(1, 1, 1, 1)] * 2).vocabulary) == {"dal"}
+    assert similar_recipes.fit([[], []], [(0, 0, 0, 0)] * 2) is None
+
+
+def test_neighbours_match_scoring_one_recipe_at_a_time(model):
+    found = dict(similar_recipes.neighbours(model, IDS, DOCS, PROFILES, k=3, block=2))
+    assert list(found) == IDS
+    assert found[16] == []  # shares nothing
+    assert found[11][0][0] == 12 and found[14][0][0] == 15
+    for i, rid in enumerate(IDS):
+        scores = model.scores(DOCS[i], PROFILES[i], DOCS, PROFILES)
+        expected = similar_recipes.top(IDS, scores, 3, exclude=rid)
+        # neighbours only compares recipes sharing a kept ingredient
+        expected = [(sid, s) for sid, s in expected
+                    if set(DOCS[IDS.index(sid)]) & set(DOCS[i]) & set(model.vocabulary)]
+        assert found[rid] == expected
+
+
+def test_top_orders_limits_and_filters():
+    ids = [1, 2, 3, 4, 5]
+    scores = np.array([0.2, 0.9, 0.01, 0.5, 0.7])
+    assert similar_recipes.top(ids, scores, 2) == [(2, 0.9), (5, 0.7)]
+    assert similar_recipes.top(ids, scores, 10, exclude=2) == [(5, 0.7), (4, 0.5), (1, 0.2)]
+
+
+def test_save_and_load_follow_the_file(model, tmp_path):
+    path = str(tmp_path / "model.joblib")
+    assert similar_recipes.load(path) is None
+    similar_recipes.save(model, path)
+    assert similar_recipes.load(path).vocabulary == model.vocabulary
+    assert similar_recipes.load(path) is similar_recipes.load(path)
+
+
+@pytest.fixture
+def catalogue(app, monkeypatch, tmp_path, make_user, make_recipe):
+    monkeypatch.setitem(app.config, "SIMILAR_MODEL_PATH", str(tmp_path / "similar.joblib"))
+    user = make_user()
+    recipes = {title: make_recipe(user, title=title, ingredients=ingredients) for title, ingredients in [
+        ("Paneer tikka", "200 g paneer, 1 capsicum, 1 onion"),
+        ("Paneer butter masala", "200 g paneer, 2 tomatoes, 1 tbsp butter, 1 onion"),
+        ("Capsicum rice", "1 capsicum, 1 cup basmati rice, 1 onion"),
+        ("Kheer", "1 litre milk, 2 tbsp sugar, 1 cup basmati rice"),
+        ("Sweet lassi", "1 litre milk, 2 tbsp sugar, 1 cup curd"),
+    ]}
+    return user, recipes
+
+
+def neighbour_lists(app, appmod):
+    with app.app_context():
+        lists = {}
+        for row in appmod.db.session.execute(
+                appmod.db.select(appmod.RecipeSimilarity).order_by(appmod.RecipeSimilarity.score.desc())
+        ).scalars():
+            lists.setdefault(row.recipe_id, []).append(row.similar_id)
+        return lists
+
+
+def test_rebuild_command_stores_neighbours(app, appmod, client, login, catalogue):
+    user, recipes = catalogue
+    result = app.test_cli_runner().invoke(args=["similar", "rebuild", "--k", "2", "--chunk-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert "for 5 recipes" in result.output
+
+    lists = neighbour_lists(app, appmod)
+    assert lists[recipes["Paneer tikka"]][0] == recipes["Paneer butter masala"]
+    assert lists[recipes["Sweet lassi"]][0] == recipes["Kheer"]
+    assert all(len(v) <= 2 and rid not in v for rid, v in lists.items())
+
+    login(user)
+    html = client.get(f"/recipe/{recipes['Paneer tikka']}").get_data(as_text=True)
+    assert "Paneer butter masala" in html
+
+
+def test_rebuild_without_ingredients_fails(app):
+    result = app.test_cli_runner().invoke(args=["similar", "rebuild"])
+    assert result.exit_code == 1 and "nothing to compare" in result.output
+
+
+def test_update_slots_a_new_recipe_into_its_neighbours(app, appmod, catalogue, make_user, make_recipe):
+    user, recipes = catalogue
+    assert app.test_cli_runner().invoke(args=["similar", "rebuild", "--k", "2"]).exit_code == 0
+    new = make_recipe(user, title="Paneer kheer", ingredients="200 g paneer, 1 litre milk, 2 tbsp sugar")
+
+    appmod.update_similar_recipes(new)
+    lists = neighbour_lists(app, appmod)
+    assert set(lists[new]) <= set(recipes.values()) and lists[new]
+    assert any(new in lists.get(rid, []) for rid in recipes.values())
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_is_lazy(tmp_path):
+    db = tmp_path / "fresh.db"
+    code = ("import sys, app; "
+            "print(sorted(m for m in ('pandas', 'nutrition_calculator.nutrition_utils', 'sklearn') if m in sys.modules))")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db}", PDF_CACHE_DIR=str(tmp_path / "pdf"))
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+    # no schema work at import either
+    assert not db.exists() or db.stat().st_size == 0
+
+
+@pytest.mark.parametrize("key, value", [
+    ("SQLALCHEMY_DATABASE_URI", "sqlite://"),
+    ("SQLALCHEMY_ENGINE_OPTIONS", {"echo": True}),
+    ("FRAGMENT_CACHE_URL", "sqlite://"),
+    ("NUTRITION_WORKERS", 99),
+])
+def test_create_app_rejects_settings_fixed_at_import(appmod, key, value):
+    with pytest.raises(ValueError, match=key):
+        appmod.create_app({key: value})
+    assert appmod.app.config[key] != value
+
+
+def test_create_app_creates_the_directories_it_is_given(app, appmod, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, "PDF_CACHE_DIR", app.config["PDF_CACHE_DIR"])
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", app.config["UPLOAD_FOLDER"])
+    appmod.create_app({"PDF_CACHE_DIR": str(tmp_path / "pdf"), "UPLOAD_FOLDER": str(tmp_path / "up")})
+    assert (tmp_path / "pdf").is_dir() and (tmp_path / "up").is_dir()
+
+
+def test_create_app_accepts_runtime_settings(app, appmod, monkeypatch):
+    monkeypatch.setitem(app.config, "TOP_RATED_MIN_RATINGS", 1)
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    assert appmod.create_app({"TOP_RATED_MIN_RATINGS": 3, "SQLALCHEMY_DATABASE_URI": uri}) is app
+    assert app.config["TOP_RATED_MIN_RATINGS"] == 3
+
+
+def test_create_app_builds_the_schema_when_asked(app, appmod, monkeypatch):
+    with app.app_context():
+        appmod.db.drop_all()
+        assert not appmod.db.inspect(appmod.db.engine).has_table("recipe")
+    monkeypatch.setitem(app.config, "AUTO_CREATE_SCHEMA", False)
+    appmod.create_app({"AUTO_CREATE_SCHEMA": True})
+    with app.app_context():
+        assert appmod.db.inspect(appmod.db.engine).has_table("recipe")
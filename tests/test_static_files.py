@@ -0,0 +1,72 @@
+import pytest
+
+import static_files
+
+HASHED = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture
+def files(tmp_path):
+    for name in (f"{HASHED}.jpg", f"{HASHED}_card.webp", f"{HASHED}_photo.jpg", f"{HASHED}_photo.webp", "style.css"):
+        (tmp_path / name).write_bytes(name.encode())
+    return tmp_path
+
+
+def serve(app, files, filename, query="", headers=None):
+    with app.test_request_context(f"/files/{filename}?{query}", headers=headers or {}):
+        return static_files.send_file_cached(str(files), filename, "/files/", app.config)
+
+
+@pytest.mark.parametrize("filename, immutable", [
+    (f"{HASHED}.jpg", True),
+    (f"{HASHED}_card.webp", True),
+    # a legacy upload: hex prefix, but the name isn't derived from the bytes
+    (f"{HASHED}_photo.jpg", False),
+    (f"{HASHED}_photo.webp", False),
+    ("style.css", False),
+])
+def test_only_content_addressed_names_are_immutable(app, files, filename, immutable):
+    response = serve(app, files, filename)
+    assert response.status_code == 200
+    assert response.cache_control.immutable is immutable
+    assert response.cache_control.max_age == (static_files.IMMUTABLE_MAX_AGE if immutable else app.config["STATIC_MAX_AGE"])
+    assert static_files.version_for(str(files), filename) == (None if immutable else static_files.file_digest(str(files / filename)))
+
+
+def test_matching_version_is_immutable(app, files):
+    version = static_files.version_for(str(files), "style.css")
+    assert serve(app, files, "style.css", f"v={version}").cache_control.immutable
+    assert not serve(app, files, "style.css", "v=stale").cache_control.immutable
+
+
+def test_etag_answers_304_and_follows_content(app, files):
+    etag = serve(app, files, "style.css").get_etag()[0]
+    assert serve(app, files, "style.css", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+    (files / "style.css").write_bytes(b"body { color: red }")
+    response = serve(app, files, "style.css", headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_missing_and_escaping_paths_are_404(app, files):
+    from werkzeug.exceptions import NotFound
+    for name in ("nope.css", "../secret.txt"):
+        with pytest.raises(NotFound):
+            serve(app, files, name)
+
+
+def test_x_accel_leaves_the_body_to_nginx(app, files, monkeypatch):
+    monkeypatch.setitem(app.config, "SENDFILE_MODE", "x-accel")
+    response = serve(app, files, "style.css")
+    assert response.headers["X-Accel-Redirect"] == "/_protected/files/style.css"
+    assert response.get_data() == b""
+
+
+def test_static_urls_carry_a_content_version(app):
+    with app.test_request_context("/"):
+        from flask import url_for
+        url = url_for("static", filename="js/recipe_actions.js")
+    assert "?v=" in url
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable